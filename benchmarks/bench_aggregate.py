@@ -0,0 +1,56 @@
+"""
+Benchmark of :py:meth:`tmt.storage.columnar.MetricColumns.aggregate` against a plain Python loop over the
+:py:class:`tmt.storage.schema.Metric` objects of every parent and its sub-entries (e.g. the seeds of a sweep).
+
+Run it from the repository root with ``python -m benchmarks.bench_aggregate``.
+"""
+from benchmarks.bench_schema import make_entry
+from tmt.storage.columnar import MetricColumns
+from tmt.storage.schema import Entry
+import argparse
+import statistics
+import timeit
+
+
+def python_aggregate(entries):
+    stats = {}
+    for entry in entries:
+        by_name = {}
+        for e in (entry, *entry.other_runs):
+            for m in e.metrics:
+                by_name.setdefault(m.name, []).append(m.value)
+        stats[entry.id] = {name: (len(v), statistics.fmean(v), statistics.pstdev(v), min(v), max(v))
+                           for name, v in by_name.items()}
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark aggregation of sub-entry metrics')
+    parser.add_argument('--parents', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=200, help='number of sub-entries (other_runs) per parent')
+    parser.add_argument('--metrics', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    dicts = [make_entry(str(i), args.metrics, 0, args.runs).to_dict() for i in range(args.parents)]
+    columns = MetricColumns()
+    columns.update(dicts)
+    aggregates = columns.aggregate()
+    expected = python_aggregate(map(Entry.from_dict, dicts))
+    assert all(abs(aggregates.get(k)[m]['std'] - v[m][2]) < 1e-9 for k, v in expected.items() for m in v)
+
+    def bench(label, fn):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f'{label:<36}{best * 1e3:10.2f} ms')
+        return best
+
+    print(f'{args.parents} parents, {args.runs} sub-entries each, {args.metrics} metrics')
+    bench('decode entries', lambda: [Entry.from_dict(d) for d in dicts])
+    old = bench('aggregate (python, decoded entries)', lambda: python_aggregate(map(Entry.from_dict, dicts)))
+    bench('build columns', lambda: MetricColumns().update(dicts))
+    new = bench('aggregate (vectorized)', columns.aggregate)
+    print(f'{"":<36}{old / new:10.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Measures the memory footprint of a database loaded as :py:class:`tmt.storage.schema.Entry` objects versus
+:py:class:`tmt.storage.compact.CompactEntry` objects. Entries are decoded from json, as they would be when loaded
+from the database, and the memory retained after dropping the decoded json is reported.
+
+Run it from the repository root with ``python -m benchmarks.bench_memory``.
+"""
+from tmt.storage.schema import Entry
+from tmt.storage.compact import CompactEntry
+from benchmarks.bench_schema import make_entry
+import argparse
+import json
+import gc
+import tracemalloc
+
+
+def retained_memory(raw: str, decode) -> int:
+    gc.collect()
+    tracemalloc.start()
+    data = json.loads(raw)
+    objects = list(map(decode, data))
+    del data
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert objects
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory taken by entries')
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--metrics', type=int, default=20)
+    parser.add_argument('--results', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=0, help='number of sub-entries (other_runs) per entry')
+    args = parser.parse_args()
+
+    raw = json.dumps([make_entry(str(i), args.metrics, args.results, args.runs).to_dict()
+                      for i in range(args.entries)])
+    print(f'{args.entries} entries, {args.metrics} metrics, {args.results} results, {args.runs} sub-entries each')
+    entry = retained_memory(raw, Entry.from_dict)
+    compact = retained_memory(raw, CompactEntry.from_dict)
+    print(f'{"Entry":<16}{entry / 2 ** 20:8.2f} MB  ({entry / args.entries:8.0f} B/entry)')
+    print(f'{"CompactEntry":<16}{compact / 2 ** 20:8.2f} MB  ({compact / args.entries:8.0f} B/entry)')
+
+
+if __name__ == '__main__':
+    main()
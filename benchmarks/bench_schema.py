@@ -0,0 +1,80 @@
+"""
+Micro-benchmark of :py:meth:`tmt.storage.schema.BaseJsonDataclass.from_dict` and
+:py:meth:`tmt.storage.schema.BaseJsonDataclass.to_dict` on entries with many metrics, results and sub-entries.
+The compiled (de)serializers are compared with the previous implementation, which resolved the type hints of
+every object with `typing.get_type_hints` and serialized with `dataclasses.asdict`.
+
+Run it from the repository root with ``python -m benchmarks.bench_schema``.
+"""
+from tmt.storage.schema import Entry, Metric, Result, BaseJsonDataclass, Timestamp
+from dataclasses import asdict
+import argparse
+import timeit
+import typing
+
+
+def reflective_from_dict(cls, d):
+    init_dict = {}
+    for key, val in typing.get_type_hints(cls).items():
+        init_dict[key] = reflective_solve_type(val, key, d)
+    return cls(**init_dict)
+
+
+def reflective_solve_type(t, key, d):
+    args = typing.get_args(t)
+    if len(args) == 0:
+        if t is Timestamp:
+            return d.get(key)
+        elif issubclass(t, BaseJsonDataclass):
+            return reflective_from_dict(t, d[key]) if key in d else None
+        return d.get(key)
+    if len(args) > 1 and typing.get_origin(args[1]) is None:
+        if d.get(key):
+            return reflective_solve_type(args[0], key, d)
+        return None
+    arg = args[0]
+    if len(typing.get_args(arg)) == 0:
+        return typing.get_origin(t)(reflective_from_dict(arg, e) if hasattr(arg, 'from_dict') else arg(e)
+                                    for e in d.get(key))
+    return typing.get_origin(t)(reflective_solve_type(arg, 'l', {'l': e}) for e in d.get(key))
+
+
+def make_entry(id: str, n_metrics: int, n_results: int, n_runs: int) -> Entry:
+    entry = Entry(id=id, name=f'experiment_{id}', args='main.py --seed 0', date_created=Timestamp(1675779332),
+                  local_results_path='.tmt/results', date_saved=Timestamp(1675779432),
+                  metrics=[Metric(id, f'metric_{i}', i / n_metrics) for i in range(n_metrics)],
+                  results=[Result(id, f'result_{i}', f'.tmt/results/{id}/result_{i}.pkl') for i in range(n_results)])
+    entry.other_runs = [make_entry(f'{id}_{i}', n_metrics, n_results, 0) for i in range(n_runs)]
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Entry (de)serialization')
+    parser.add_argument('--entries', type=int, default=200)
+    parser.add_argument('--metrics', type=int, default=20)
+    parser.add_argument('--results', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=5, help='number of sub-entries (other_runs) per entry')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    entries = [make_entry(str(i), args.metrics, args.results, args.runs) for i in range(args.entries)]
+    dicts = [e.to_dict() for e in entries]
+    assert all(reflective_from_dict(Entry, d) == Entry.from_dict(d) for d in dicts[:10])
+    assert all(asdict(e) == e.to_dict() for e in entries[:10])
+
+    def bench(label, fn):
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f'{label:<28}{best * 1e3:10.2f} ms  ({best / len(entries) * 1e6:.1f} us/entry)')
+        return best
+
+    print(f'{args.entries} entries, {args.metrics} metrics, {args.results} results, {args.runs} sub-entries each')
+    old = bench('from_dict (reflective)', lambda: [reflective_from_dict(Entry, d) for d in dicts])
+    new = bench('from_dict (compiled)', lambda: [Entry.from_dict(d) for d in dicts])
+    print(f'{"":<28}{old / new:10.1f}x faster')
+    old = bench('to_dict (dataclasses.asdict)', lambda: [asdict(e) for e in entries])
+    new = bench('to_dict (compiled)', lambda: [e.to_dict() for e in entries])
+    print(f'{"":<28}{old / new:10.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
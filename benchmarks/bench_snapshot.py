@@ -0,0 +1,74 @@
+"""
+Benchmark of :py:meth:`tmt.history.snapshot.SnapshotManager.make_snapshot` on a synthetic project: the first snapshot
+(every file is hashed and copied to the object store), a snapshot of the unchanged project (every file is found in the
+manifest of the last snapshot) and a snapshot after changing a few files. For reference, the time of a
+:py:class:`filecmp.dircmp` walk of the project against the last snapshot (what snapshots used to start with) is
+reported as well.
+
+Run it from the repository root with ``python -m benchmarks.bench_snapshot``.
+"""
+from tmt.history.snapshot import SnapshotManager
+from filecmp import dircmp
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+
+def make_project(root: str, files: int, per_dir: int):
+    for i in range(files):
+        directory = os.path.join(root, f'pkg_{i // per_dir}')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'module_{i}.py'), 'w') as f:
+            f.write(f'# module {i}\n' + 'x = 1\n' * (i % 50))
+    # old enough for their hashes to be trusted
+    old = time.time() - 60
+    for directory, _, names in os.walk(root):
+        for name in names:
+            os.utime(os.path.join(directory, name), (old, old))
+
+
+def full_dircmp(cmp: dircmp):
+    cmp.diff_files
+    for sub in cmp.subdirs.values():
+        full_dircmp(sub)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark code snapshots')
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--per-dir', type=int, default=100)
+    parser.add_argument('--changed', type=int, default=10, help='files changed before the last snapshot')
+    parser.add_argument('--workers', type=int, default=1, help='threads linking files (snapshot_workers)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        source, tmt_dir = os.path.join(root, 'project'), os.path.join(root, '.tmt')
+        make_project(source, args.files, args.per_dir)
+        snapshots = os.path.join(tmt_dir, 'snapshots')
+
+        def snapshot(id: str) -> str:
+            manager = SnapshotManager(id, tmt_dir, snapshots, source, os.path.join(snapshots, 'last'),
+                                      workers=args.workers)
+            stats = manager.make_snapshot()
+            return f'{stats.seconds * 1e3:10.2f} ms {stats.files_per_second:10.0f} files/s ' \
+                   f'{stats.mb_per_second:8.1f} MB/s'
+
+        print(f'{args.files} files in {args.files // args.per_dir} directories, {args.workers} workers')
+        print(f'{"first snapshot":<36}{snapshot("first")}')
+        print(f'{"unchanged project":<36}{snapshot("unchanged")}')
+        start = time.perf_counter()
+        full_dircmp(dircmp(source, os.path.join(snapshots, 'unchanged')))
+        print(f'{"dircmp walk (reference)":<36}{(time.perf_counter() - start) * 1e3:10.2f} ms')
+        for i in range(args.changed):
+            with open(os.path.join(source, f'pkg_{i // args.per_dir}', f'module_{i}.py'), 'a') as f:
+                f.write('y = 2\n')
+        print(f'{f"{args.changed} changed files":<36}{snapshot("changed")}')
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,4 +21,7 @@ class BaseTest(unittest.TestCase):
             shutil.rmtree(context_manager.get().snap_manager.snapshot_target)
         if os.path.exists(context_manager.get().snap_manager.last_snapshot_link):
             os.remove(context_manager.get().snap_manager.last_snapshot_link)
-        shutil.rmtree(self.conf.results_path)
+        if os.path.exists(self.conf.results_path):
+            shutil.rmtree(self.conf.results_path)
+        if os.path.exists(context_manager.get().snap_manager.objects.path):
+            shutil.rmtree(context_manager.get().snap_manager.objects.path)
@@ -1,12 +1,18 @@
 import warnings
-from tmt import tmt_recorder
+from tmt import tmt_recorder, tmt_session
 from tmt.storage.json_db import DbManager
+from tmt.storage.schema import Entry, Timestamp
 from tmt.history.context import context_manager, ContextManager, Configs
+from tmt.history.snapshot import SnapshotManager
 from tmt.history.utils import save
 from tmt.exceptions import DuplicatedNameError
 from tmt.utils.duplicates import *
 from tests import BaseTest
+from unittest import mock
+import json
+import multiprocessing
 import os
+import threading
 import pickle
 
 
@@ -20,13 +26,25 @@ def decorated_fn(_):
     return returned_metrics
 
 
+def record_runs(threads, n):
+    fn = tmt_recorder('test_exp', config_path='tests/test_config.json',
+                      duplicate_strategy=DuplicateStrategy(DuplicatePolicy.AS_SUB_ENTRY))(lambda: returned_metrics)
+    workers = [threading.Thread(target=lambda: [fn() for _ in range(n)]) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
 class TestDecorators(BaseTest):
 
     def test_recorder(self):
-        metrics = decorated_fn(None)
+        with self.assertLogs('tmt.decorators.recorder', 'INFO') as logs:
+            metrics = decorated_fn(None)
         self.assertEqual(metrics, returned_metrics)
         self.assertIsInstance(context_manager.get(), ContextManager)
         entry = context_manager.get().entry
+        self.assertIn(str(context_manager.get().snap_manager.stats), logs.output[0])
         db_man = DbManager(context_manager.get().config.json_db_path)
         db_entry = db_man.get_entry_by_id(entry.id)
         self.assertEqual(entry.to_dict(), db_entry.to_dict())
@@ -74,6 +92,19 @@ class TestDecorators(BaseTest):
             if e.id == parent_id:
                 self.assertTrue(1 <= len(e.other_runs) <= 3)
 
+    def test_default_parent(self):
+        db_man = DbManager(self.conf.json_db_path)
+        db_man.delete_all()
+        db_man.add_new_entries([Entry(id='old', name='test_exp', args='', date_created=Timestamp(10),
+                                      local_results_path=''),
+                                Entry(id='new', name='test_exp_v2', args='', date_created=Timestamp(20),
+                                      local_results_path='')])
+        # the most recent of the entries whose name contains the new one, not only of the exact matches
+        with self.assertWarns(UserWarning):
+            manager = ContextManager('test_exp', 'tests/test_config.json',
+                                     DuplicateStrategy(DuplicatePolicy.AS_SUB_ENTRY))
+        self.assertEqual(manager.parent.id, 'new')
+
     def test_description(self):
         def test_fn(_):
             return returned_metrics
@@ -92,3 +123,93 @@ class TestDecorators(BaseTest):
         db_entry = db_man.get_entry_by_id(entry.id)
         self.assertEqual(db_entry.description, desc)
 
+
+    def test_session(self):
+        def test_fn(_):
+            return returned_metrics
+        db_man = DbManager(self.conf.json_db_path)
+        db_man.delete_all()
+        fn = tmt_recorder('test_exp', config_path='tests/test_config.json',
+                          duplicate_strategy=DuplicateStrategy(DuplicatePolicy.AS_SUB_ENTRY))(test_fn)
+        with mock.patch.object(DbManager, '_write_raw', autospec=True, side_effect=DbManager._write_raw) as write:
+            with tmt_session('tests/test_config.json'):
+                for _ in range(5):
+                    self.assertEqual(returned_metrics, fn(None))
+                # queued, but visible to the session
+                self.assertEqual(0, write.call_count)
+                self.assertEqual(0, len(db_man.get_entries_by_name('test_exp')))
+                unique_fn = tmt_recorder('test_exp', config_path='tests/test_config.json')(test_fn)
+                self.assertRaises(DuplicatedNameError, unique_fn, None)
+            self.assertEqual(1, write.call_count)
+        entries = db_man.get_entries_by_name('test_exp')
+        self.assertEqual(1, len(entries))
+        self.assertEqual(4, len(entries[0].other_runs))
+
+        # flushed when too many entries are queued
+        fn = tmt_recorder('test_exp', config_path='tests/test_config.json',
+                          duplicate_strategy=DuplicateStrategy(DuplicatePolicy.AS_NEW_ENTRY))(test_fn)
+        with mock.patch.object(DbManager, '_write_raw', autospec=True, side_effect=DbManager._write_raw) as write:
+            with tmt_session('tests/test_config.json', max_pending=2):
+                for _ in range(5):
+                    fn(None)
+                self.assertEqual(2, write.call_count)
+            self.assertEqual(3, write.call_count)
+        self.assertEqual(6, len(db_man.get_entries_by_name('test_exp')))
+
+    def test_background_snapshot(self):
+        with open('tests/test_config.json') as f:
+            config = json.load(f)
+        config_path = 'tests/test_config_background.json'
+        with open(config_path, 'w') as f:
+            json.dump({**config, 'background_snapshot': True}, f)
+        self.addCleanup(os.remove, config_path)
+        started = threading.Event()
+        original = SnapshotManager.make_snapshot
+
+        def make_snapshot(snap_manager):
+            started.set()
+            return original(snap_manager)
+
+        def test_fn():
+            # the snapshot is made while the experiment runs
+            self.assertTrue(started.wait(10))
+            return returned_metrics
+
+        with mock.patch.object(SnapshotManager, 'make_snapshot', autospec=True, side_effect=make_snapshot) as snapshot:
+            self.assertEqual(returned_metrics, tmt_recorder('test_exp', config_path=config_path)(test_fn)())
+        self.assertEqual(1, snapshot.call_count)
+        cm = context_manager.get()
+        self.assertTrue(os.path.isfile(cm.snap_manager.manifest_path))
+        self.assertEqual(cm.snap_manager.stats, cm.snap_manager.wait_snapshot())
+        self.assertIsNotNone(DbManager(self.conf.json_db_path).get_entry_by_id(cm.entry.id))
+
+        # a failed experiment leaves neither an entry nor a snapshot
+        last_snapshot = os.readlink(self.conf.last_snapshot_link)
+        started.clear()
+
+        def failing_fn():
+            self.assertTrue(started.wait(10))
+            raise ValueError('failed')
+
+        with mock.patch.object(SnapshotManager, 'make_snapshot', autospec=True, side_effect=make_snapshot):
+            self.assertRaises(ValueError, tmt_recorder('test_failed', config_path=config_path)(failing_fn))
+        cm = context_manager.get()
+        self.assertFalse(os.path.exists(cm.snap_manager.snapshot_dest))
+        self.assertFalse(os.path.exists(cm.snap_manager.manifest_path))
+        self.assertEqual(last_snapshot, os.readlink(self.conf.last_snapshot_link))
+        self.assertIsNone(DbManager(self.conf.json_db_path).get_entry_by_id(cm.entry.id))
+
+    def test_concurrent_recorders(self):
+        db_man = DbManager(self.conf.json_db_path)
+        db_man.delete_all()
+        tmt_recorder('test_exp', config_path='tests/test_config.json')(lambda: returned_metrics)()
+        processes = [multiprocessing.Process(target=record_runs, args=(4, 5)) for _ in range(3)]
+        for p in processes:
+            p.start()
+        record_runs(4, 5)
+        for p in processes:
+            p.join()
+        entries = DbManager(self.conf.json_db_path).get_entries_by_name('test_exp')
+        self.assertEqual(1, len(entries))
+        self.assertEqual(80, len(entries[0].other_runs))
+        self.assertTrue(os.path.isdir(os.readlink(self.conf.last_snapshot_link)))
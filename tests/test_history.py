@@ -1,7 +1,28 @@
 from tmt.history.snapshot import *
+from tmt.history.archive_snapshot import ArchiveSnapshotManager
+from tmt.history.git_snapshot import GitSnapshotManager, GIT_SUFFIX
+from tmt.history.restore import restore_snapshot, snapshot_file
+from tmt.history.walker import IgnoreWalker
+from filecmp import dircmp
+from unittest import mock
+import hashlib
+import subprocess
+import tarfile
+import tempfile
 import unittest
 
 
+def files(cmp: dircmp, directory: str, kind: str):
+    """
+    Yields the paths in `directory` of the files of the comparison `cmp` (and of its subdirectories) of a kind, e.g.
+    ``'diff_files'`` or ``'same_files'`` (see :py:class:`filecmp.dircmp`).
+    """
+    for n in getattr(cmp, kind):
+        yield os.path.join(directory, n)
+    for d, sub_cmp in cmp.subdirs.items():
+        yield from files(sub_cmp, os.path.join(directory, d), kind)
+
+
 class TestHistory(unittest.TestCase):
     def setUp(self):
         self.snap = SnapshotManager('test_id', 'tests', 'tests/snapshot_test', 'tests/fake_project', 'tests/snapshot_test/last', 'tests/.gitignore')
@@ -14,6 +35,8 @@ class TestHistory(unittest.TestCase):
             os.remove(self.snap.last_snapshot_link)
         if os.path.exists(self.new_folder):
             shutil.rmtree(self.new_folder)
+        if os.path.exists(self.snap.objects.path):
+            shutil.rmtree(self.snap.objects.path)
 
     def test_make_first_snapshot(self):
         self.assertFalse(os.path.exists(self.snap.last_snapshot_link))
@@ -71,7 +94,152 @@ class TestHistory(unittest.TestCase):
         self.snap.ignore_path = ''
         self.test_make_snapshot_with_diff()
 
+    def test_object_store(self):
+        init_file = os.path.join(self.snap.snapshot_source, '__init__.py')
+        with open(init_file) as f:
+            content = f.read()
+        self.addCleanup(lambda: open(init_file, 'w').write(content))
+        with mock.patch('tmt.history.objects.RACY_NS', 0):
+            self.test_make_first_snapshot()
+            first_dest = self.snap.snapshot_dest
+            # going back to a previous content doesn't copy it again, even if the last snapshot doesn't have it
+            for i, text in enumerate(('print("branch")', content), start=1):
+                with open(init_file, 'w') as f:
+                    f.write(text)
+                self.snap = self.__next_snapshot(f'test_id_{i}')
+                self.snap.make_snapshot()
+                self.__assert_no_diff()
+            self.assertTrue(os.path.samefile(os.path.join(first_dest, '__init__.py'),
+                                             os.path.join(self.snap.snapshot_dest, '__init__.py')))
+            # unchanged files are not read again
+            self.snap = self.__next_snapshot('test_id_3')
+            with mock.patch('hashlib.sha256', side_effect=hashlib.sha256) as sha256:
+                self.snap.make_snapshot()
+            self.assertEqual(sha256.call_count, 0)
+        self.__assert_no_diff()
+
+    def test_manifest(self):
+        with mock.patch('tmt.history.objects.RACY_NS', 0), mock.patch('tmt.history.snapshot.RACY_NS', 0):
+            self.test_make_first_snapshot()
+            manifest = self.snap.last_manifest()
+            self.assertEqual(sorted(manifest), sorted(path for path, _ in self.snap.source_files()))
+            # unchanged files are found in the manifest of the last snapshot, without the hash cache
+            os.remove(self.snap.objects.cache_path)
+            new_file = os.path.join(self.snap.snapshot_source, 'new_file.py')
+            with open(new_file, 'w') as f:
+                f.write('print("new")')
+            self.addCleanup(os.remove, new_file)
+            self.snap = self.__next_snapshot('test_id_1')
+            with mock.patch('hashlib.sha256', side_effect=hashlib.sha256) as sha256:
+                self.snap.make_snapshot()
+            self.assertEqual(sha256.call_count, 1)
+            self.assertEqual(len(self.snap.last_manifest()), len(manifest) + 1)
+        self.__assert_no_diff()
+
+    def test_parallel_snapshot(self):
+        self.snap.workers = 4
+        stats = self.snap.make_snapshot()
+        self.__assert_no_diff()
+        manifest = self.snap.last_manifest()
+        self.assertEqual(stats.files, len(manifest))
+        self.assertEqual(stats.bytes, sum(m[0] for m in manifest.values()))
+        self.assertEqual(stats.unchanged, 0)
+        self.snap = self.__next_snapshot('test_id_1')
+        stats = self.snap.make_snapshot()
+        self.assertEqual({path: m[3] for path, m in self.snap.last_manifest().items()},
+                         {path: m[3] for path, m in manifest.items()})
+        self.assertEqual(stats.unchanged, stats.files)
+        self.assertGreater(stats.files_per_second, 0)
+
+    def test_ignore_walker(self):
+        with tempfile.TemporaryDirectory() as root:
+            files = {
+                '.gitignore': 'venv/\n*.log\n',
+                'main.py': '', 'run.log': '', 'venv/lib/site.py': '', '.git/HEAD': '', '.tmt/tmt_db.json': '',
+                'data/.gitignore': '*.csv\n!keep.csv\n', 'data/a.csv': '', 'data/keep.csv': '',
+                'data/raw/b.csv': '', 'data/.tmtignore': 'raw/\n', 'src/.tmtignore': '!debug.log\n',
+                'src/debug.log': '', 'src/util.py': '',
+            }
+            for path, content in files.items():
+                os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+                with open(os.path.join(root, path), 'w') as f:
+                    f.write(content)
+            walker = IgnoreWalker(root, excluded=[os.path.join(root, '.tmt')])
+            with mock.patch('os.scandir', side_effect=os.scandir) as scandir:
+                walked = sorted(path for path, _ in walker.walk())
+            self.assertEqual(walked, ['.gitignore', 'data/.gitignore', 'data/.tmtignore', 'data/keep.csv', 'main.py',
+                                      'src/.tmtignore', 'src/debug.log', 'src/util.py'])
+            # ignored directories are not walked
+            self.assertEqual(sorted(walker.ignored), ['.git', '.tmt', 'data/a.csv', 'data/raw', 'run.log', 'venv'])
+            self.assertEqual(scandir.call_count, 3)
+
+    def test_restore_snapshot(self):
+        self.snap.make_snapshot()
+        with tempfile.TemporaryDirectory() as dest:
+            restore_snapshot(self.snap.snapshot_dest, dest)
+            self.assertEqual(list(files(dircmp(self.snap.snapshot_dest, dest), dest, 'diff_files')), [])
+            self.assertRaises(FileExistsError, restore_snapshot, self.snap.snapshot_dest, dest)
+        # rebuilt in place
+        shutil.rmtree(self.snap.snapshot_dest)
+        restore_snapshot(self.snap.snapshot_dest)
+        self.__assert_no_diff()
+
+    @unittest.skipIf(shutil.which('git') is None, 'git is not installed')
+    def test_git_snapshot(self):
+        with tempfile.TemporaryDirectory() as root:
+            def git(*args):
+                subprocess.run(('git', '-c', 'user.name=tmt', '-c', 'user.email=tmt@tmt') + args, cwd=root,
+                               check=True, capture_output=True)
+
+            source = os.path.join(root, 'project')
+            shutil.copytree(self.snap.snapshot_source, source)
+            git('init')
+            git('add', '-A')
+            git('commit', '-m', 'init')
+            with open(os.path.join(source, 'fake_main.py'), 'a') as f:
+                f.write('\nprint("dirty")')
+            with open(os.path.join(source, 'untracked.py'), 'w') as f:
+                f.write('print("untracked")')
+            snap = GitSnapshotManager('git_id', os.path.join(root, '.tmt'), os.path.join(root, '.tmt', 'snapshots'),
+                                      source, os.path.join(root, '.tmt', 'snapshots', 'last'), self.snap.ignore_path)
+            stats = snap.make_snapshot()
+            self.assertEqual(stats.files, 1)
+            self.assertFalse(os.path.exists(snap.snapshot_dest))
+            self.assertTrue(os.path.isfile(snap.snapshot_dest + GIT_SUFFIX))
+            restore_snapshot(snap.snapshot_dest)
+            cmp = dircmp(source, snap.snapshot_dest)
+            self.assertEqual(list(files(cmp, source, 'diff_files')), [])
+            self.assertEqual(list(files(cmp, source, 'right_only')), [])
+            self.assertIn(os.path.join(source, 'untracked.py'), list(files(cmp, source, 'same_files')))
+
+    def test_archive_snapshot(self):
+        for compression in ('gz', 'xz'):
+            with self.subTest(compression=compression), mock.patch('tmt.history.archive_snapshot.BLOCK_SIZE', 512):
+                snap = ArchiveSnapshotManager(compression, self.snap.tmt_dir, self.snap.snapshot_target,
+                                              self.snap.snapshot_source, self.snap.last_snapshot_link,
+                                              self.snap.ignore_path, compression=compression)
+                stats = snap.make_snapshot()
+                self.assertFalse(os.path.exists(snap.snapshot_dest))
+                with tarfile.open(snap.archive_path) as tar:
+                    self.assertEqual(sorted(tar.getnames()), sorted(path for path, _ in snap.source_files()))
+                self.assertEqual(stats.files, len(snap.last_index()))
+                # only the requested file is extracted
+                path = os.path.join('fake_utils', 'utils.py')
+                self.assertEqual(snapshot_file(snap.snapshot_dest, path), os.path.join(snap.snapshot_dest, path))
+                self.assertEqual(os.listdir(snap.snapshot_dest), ['fake_utils'])
+                with open(os.path.join(snap.snapshot_source, path), 'rb') as f, \
+                        open(os.path.join(snap.snapshot_dest, path), 'rb') as g:
+                    self.assertEqual(f.read(), g.read())
+                self.assertRaises(FileNotFoundError, snapshot_file, snap.snapshot_dest, 'missing.py')
+                restore_snapshot(snap.snapshot_dest)
+                self.snap = snap
+                self.__assert_no_diff()
+
+    def __next_snapshot(self, id: str) -> SnapshotManager:
+        return SnapshotManager(id, self.snap.tmt_dir, self.snap.snapshot_target, self.snap.snapshot_source,
+                               self.snap.last_snapshot_link, self.snap.ignore_path, self.snap.workers)
+
     def __assert_no_diff(self):
         cmp = dircmp(self.snap.snapshot_source, self.snap.snapshot_dest)
-        self.assertEqual(list(self.snap.get_diff_files(cmp, self.snap.snapshot_source)), [])
+        self.assertEqual(list(files(cmp, self.snap.snapshot_source, 'diff_files')), [])
         return cmp
@@ -1,7 +1,21 @@
 from tmt.storage.schema import *
 from tmt.storage.json_db import DbManager
+from tmt.storage.jsonl_db import JsonlDbManager
+from tmt.storage.sqlite_db import SqliteDbManager
+from tmt.storage.wal_db import WalDbManager
+from tmt.storage.daemon import DaemonDbManager, DbServer, _connect, connect
+from tmt.storage.merge import MergeReport, detect_backend, merge_databases, open_db
+from tmt.storage.archive import SegmentDbManager, archive_entries
+from tmt.storage.stream import JsonArrayStream
 from tests import BaseTest
 from datetime import datetime
+from filelock import FileLock, Timeout
+from unittest import mock
+import multiprocessing
+import os
+import shutil
+import threading
+import warnings
 
 
 @dataclass
@@ -19,6 +33,13 @@ class T2(BaseJsonDataclass):
     t2: typing.Optional[T1]
 
 
+def add_entries(db_path, prefix, n):
+    db = DbManager(db_path)
+    for i in range(n):
+        db.add_new_entries([Entry(id=f'{prefix}_{i}', name=prefix, args='', date_created=Timestamp(i),
+                                  local_results_path='')])
+
+
 class TestSchema(BaseTest):
 
     def test_from_dict(self):
@@ -41,6 +62,17 @@ class TestSchema(BaseTest):
         self.assertTrue(isinstance(t4.t1, T1))
         self.assertIsNone(t4.t2)
 
+    def test_to_dict(self):
+        from dataclasses import asdict
+        d = {'a': 3, 'b': [1, 2, 3], 'c': None, 'd': 'd', 'e': [[1, 2], [3, 4]]}
+        t2 = T2.from_dict({'t1': d, 't2': None})
+        self.assertEqual(t2.to_dict(), asdict(t2))
+        entry = Entry(id='e', name='n', args='', date_created=Timestamp(0), local_results_path='',
+                      metrics=[Metric('e', 'f1', 0.3)], results=[Result('e', 'r', 'p')])
+        entry.other_runs.append(Entry.from_dict(entry.to_dict()))
+        self.assertEqual(entry.to_dict(), asdict(entry))
+        self.assertEqual(Entry.from_dict(entry.to_dict()), entry)
+
     def test_from_json(self):
         import copy
         d = {'id': 0, 'name': 'test', 'date_created': int(datetime.now().timestamp()), 'local_results_path': '', 'metrics': [
@@ -82,6 +114,634 @@ class TestSchema(BaseTest):
             d = next(filter(lambda d: d['id'] == entry.id, data))
             self.assertEqual(d['name'], entry.name)
 
+    def test_read_cache(self):
+        db = DbManager(self.conf.json_db_path)
+        entry = Entry(id='21jf10jf', name='asdf', args='asdf', date_created=Timestamp(0), local_results_path='')
+        db.add_new_entries([entry])
+        with mock.patch.object(DbManager, '_read_raw', autospec=True, side_effect=DbManager._read_raw) as read_raw:
+            for _ in range(3):
+                self.assertEqual(db.get_entry_by_id(entry.id).to_dict(), entry.to_dict())
+                self.assertEqual(len(DbManager(self.conf.json_db_path).get_entries_by_name('as')), 1)
+            self.assertEqual(read_raw.call_count, 0)
+            # someone else wrote the database
+            with open(db.db_path, 'w') as f:
+                json.dump({'data': []}, f)
+            self.assertIsNone(db.get_entry_by_id(entry.id))
+            self.assertEqual(read_raw.call_count, 1)
+
+    def test_atomic_writes(self):
+        db = DbManager(self.conf.json_db_path)
+        entry = Entry(id='21jf10jf', name='asdf', args='asdf', date_created=Timestamp(0), local_results_path='')
+        db.add_new_entries([entry])
+        # readers don't take the lock
+        with mock.patch.object(FileLock, 'acquire', side_effect=AssertionError):
+            db._invalidate_view()
+            self.assertEqual(db.get_entry_by_id(entry.id), entry)
+            db._invalidate_view()
+            self.assertEqual(list(db.iter_entries()), [entry])
+        # a failed write leaves the database as it was
+        with mock.patch('json.dumps', side_effect=KeyboardInterrupt), self.assertRaises(KeyboardInterrupt):
+            db.delete_entry(entry)
+        self.assertEqual(DbManager(self.conf.json_db_path).get_all_entries(), [entry])
+        self.assertFalse([f for f in os.listdir(os.path.dirname(db.db_path)) if f.endswith('.tmp')])
+        # concurrent writers don't lose updates
+        processes = [multiprocessing.Process(target=add_entries, args=(db.db_path, f'p{i}', 10)) for i in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        self.assertEqual(len(DbManager(self.conf.json_db_path).get_all_entries()), 41)
+        with open(db.db_path) as f:
+            self.assertEqual(json.load(f)['version'], 41)
+        # after a conflict, the write is done again holding the lock, so that it can't conflict twice
+        other = DbManager(self.conf.json_db_path)
+        held = []
+
+        def is_held():
+            try:
+                other.lock.acquire(timeout=0)
+            except Timeout:
+                return True
+            other.lock.release()
+            return False
+
+        def apply(db_data):
+            if not held:
+                # a concurrent write
+                other.delete_all()
+            thread = threading.Thread(target=lambda: held.append(is_held()))
+            thread.start()
+            thread.join()
+            db_data['data'].append(entry.to_dict())
+            return True
+
+        self.assertTrue(db._transaction(apply))
+        self.assertEqual(held, [False, True])
+        self.assertEqual(DbManager(self.conf.json_db_path).get_all_entries(), [entry])
+
+    def test_compact_entries(self):
+        db = DbManager('tests/test_db_tui.json', read_only=True)
+        entries = db.get_all_entries()
+        compact_entries = db.get_all_entries(compact=True)
+        self.assertEqual([e.to_dict() for e in entries], [e.to_dict() for e in compact_entries])
+        self.assertEqual([e.to_entry() for e in compact_entries], entries)
+        for entry in compact_entries:
+            self.assertFalse(hasattr(entry, '__dict__'))
+            for metric in entry.metrics:
+                self.assertIs(metric.entry_id, entry.id)
+
+    def test_iter_entries(self):
+        entries = [Entry(id=str(i), name=f'exp_{i % 3}', args='', date_created=Timestamp(i), local_results_path='')
+                   for i in range(10)]
+        backends = ((DbManager, self.conf.json_db_path), (JsonlDbManager, self.conf.json_db_path + 'l'),
+                    (SqliteDbManager, self.conf.json_db_path + '.sqlite'))
+        for cls, path in backends:
+            with self.subTest(backend=cls.__name__):
+                db = cls(path)
+                if path != self.conf.json_db_path:
+                    self.addCleanup(os.remove, path)
+                db.add_new_entries(entries)
+                # forget the parsed db, so that the json backend has to stream it
+                db._invalidate_view()
+                self.assertEqual(list(db.iter_entries()), entries)
+                self.assertEqual(list(db.iter_entries(lambda e: e.name == 'exp_1', offset=1, limit=2)),
+                                 [entries[4], entries[7]])
+                pages = [db.get_page(3)]
+                while pages[-1].cursor is not None:
+                    pages.append(db.get_page(3, pages[-1].cursor))
+                self.assertEqual([len(p.entries) for p in pages], [3, 3, 3, 1])
+                self.assertEqual([e for p in pages for e in p.entries], entries)
+                # a cursor is still valid after the database changed
+                db.delete_entry(entries[0])
+                self.assertEqual(db.get_page(3, pages[1].cursor).entries, entries[6:9])
+                db.delete_all()
+
+    def test_sub_entries(self):
+        def make_entry(id, parent_id=None):
+            return Entry(id=id, name='seeds', args='', date_created=Timestamp(0), local_results_path='',
+                         metrics=[Metric(id, 'f1', 0.5)], parent_id=parent_id)
+        legacy = make_entry('legacy', 'parent')
+        backends = ((DbManager, self.conf.json_db_path), (JsonlDbManager, self.conf.json_db_path + 'l'),
+                    (SqliteDbManager, self.conf.json_db_path + '.sqlite'))
+        for cls, path in backends:
+            with self.subTest(backend=cls.__name__):
+                db = cls(path)
+                if path != self.conf.json_db_path:
+                    self.addCleanup(os.remove, path)
+                parent = make_entry('parent')
+                db.add_new_entries([parent, make_entry('other')])
+                runs = [make_entry(f'run_{i}', 'parent') for i in range(3)]
+                for run in runs:
+                    db.add_or_update_entry(run)
+                runs[1].metrics[0].value = 0.9
+                db.add_or_update_entry(runs[1])
+                self.assertWarns(UserWarning, db.add_new_entries, [make_entry('orphan', 'missing')])
+                parent.other_runs = runs
+                self.assertEqual(db.get_entry_by_id('parent'), parent)
+                self.assertEqual(db.query().name('seeds').all(), [parent, make_entry('other')])
+                db._invalidate_view()
+                self.assertEqual(next(db.iter_entries()), parent)
+                # a new run added through the parent is stored on its own as well
+                parent.other_runs.append(make_entry('run_3', 'parent'))
+                db.update_entries([parent])
+                self.assertEqual(db.get_entry_by_id('parent'), parent)
+                self.assertTrue(db.delete_entry(parent))
+                self.assertEqual(db.get_all_entries(), [make_entry('other')])
+                db.add_new_entries([make_entry('run_0', 'other')])
+                self.assertEqual(len(db.get_entry_by_id('other').other_runs), 1)
+                db.delete_all()
+        # sub-entries saved by older versions are stored in their parent
+        with open(self.conf.json_db_path, 'w') as f:
+            json.dump({'data': [dict(make_entry('parent').to_dict(), other_runs=[make_entry('legacy').to_dict()])]}, f)
+        db = DbManager(self.conf.json_db_path)
+        self.assertEqual(db.get_entry_by_id('parent').other_runs, [legacy])
+        db.add_or_update_entry(make_entry('run_0', 'parent'))
+        self.assertEqual(db.get_entry_by_id('parent').other_runs, [legacy, make_entry('run_0', 'parent')])
+        with open(self.conf.json_db_path) as f:
+            self.assertEqual([d['id'] for d in json.load(f)['data']], ['parent', 'run_0'])
+        # sub-entries may be anywhere in the file, e.g. before their parent
+        with open(self.conf.json_db_path, 'w') as f:
+            json.dump({'data': [make_entry('run_0', 'parent').to_dict(), make_entry('other').to_dict(),
+                                make_entry('parent').to_dict()]}, f)
+        db = DbManager(self.conf.json_db_path)
+        db._invalidate_view()
+        parent = make_entry('parent')
+        parent.other_runs = [make_entry('run_0', 'parent')]
+        with mock.patch.object(JsonArrayStream, 'start', autospec=True, side_effect=JsonArrayStream.start) as start:
+            pages = [db.get_page(1)]
+            pages.append(db.get_page(1, pages[0].cursor))
+        self.assertEqual([e for p in pages for e in p.entries], [make_entry('other'), parent])
+        # the sub-entries are only looked for once
+        self.assertEqual(start.call_count, 1)
+
+    def test_date_queries(self):
+        entries = [Entry(id=str(i), name=f'exp_{i % 2}', args='', date_created=Timestamp(100 - 10 * i),
+                         local_results_path='', date_saved=Timestamp(i) if i % 3 else None) for i in range(10)]
+        backends = ((DbManager, self.conf.json_db_path), (SqliteDbManager, self.conf.json_db_path + '.sqlite'))
+        for cls, path in backends:
+            with self.subTest(backend=cls.__name__):
+                db = cls(path)
+                if path != self.conf.json_db_path:
+                    self.addCleanup(os.remove, path)
+                db.add_new_entries(entries)
+                self.assertEqual(db.get_entries_between_dates(30, 60), entries[4:8][::-1])
+                self.assertEqual(db.get_entries_greater_than_date(datetime.fromtimestamp(80)), entries[:2][::-1])
+                self.assertEqual(db.get_entries_lower_than_date(20), [entries[9]])
+                self.assertEqual(db.get_entries_greater_than_date(5, field='date_saved'), [entries[7], entries[8]])
+                self.assertEqual(db.get_most_recent_entries(3), entries[:3])
+                self.assertEqual(db.get_most_recent_entries(2, name='exp_1'), [entries[1], entries[3]])
+                self.assertEqual(db.get_most_recent_entries(2, field='date_saved'), [entries[8], entries[7]])
+                self.assertRaises(ValueError, db.get_most_recent_entries, 1, field='timestamp')
+                db.delete_all()
+
+    def test_query(self):
+        entries = [Entry(id=str(i), name=f'{"resnet" if i % 2 else "vgg"}_{i % 3}', args='',
+                         date_created=Timestamp(i // 2), local_results_path='',
+                         metrics=[Metric(str(i), 'f1', (i * 7 % 10) / 10)] if i % 4 else [])
+                   for i in range(20)]
+        backends = ((DbManager, self.conf.json_db_path), (JsonlDbManager, self.conf.json_db_path + 'l'),
+                    (SqliteDbManager, self.conf.json_db_path + '.sqlite'))
+        f1 = {e.id: e.metrics[0].value for e in entries if e.metrics}
+        for cls, path in backends:
+            with self.subTest(backend=cls.__name__):
+                db = cls(path)
+                if path != self.conf.json_db_path:
+                    self.addCleanup(os.remove, path)
+                db.add_new_entries(entries)
+                self.assertEqual(db.query().all(), entries)
+                self.assertEqual(db.query().name_regex(r'resnet').between(2, 7).metric('f1', '>', 0.3).all(),
+                                 [e for e in entries if e.name.startswith('resnet') and 2 <= e.date_created <= 7
+                                  and f1.get(e.id, 0) > 0.3])
+                self.assertEqual(db.query().name('vgg_1', exact=True).after(3).all(),
+                                 [e for e in entries if e.name == 'vgg_1' and e.date_created > 3])
+                self.assertEqual(db.query().id('3', '4', '5').name('_').before(2).all(), [entries[3]])
+                self.assertEqual(db.query().order_by('metrics.f1', descending=True).limit(3).all(),
+                                 sorted(entries, key=lambda e: -f1.get(e.id, -1))[:3])
+                # entries without the metric come last
+                self.assertEqual(db.query().order_by('metrics.f1').offset(12).all(),
+                                 sorted(entries, key=lambda e: f1.get(e.id, 2))[12:])
+                self.assertEqual(db.query().order_by('date_created', descending=True).where(
+                    lambda e: int(e.id) % 5 == 0).limit(2).all(), [entries[15], entries[10]])
+                self.assertEqual(db.query().name('resnet').count(), 10)
+                self.assertIsNone(db.query().metric('f1', '>', 1).first())
+                self.assertRaises(ValueError, db.query().order_by, 'timestamp')
+                db.delete_all()
+
+    def test_merge(self):
+        def make_entry(id, runs=(), path='/node/results'):
+            return Entry(id=id, name='exp', args='', date_created=Timestamp(0), local_results_path=path,
+                         results=[Result(id, 'preds', f'{path}/{id}.pkl')],
+                         other_runs=[Entry(id=run, name='exp', args='', date_created=Timestamp(0),
+                                           local_results_path=path, parent_id=id) for run in runs])
+        sources = ((JsonlDbManager, self.conf.json_db_path + 'l', [make_entry('a', ['a_0']), make_entry('b')]),
+                   (SqliteDbManager, self.conf.json_db_path + '.sqlite', [make_entry('a', ['a_1']), make_entry('c')]))
+        for cls, path, entries in sources:
+            self.addCleanup(os.remove, path)
+            cls(path).add_new_entries(entries)
+            self.assertIs(detect_backend(path), cls)
+        target = DbManager(self.conf.json_db_path)
+        target.add_new_entries([make_entry('b', path='/data/results'), make_entry('d', ['d_0'])])
+        self.assertIs(detect_backend(target.db_path), DbManager)
+        unknown_path = self.conf.json_db_path + '.txt'
+        with open(unknown_path, 'w') as f:
+            f.write('not a database\n')
+        self.addCleanup(os.remove, unknown_path)
+        self.assertIs(detect_backend(unknown_path, default=JsonlDbManager), JsonlDbManager)
+        report = merge_databases(target, [open_db(path, read_only=True) for _, path, _ in sources],
+                                 {'/node': '/data', '/node/results/a.pkl': '/archive/a.pkl', '/node/res': '/x'})
+        self.assertEqual(report, MergeReport(read=4, added=2, merged=1, sub_entries=1, skipped=1))
+        merged = target.get_entry_by_id('a')
+        self.assertEqual([run.id for run in merged.other_runs], ['a_0', 'a_1'])
+        self.assertEqual(merged.results[0].path, '/archive/a.pkl')
+        self.assertEqual(target.get_entry_by_id('c').results[0].path, '/data/results/c.pkl')
+        self.assertEqual(merged.other_runs[1].local_results_path, '/data/results')
+        self.assertEqual([e.id for e in DbManager(self.conf.json_db_path).get_all_entries()], ['b', 'd', 'a', 'c'])
+        self.assertEqual(target.get_entry_by_id('b'), make_entry('b', path='/data/results'))
+
+    def test_archive(self):
+        entries = [Entry(id=str(i), name=f'exp_{i % 3}', args='', date_created=Timestamp(i * 10), local_results_path='',
+                         metrics=[Metric(str(i), 'f1', i / 10)]) for i in range(10)]
+        entries[2].other_runs.append(Entry(id='2_0', name='exp_2', args='', date_created=Timestamp(21),
+                                           local_results_path='', parent_id='2'))
+        backends = ((DbManager, self.conf.json_db_path), (SqliteDbManager, self.conf.json_db_path + '.sqlite'))
+        for cls, path in backends:
+            with self.subTest(backend=cls.__name__):
+                db = cls(path)
+                if path != self.conf.json_db_path:
+                    self.addCleanup(os.remove, path)
+                self.addCleanup(shutil.rmtree, db.archive.path)
+                db.add_new_entries(entries)
+                self.assertRaises(ValueError, archive_entries, db)
+                report = archive_entries(db, before=50)
+                self.assertEqual(report.archived, 5)
+                self.assertEqual([e.id for e in cls(path).get_all_entries()], ['5', '6', '7', '8', '9'])
+                with mock.patch.object(SegmentDbManager, '_read_raw', autospec=True,
+                                       side_effect=SegmentDbManager._read_raw) as read_raw:
+                    # the index says the archive can't match
+                    self.assertEqual(db.get_entries_greater_than_date(60), entries[7:])
+                    self.assertEqual(db.get_most_recent_entries(3), entries[:-4:-1])
+                    self.assertEqual(db.get_entries_by_metric('acc'), [])
+                    self.assertIsNone(db.get_entry_by_id('missing'))
+                    self.assertEqual(read_raw.call_count, 0)
+                    self.assertEqual(db.get_entry_by_id('2'), entries[2])
+                    self.assertEqual(read_raw.call_count, 1)
+                self.assertEqual(db.get_all_entries(archived=True), entries)
+                self.assertEqual(list(db.iter_entries()), entries[5:])
+                self.assertEqual(list(db.iter_entries(archived=True)), entries[5:] + entries[:5])
+                self.assertEqual(list(db.iter_entries(lambda e: e.name == 'exp_1', limit=2, archived=True)),
+                                 [entries[7], entries[1]])
+                segment = db.archive.open(db.archive.segments()[0])
+                self.assertFalse(segment.delete_entry(entries[0]))
+                segment.delete_all()
+                self.assertEqual(db.get_all_entries(archived=True), entries)
+                self.assertEqual(db.get_entries_between_dates(30, 60), entries[3:7])
+                self.assertEqual(db.get_entries_lower_than_date(20), entries[:2])
+                self.assertEqual(db.get_entries_by_name('exp_1'), [entries[1], entries[4], entries[7]])
+                self.assertEqual(db.get_entries_by_name_regex(r'exp_[12]'), [e for e in entries if e.name != 'exp_0'])
+                self.assertEqual(db.get_most_recent_entries(7), entries[:-8:-1])
+                self.assertEqual(db.get_most_recent_entries(2, name='exp_2'), [entries[8], entries[5]])
+                self.assertEqual(db.get_entries_by_metric('f1', 0.25, 0.55), entries[3:6])
+                query = db.query().name('exp_0', exact=True).order_by('metrics.f1', descending=True).offset(1)
+                self.assertEqual(query.all(), [entries[6], entries[3], entries[0]])
+                # a second segment, selected by a query
+                report = archive_entries(db, query=db.query().name_regex('exp_0'))
+                self.assertEqual([e.id for e in db.get_all_entries()], ['5', '7', '8'])
+                self.assertEqual(report.segment.file, 'segment-000002.json.gz')
+                # archived entries come first
+                self.assertEqual(db.query().between(0, 60).all(), entries[:5] + [entries[6], entries[5]])
+                self.assertEqual(db.get_all_entries(archived=True), entries[:5] + [entries[6], entries[9], entries[5],
+                                                                                    entries[7], entries[8]])
+
     def test_search_by_regex(self):
         db = DbManager('tests/test_db_tui.json', read_only=True)
         self.assertGreater(len(db.get_entries_by_name_regex(r'test\d')), 0)
+
+
+class TestJsonlDb(BaseTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.db_path = os.path.join(os.path.dirname(self.conf.json_db_path), 'test_db.jsonl')
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        for suffix in ('', '.lock', '.bak'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def test_add_update_delete(self):
+        db = JsonlDbManager(self.db_path)
+        entry = Entry(id='21jf10jf', name='asdf', args='asdf', date_created=Timestamp(0), local_results_path='')
+        db.add_new_entries([entry])
+        self.assertWarns(UserWarning, db.add_new_entries, [entry])
+        entry.name = 'updated'
+        db.update_entries([entry])
+        self.assertEqual(JsonlDbManager(self.db_path).get_entry_by_id(entry.id).name, 'updated')
+        with open(self.db_path, 'r') as f:
+            self.assertEqual([json.loads(line)['op'] for line in f], ['add', 'update'])
+        self.assertTrue(db.delete_entry(entry))
+        self.assertFalse(db.delete_entry(entry))
+        self.assertIsNone(JsonlDbManager(self.db_path).get_entry_by_id(entry.id))
+
+    def test_compaction(self):
+        db = JsonlDbManager(self.db_path)
+        db.COMPACTION_MIN_RECORDS = 10
+        entry = Entry(id='21jf10jf', name='asdf', args='asdf', date_created=Timestamp(0), local_results_path='')
+        db.add_new_entries([entry])
+        for i in range(20):
+            entry.description = str(i)
+            db.update_entries([entry])
+        with open(self.db_path, 'r') as f:
+            self.assertLessEqual(len(f.readlines()), 10)
+        self.assertEqual(JsonlDbManager(self.db_path).get_entry_by_id(entry.id).description, '19')
+
+        # sub-entries stored in their parent are linked when read, not rewritten
+        entry.other_runs.append(Entry(id='sub', name='asdf', args='', date_created=Timestamp(1),
+                                      local_results_path=''))
+        db.update_entries([entry])
+        self.assertEqual(db.get_entry_by_id(entry.id).other_runs[0].parent_id, entry.id)
+        db.compact()
+        with open(self.db_path, 'r') as f:
+            self.assertIsNone(json.loads(f.readlines()[-1])['entry']['other_runs'][0]['parent_id'])
+
+    def test_migration(self):
+        shutil.copy('tests/test_db_tui.json', self.db_path)
+        old = DbManager('tests/test_db_tui.json', read_only=True)
+        db = JsonlDbManager(self.db_path)
+        self.assertTrue(os.path.exists(self.db_path + '.bak'))
+        self.assertEqual([e.to_dict() for e in db.get_entries_by_name('')],
+                         [e.to_dict() for e in old.get_entries_by_name('')])
+
+        # a broken log is never taken for a json database
+        os.remove(self.db_path + '.bak')
+        with open(self.db_path, 'w') as f:
+            f.write('{"op": "add", "entry": \n')
+        db = JsonlDbManager(self.db_path)
+        self.assertFalse(os.path.exists(self.db_path + '.bak'))
+        self.assertRaises(json.JSONDecodeError, db.get_all_entries)
+
+    def test_concurrent_readers(self):
+        db = JsonlDbManager(self.db_path)
+        entries = [Entry(id=str(i), name='asdf', args='', date_created=Timestamp(i), local_results_path='')
+                   for i in range(200)]
+        errors = []
+
+        def read():
+            try:
+                for _ in range(50):
+                    read_entries = db.get_all_entries()
+                    if read_entries != entries[:len(read_entries)]:
+                        errors.append(read_entries)
+            except Exception as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=lambda: [db.add_new_entries([e]) for e in entries])
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for t in [writer, *readers]:
+            t.start()
+        for t in [writer, *readers]:
+            t.join()
+        # every record was replayed exactly once
+        self.assertEqual(errors, [])
+        self.assertEqual(db.get_all_entries(), entries)
+        self.assertEqual(db._records, len(entries))
+
+
+class TestSqliteDb(BaseTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.db_path = os.path.join(os.path.dirname(self.conf.json_db_path), 'test_db.sqlite')
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        for suffix in ('', '.bak'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def test_round_trip(self):
+        db = SqliteDbManager(self.db_path)
+        entry = Entry(id='parent', name='asdf', args='asdf', date_created=Timestamp(10), local_results_path='',
+                      metrics=[Metric('parent', 'f1', 0.5)], results=[Result('parent', 'preds', '/a/path')])
+        sub_entry = Entry(id='child', name='asdf', args='', date_created=Timestamp(20), local_results_path='',
+                          metrics=[Metric('child', 'f1', 0.9)], parent_id='parent')
+        entry.other_runs.append(sub_entry)
+        db.add_new_entries([entry])
+        self.assertWarns(UserWarning, db.add_new_entries, [entry])
+        self.assertEqual(db.get_entry_by_id('parent').to_dict(), entry.to_dict())
+        self.assertIsNone(db.get_entry_by_id('child'))
+        self.assertEqual(len(db.get_entries_by_metric('f1', min_value=0.4)), 1)
+        self.assertEqual(len(db.get_entries_by_metric('f1', min_value=0.6)), 0)
+        self.assertEqual(len(db.get_entries_between_dates(0, 15)), 1)
+        self.assertEqual(len(db.get_entries_by_name_regex('as.f')), 1)
+
+        entry.name = 'updated'
+        entry.other_runs[0].metrics.append(Metric('child', 'acc', 0.1))
+        db.update_entries([entry])
+        self.assertEqual(SqliteDbManager(self.db_path).get_entry_by_exact_name('updated').to_dict(), entry.to_dict())
+        self.assertTrue(db.delete_entry(entry))
+        self.assertEqual(db._read_raw(), [])
+
+    def test_migration(self):
+        shutil.copy('tests/test_db_tui.json', self.db_path)
+        old = DbManager('tests/test_db_tui.json', read_only=True)
+        db = SqliteDbManager(self.db_path)
+        self.assertTrue(os.path.exists(self.db_path + '.bak'))
+        self.assertEqual([e.to_dict() for e in db.get_entries_by_name('')],
+                         [e.to_dict() for e in old.get_entries_by_name('')])
+
+    def test_concurrent_threads(self):
+        db = SqliteDbManager(self.db_path)
+        errors = []
+
+        def add(prefix):
+            try:
+                for i in range(50):
+                    entry = Entry(id=f'{prefix}_{i}', name=prefix, args='', date_created=Timestamp(i),
+                                  local_results_path='', metrics=[Metric(f'{prefix}_{i}', 'f1', i)])
+                    entry.other_runs.append(Entry(id=f'{prefix}_{i}_sub', name=prefix, args='',
+                                                  date_created=Timestamp(i), local_results_path='',
+                                                  parent_id=f'{prefix}_{i}'))
+                    db.add_new_entries([entry])
+                    # a read spanning several statements while the other threads write
+                    for e in db.get_entries_by_name(prefix):
+                        if len(e.metrics) != 1 or len(e.other_runs) != 1:
+                            errors.append(e)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=add, args=(f't{i}',)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(db.get_entries_by_name('t')), 200)
+
+
+def add_entries_wal(db_path, prefix, n):
+    db = WalDbManager(db_path)
+    db.CHECKPOINT_MIN_BYTES = 1000
+    for i in range(n):
+        db.add_new_entries([Entry(id=f'{prefix}_{i}', name=prefix, args='', date_created=Timestamp(i),
+                                  local_results_path='')])
+
+
+class TestWalDb(BaseTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.db_path = os.path.join(os.path.dirname(self.conf.json_db_path), 'test_db_wal.json')
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        for suffix in ('', '.lock', '.wal', '.wal.lock', '.wal.checkpoint'):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+
+    def test_write_ahead_log(self):
+        db = WalDbManager(self.db_path)
+        entries = [Entry(id=str(i), name=f'exp_{i % 2}', args='', date_created=Timestamp(i), local_results_path='',
+                         metrics=[Metric(str(i), 'f1', i / 10)]) for i in range(5)]
+        db.add_new_entries(entries[:3])
+        db.add_new_entries(entries[3:])
+        entries[1].name = 'updated'
+        db.update_entries([entries[1]])
+        # nothing was written to the database yet, but readers see the log
+        self.assertEqual(DbManager(self.db_path, read_only=True).get_all_entries(), [])
+        self.assertEqual(WalDbManager(self.db_path).get_all_entries(), entries)
+        self.assertEqual(db.query().metric('f1', '>', 0.2).all(), entries[3:])
+        self.assertEqual(list(db.iter_entries(offset=3)), entries[3:])
+        self.assertTrue(db.checkpoint())
+        self.assertFalse(os.path.exists(db.wal_path))
+        self.assertEqual(DbManager(self.db_path, read_only=True).get_all_entries(), entries)
+        # existing entries are reported when folded
+        db.add_new_entries([entries[0]])
+        self.assertWarns(UserWarning, db.checkpoint)
+        self.assertTrue(db.delete_entry(entries[0]))
+        self.assertEqual(WalDbManager(self.db_path).get_all_entries(), entries[1:])
+
+    def test_upserts(self):
+        db = WalDbManager(self.db_path)
+        entry = Entry(id='parent', name='asdf', args='', date_created=Timestamp(0), local_results_path='')
+        run = Entry(id='run', name='asdf', args='', date_created=Timestamp(1), local_results_path='',
+                    parent_id='parent')
+        # recorders commit by appending to the log, without reading the database
+        with mock.patch.object(WalDbManager, '_read_raw', side_effect=AssertionError):
+            db.add_or_update_entry(entry)
+            db.add_or_update_entry(run)
+            entry.description = 'updated'
+            db.add_or_update_entry(entry)
+        entry.other_runs = [run]
+        self.assertEqual(WalDbManager(self.db_path).get_all_entries(), [entry])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            db.checkpoint()
+        self.assertEqual(DbManager(self.db_path).get_all_entries(), [entry])
+        # a log changing during every read is read once more holding the locks
+        with mock.patch.object(WalDbManager, '_signature', side_effect=lambda: object()) as signature:
+            self.assertEqual([d['id'] for d in db._read_raw()], ['parent', 'run'])
+        self.assertEqual(signature.call_count, 2 * WalDbManager.READ_ATTEMPTS)
+
+    def test_recovery(self):
+        db = WalDbManager(self.db_path)
+        entry = Entry(id='21jf10jf', name='asdf', args='asdf', date_created=Timestamp(0), local_results_path='')
+        db.add_new_entries([entry])
+        # a checkpoint died after writing the database, before removing the folded records
+        with mock.patch('os.remove', side_effect=KeyboardInterrupt), self.assertRaises(KeyboardInterrupt):
+            db.checkpoint()
+        self.assertTrue(os.path.exists(db.checkpoint_path))
+        # a writer died while appending a record
+        with open(db.wal_path, 'a') as f:
+            f.write('{"id": "partial", "added": [{"id"')
+        other = Entry(id='other', name='asdf', args='asdf', date_created=Timestamp(0), local_results_path='')
+        db.add_new_entries([other])
+        self.assertEqual(WalDbManager(self.db_path).get_all_entries(), [entry, other])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            db.checkpoint()
+        self.assertEqual(DbManager(self.db_path).get_all_entries(), [entry, other])
+        self.assertFalse(os.path.exists(db.checkpoint_path))
+
+    def test_concurrent_writers(self):
+        processes = [multiprocessing.Process(target=add_entries_wal, args=(self.db_path, f'p{i}', 20))
+                     for i in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        db = WalDbManager(self.db_path)
+        self.assertEqual(len(db.get_all_entries()), 80)
+        db.checkpoint()
+        self.assertEqual(len(DbManager(self.db_path).get_all_entries()), 80)
+
+
+class TestDaemon(BaseTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = DbServer(DbManager(self.conf.json_db_path))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.addCleanup(self.thread.join)
+        self.addCleanup(self.server.shutdown)
+
+    def test_client(self):
+        entries = [Entry(id=str(i), name=f'exp_{i % 2}', args='', date_created=Timestamp(i), local_results_path='',
+                         metrics=[Metric(str(i), 'f1', i / 10)]) for i in range(5)]
+        db = connect(self.conf.json_db_path)
+        self.assertIsInstance(db, DaemonDbManager)
+        db.add_new_entries(entries)
+        self.assertWarns(UserWarning, db.add_new_entries, entries[:1])
+        self.assertEqual(db.get_entry_by_id('3'), entries[3])
+        self.assertIsNone(db.get_entry_by_id('missing'))
+        self.assertEqual(db.get_entries_by_name('exp_1'), entries[1::2])
+        self.assertEqual(db.get_entries_greater_than_date(datetime.fromtimestamp(2)), entries[3:])
+        self.assertEqual(db.get_most_recent_entries(2, name='exp_0'), [entries[4], entries[2]])
+        self.assertEqual(db.query().metric('f1', '>=', 0.2).order_by('date_created', descending=True).all(),
+                         entries[:1:-1])
+        entries[0].name = 'updated'
+        db.add_or_update_entry(entries[0])
+        self.assertEqual(DbManager(self.conf.json_db_path).get_entry_by_exact_name('updated'), entries[0])
+        self.assertTrue(db.delete_entry(entries[0]))
+        self.assertEqual(db.get_all_entries(), entries[1:])
+        self.assertTrue(db.connected)
+
+        # without the daemon, the client reads the database directly
+        self.server.shutdown()
+        self.thread.join()
+        self.assertEqual(db.get_all_entries(), entries[1:])
+        self.assertFalse(db.connected)
+        self.assertNotIsInstance(connect(self.conf.json_db_path), DaemonDbManager)
+
+    def test_concurrent_writes(self):
+        def add(prefix):
+            db = DaemonDbManager(self.conf.json_db_path)
+            for i in range(20):
+                db.add_new_entries([Entry(id=f'{prefix}_{i}', name=prefix, args='', date_created=Timestamp(i),
+                                          local_results_path='')])
+
+        with mock.patch.object(DbManager, '_write_raw', autospec=True, side_effect=DbManager._write_raw) as write:
+            threads = [threading.Thread(target=add, args=(f't{i}',)) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(DbManager(self.conf.json_db_path).get_all_entries()), 80)
+        # writes received while another one was running are applied together
+        self.assertLess(write.call_count, 80)
+        self.assertTrue(any(len(call.args[1]) > 1 for call in write.call_args_list))
+
+    def test_socket_permissions(self):
+        st = os.stat(os.path.dirname(self.server.path))
+        self.assertEqual(st.st_uid, os.getuid())
+        self.assertEqual(st.st_mode & 0o077, 0)
+        self.assertEqual(os.stat(self.server.path).st_mode & 0o077, 0)
+        # sockets of other users are never used
+        self.assertIsInstance(connect(self.conf.json_db_path), DaemonDbManager)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertIsNone(_connect(self.server.path))
+        # not used unless configured
+        self.assertNotIsInstance(self.conf.init_db_manager(), DaemonDbManager)
+        self.conf.use_daemon = True
+        self.assertIsInstance(self.conf.init_db_manager(), DaemonDbManager)
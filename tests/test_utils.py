@@ -1,4 +1,5 @@
 import os
+import shutil
 
 from tests import BaseTest
 from tmt import tmt_recorder, tmt_save
@@ -6,7 +7,10 @@ from tmt.utils.manager import TmtManager
 import numpy as np
 
 from tmt.history.context import context_manager
+from tmt.storage.archive import archive_entries
 from tmt.storage.json_db import DbManager
+from tmt.storage.schema import Entry, Metric, Timestamp
+from tmt.exceptions import EntryNotFound
 
 returned_metrics = {'f1': 0.87, 'acc': 0.45, 'loss': 1e-4}
 
@@ -60,5 +64,83 @@ class TestUtils(BaseTest):
 
         manager = TmtManager(config='tests/test_config.json')
         manager.set_entry_by_name("test_exp_custom_save_path")
+        self.assertEqual(manager.code_snapshot_path('fake_main.py'),
+                         os.path.join(manager.code_snapshot_path(), 'fake_main.py'))
+        self.assertRaises(FileNotFoundError, manager.code_snapshot_path, 'missing.py')
         gen = manager.load_results()
         self.assertWarns(UserWarning, next, gen)
+
+
+class TestMetricColumns(BaseTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = DbManager(self.conf.json_db_path)
+        self.entries = [Entry(id=str(i), name=f'exp_{i}', args='', date_created=Timestamp(i), local_results_path='',
+                              metrics=[Metric(str(i), 'f1', i / 10), Metric(str(i), 'loss', 1 - i / 10)])
+                        for i in range(6)]
+        self.entries[2].metrics.pop()
+        self.entries[3].other_runs.append(Entry(id='sub', name='exp_3', args='', date_created=Timestamp(10),
+                                                local_results_path='', metrics=[Metric('sub', 'f1', 0.95)]))
+        self.db.add_new_entries(self.entries)
+
+    def test_leaderboard(self):
+        manager = TmtManager(config='tests/test_config.json')
+        self.assertEqual([(e.id, v) for e, v in manager.top_k('f1', 2)], [('5', 0.5), ('4', 0.4)])
+        self.assertEqual([(e.id, v) for e, v in manager.top_k('f1', 2, include_sub_entries=True)],
+                         [('sub', 0.95), ('5', 0.5)])
+        self.assertEqual([e.id for e, _ in manager.top_k('loss', 10, largest=False)], ['5', '4', '3', '1', '0'])
+        rows = manager.leaderboard(['loss', 'f1'], sort_by='f1', k=4)
+        self.assertEqual([r['id'] for r in rows], ['5', '4', '3', '2'])
+        self.assertIsNone(rows[3]['loss'])
+        summary = manager.metrics_summary(['f1'])['f1']
+        self.assertEqual(summary['count'], 6)
+        self.assertAlmostEqual(summary['mean'], 0.25)
+        self.assertEqual(summary['max'], 0.5)
+
+        # the columns are updated with the new and updated entries only
+        columns = manager.db.metric_columns()
+        self.entries[4].metrics[0].value = 0.99
+        self.entries[4].date_saved = Timestamp(100)
+        self.db.update_entries([self.entries[4]])
+        self.db.add_new_entries([Entry(id='6', name='exp_6', args='', date_created=Timestamp(6),
+                                       local_results_path='', metrics=[Metric('6', 'f1', 0.7)])])
+        self.assertIs(manager.db.metric_columns(), columns)
+        self.assertEqual([(e.id, v) for e, v in manager.top_k('f1', 2)], [('4', 0.99), ('6', 0.7)])
+        self.assertEqual(columns.entry_ids, ['0', '1', '2', '3', 'sub', '4', '5', '6'])
+        # a metric value changed without updating `date_saved`
+        self.entries[3].other_runs[0].metrics[0].value = 0.1
+        self.db.update_entries([self.entries[3]])
+        self.assertEqual([(e.id, v) for e, v in manager.top_k('f1', 2, include_sub_entries=True)],
+                         [('4', 0.99), ('6', 0.7)])
+
+    def test_archived(self):
+        manager = TmtManager(config='tests/test_config.json')
+        self.addCleanup(shutil.rmtree, self.db.archive.path)
+        archive_entries(self.db, before=4)
+        self.assertEqual([e.id for e, _ in manager.top_k('f1', 2, include_sub_entries=True)], ['5', '4'])
+        self.assertEqual([e.id for e, _ in manager.top_k('f1', 2, include_sub_entries=True, archived=True)],
+                         ['sub', '5'])
+        self.assertEqual([r['id'] for r in manager.leaderboard(['f1'], archived=True)], ['5', '4', '3', '2', '1', '0'])
+        self.assertEqual(manager.metrics_summary(['f1'])['f1']['count'], 2)
+        self.assertEqual(manager.metrics_summary(['f1'], archived=True)['f1']['count'], 6)
+        # archived experiments are found when asked for
+        self.assertEqual(manager.aggregate_runs(['3', '5'], metrics=['f1']).count.tolist(), [[2], [1]])
+        self.assertEqual(len(manager.aggregate_runs().entry_ids), 2)
+        self.assertRaises(EntryNotFound, manager.aggregate_runs, ['missing'])
+
+    def test_aggregate_runs(self):
+        manager = TmtManager(config='tests/test_config.json')
+        aggregates = manager.aggregate_runs(['3', self.entries[2]], metrics=['f1', 'loss', 'missing'])
+        self.assertEqual(aggregates.entry_ids, ['3', '2'])
+        np.testing.assert_array_equal(aggregates.count, [[2, 1, 0], [1, 0, 0]])
+        np.testing.assert_allclose(aggregates.mean[0, :2], [np.mean([0.3, 0.95]), 0.7])
+        np.testing.assert_allclose(aggregates.std[0, :2], [np.std([0.3, 0.95]), 0])
+        np.testing.assert_allclose(aggregates.min[:, 0], [0.3, 0.2])
+        np.testing.assert_allclose(aggregates.max[:, 0], [0.95, 0.2])
+        self.assertTrue(np.isnan(aggregates.mean[1, 1]))
+        self.assertEqual(set(aggregates.get('2')), {'f1'})
+        self.assertEqual(len(manager.aggregate_runs().entry_ids), 6)
+        self.assertRaises(EntryNotFound, manager.aggregate_runs, ['sub'])
+        manager.set_entry_by_id('3')
+        self.assertEqual(manager.get_aggregated_metrics()['f1']['count'], 2)
@@ -1,6 +1,7 @@
 from .decorators.recorder import recorder as tmt_recorder
 from .utils.manager import TmtManager
 from .history.utils import save as tmt_save
+from .utils.session import session as tmt_session
 from .configs.parser import Configs
 from .info import __version__
 
@@ -1,12 +1,34 @@
 from __future__ import annotations
 import os
 import json
+from tmt.history.archive_snapshot import ArchiveSnapshotManager
+from tmt.history.git_snapshot import GitSnapshotManager
 from tmt.history.snapshot import SnapshotManager
 from tmt.storage.schema import BaseJsonDataclass
-from dataclasses import dataclass
+from tmt.storage.base import BaseDbManager
+from tmt.storage.daemon import connect
+from tmt.storage.json_db import DbManager
+from tmt.storage.jsonl_db import JsonlDbManager
+from tmt.storage.sqlite_db import SqliteDbManager
+from tmt.storage.wal_db import WalDbManager
+from dataclasses import dataclass, fields, MISSING
+from typing import Optional
 
 CONFIG_PATH = '.tmt/config.json'
 
+DB_BACKENDS = {
+    'json': DbManager,
+    'json_wal': WalDbManager,
+    'jsonl': JsonlDbManager,
+    'sqlite': SqliteDbManager,
+}
+
+SNAPSHOT_STRATEGIES = {
+    'tree': SnapshotManager,
+    'git': GitSnapshotManager,
+    'archive': ArchiveSnapshotManager,
+}
+
 
 @dataclass
 class Configs(BaseJsonDataclass):
@@ -23,10 +45,20 @@ class Configs(BaseJsonDataclass):
     gitignore_path: str
     json_db_path: str
     results_path: str
+    db_backend: str = 'json'
+    snapshot_workers: int = 1
+    background_snapshot: bool = False
+    snapshot_strategy: str = 'tree'
+    snapshot_compression: str = 'gz'
+    use_daemon: bool = False
 
     @classmethod
     def from_dict(cls, d):
         config = super().from_dict(d)
+        for f in fields(cls):
+            # options added in later versions may be missing from older configuration files
+            if getattr(config, f.name) is None and f.default is not MISSING:
+                setattr(config, f.name, f.default)
         config.snapshot_target = os.path.join(config.tmt_dir, config.snapshot_target)
         config.last_snapshot_link = os.path.join(config.tmt_dir, config.last_snapshot_link)
         config.json_db_path = os.path.join(config.tmt_dir, config.json_db_path)
@@ -57,12 +89,34 @@ class Configs(BaseJsonDataclass):
             results_path=".tmt/results"
         )
 
-    def init_snapshot_manager(self, id: str):
-        return SnapshotManager(
+    def init_snapshot_manager(self, id: str) -> SnapshotManager:
+        if self.snapshot_strategy not in SNAPSHOT_STRATEGIES:
+            raise ValueError(f'Unknown snapshot_strategy {self.snapshot_strategy}. Available strategies are: '
+                             f'{", ".join(SNAPSHOT_STRATEGIES)}')
+        strategy = SNAPSHOT_STRATEGIES[self.snapshot_strategy]
+        kwargs = {'compression': self.snapshot_compression} if issubclass(strategy, ArchiveSnapshotManager) else {}
+        return strategy(
             id=id,
             tmt_dir=self.tmt_dir,
             snapshot_source=self.snapshot_source,
             snapshot_target=self.snapshot_target,
             last_snapshot_link=self.last_snapshot_link,
-            ignore_path=self.gitignore_path
+            ignore_path=self.gitignore_path,
+            workers=self.snapshot_workers,
+            **kwargs
         )
+
+    def init_db_manager(self, read_only=False, use_daemon: Optional[bool] = None) -> BaseDbManager:
+        """
+        Returns the manager of the configured database. If a daemon is serving it (see :py:mod:`tmt.storage.daemon`)
+        and `use_daemon` is `True`, the manager is a client of the daemon. `use_daemon` defaults to the ``use_daemon``
+        configuration option.
+        """
+        if use_daemon is None:
+            use_daemon = self.use_daemon
+        if self.db_backend not in DB_BACKENDS:
+            raise ValueError(f'Unknown db_backend {self.db_backend}. Available backends are: '
+                             f'{", ".join(DB_BACKENDS)}')
+        if use_daemon:
+            return connect(self.json_db_path, read_only, DB_BACKENDS[self.db_backend])
+        return DB_BACKENDS[self.db_backend](self.json_db_path, read_only=read_only)
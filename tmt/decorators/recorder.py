@@ -1,11 +1,14 @@
 from typing import Callable, Dict, Optional
 from tmt.history.context import ContextManager, context_manager
-from tmt.storage.json_db import DbManager
 from tmt.storage.schema import Metric
+from tmt.utils.session import current_session
 from datetime import datetime
+import logging
 
 from tmt.utils.duplicates import DuplicateStrategy
 
+logger = logging.getLogger(__name__)
+
 
 def recorder(name: str, config_path: Optional[str] = None, save_on_exception=False, description="", duplicate_strategy=DuplicateStrategy()):
     """
@@ -29,12 +32,23 @@ def recorder(name: str, config_path: Optional[str] = None, save_on_exception=Fal
             preds = lr.predict(x_te)
             return {'f1': f1_score(y_te, preds), 'accuracy': accuracy_score(y_te, preds)} 
 
+    The code snapshot is taken after `func` returns, unless the ``background_snapshot`` configuration option is
+    set: then it is taken in a background thread as soon as the experiment starts, and waited for before the entry
+    is saved.
+
+    The throughput of the snapshot (see :py:class:`tmt.history.snapshot.SnapshotStats`) is logged at the ``INFO``
+    level by the ``tmt.decorators.recorder`` logger.
+
+    Within a :py:func:`tmt.utils.session.session` using the same `config_path`, the entry is queued and written in a
+    batch with the other entries of the session.
+
     :param name: name used to save this experiment in the database.
     :type name: str
     :param config_path: if you want to use a custom configuration file, specify the path. Defaults to None.
         See :doc:`configuration` and :py:class:`tmt.configs.parser.Configs`
     :type config_path: Optional[str], optional
-    :param save_on_exception: save everything (snapshot, metrics etc.) even if an exception happens. Defaults to False.
+    :param save_on_exception: save everything (snapshot, metrics etc.) even if an exception happens. Otherwise, the
+        snapshot is discarded. Defaults to False.
     :type save_on_exception: bool, optional
     :param description: experiment description. Can be as long as you wish.
     :type description: str, optional
@@ -46,24 +60,29 @@ def recorder(name: str, config_path: Optional[str] = None, save_on_exception=Fal
     """
     def inner(func: Callable[..., Optional[Dict[str, float]]]):
         def wrapper(*args, **kwargs) -> Optional[Dict[str, float]]:
-            cm = ContextManager(name, config_path, duplicate_strategy=duplicate_strategy, description=description)
+            session = current_session.get()
+            db_manager = session.db if session is not None and session.uses_config(config_path) else None
+            cm = ContextManager(name, config_path, duplicate_strategy=duplicate_strategy, description=description,
+                                db_manager=db_manager)
             context_manager.set(cm)
-            db_manager = DbManager(cm.config.json_db_path)
+            db_manager = cm.db
             try:
                 metrics = func(*args, **kwargs)
                 if metrics:
                     for k, v in metrics.items():
                         cm.entry.metrics.append(Metric(cm.entry.id, k, v))
-                cm.snap_manager.make_snapshot()
+                logger.info('Snapshot of %s: %s', cm.entry.id, cm.snap_manager.wait_snapshot())
                 cm.entry.date_saved = int(datetime.now().timestamp())
-                db_manager.add_or_update_entry(cm.root_entry)
+                db_manager.add_or_update_entry(cm.entry)
                 return metrics
             except Exception as e:
                 if not save_on_exception:
+                    # the entry is not saved: neither is its snapshot, even if it was started in the background
+                    cm.snap_manager.discard_snapshot()
                     raise e
-                cm.snap_manager.make_snapshot()
+                logger.info('Snapshot of %s: %s', cm.entry.id, cm.snap_manager.wait_snapshot())
                 cm.entry.date_saved = int(datetime.now().timestamp())
-                db_manager.add_or_update_entry(cm.root_entry)
+                db_manager.add_or_update_entry(cm.entry)
 
         return wrapper
     return inner
@@ -0,0 +1,183 @@
+"""
+Snapshot strategy writing every snapshot as a single compressed tar archive (``"snapshot_strategy": "archive"`` in
+the configuration), for projects whose snapshot trees would hold too many small files for backups (or ``du``) of the
+tmt directory.
+
+The archive (``<snapshot>.tar.gz`` or ``<snapshot>.tar.xz``, see ``snapshot_compression``) is a regular tar archive
+that any tool can extract, but it is compressed in independent blocks of about a megabyte: ``<snapshot>.index.json``
+keeps where every block starts and where every file is, so that a single file can be extracted by decompressing the
+block it starts in, instead of the whole archive. See :py:meth:`tmt.utils.manager.TmtManager.code_snapshot_path`.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, BinaryIO, Callable, Dict, IO, List
+from tmt.history.snapshot import SnapshotManager, SnapshotStats
+import gzip
+import json
+import lzma
+import os
+import shutil
+import stat
+import tarfile
+import tempfile
+import time
+
+INDEX_SUFFIX = '.index.json'
+# compression -> (archive suffix, block compressor, reader of concatenated blocks)
+COMPRESSIONS: Dict[str, Any] = {
+    'gz': ('.tar.gz', lambda data: gzip.compress(data, mtime=0), lambda f: gzip.GzipFile(fileobj=f, mode='rb')),
+    'xz': ('.tar.xz', lzma.compress, lzma.LZMAFile),
+}
+# uncompressed size of a block: extracting a file decompresses at most this much data before it
+BLOCK_SIZE = 1 << 20
+
+
+class _BlockWriter:
+    """
+    File object compressing what is written to `fileobj` in independent blocks (i.e. gzip members or xz streams),
+    which together still are a valid compressed file.
+    """
+
+    def __init__(self, fileobj: BinaryIO, compress: Callable[[bytes], bytes]):
+        self.fileobj = fileobj
+        self.compress = compress
+        self.buffer = bytearray()
+        self.position = 0
+        # [compressed offset, uncompressed offset] of every block
+        self.blocks: List[List[int]] = []
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        self.position += len(data)
+        if len(self.buffer) >= BLOCK_SIZE:
+            self.flush_block()
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush_block(self):
+        if self.buffer:
+            self.blocks.append([self.fileobj.tell(), self.position - len(self.buffer)])
+            self.fileobj.write(self.compress(bytes(self.buffer)))
+            self.buffer.clear()
+
+
+@dataclass
+class ArchiveSnapshotManager(SnapshotManager):
+    """
+    Makes snapshots as compressed tar archives with an index, see :py:mod:`tmt.history.archive_snapshot`. Unlike
+    trees, archives don't share the content of unchanged files: every snapshot is a full (compressed) copy.
+    """
+    # "gz" or "xz"
+    compression: str = 'gz'
+
+    @cached_property
+    def archive_path(self) -> str:
+        return self.snapshot_dest + COMPRESSIONS[self.compression][0]
+
+    @cached_property
+    def index_path(self) -> str:
+        return self.snapshot_dest + INDEX_SUFFIX
+
+    def make_snapshot(self) -> SnapshotStats:
+        start = time.perf_counter()
+        if self.compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown snapshot compression {self.compression}. Available compressions are: '
+                             f'{", ".join(COMPRESSIONS)}')
+        last = self.last_index()
+        directory = os.path.dirname(self.archive_path)
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.archive_path), suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                writer = _BlockWriter(f, COMPRESSIONS[self.compression][1])
+                with tarfile.open(fileobj=writer, mode='w', format=tarfile.PAX_FORMAT) as tar:
+                    for path, st in self.source_files():
+                        # built from the stat of the walk: `gettarinfo` would look up user and group names
+                        info = tarfile.TarInfo(path.replace(os.sep, '/'))
+                        info.size, info.mtime, info.mode = st.st_size, st.st_mtime, stat.S_IMODE(st.st_mode)
+                        files.append([path, st.st_size, st.st_mtime_ns, tar.offset])
+                        with open(os.path.join(self.snapshot_source, path), 'rb') as src:
+                            tar.addfile(info, src)
+                writer.flush_block()
+            os.replace(tmp_path, self.archive_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        index = {'archive': os.path.basename(self.archive_path), 'compression': self.compression,
+                 'blocks': writer.blocks, 'files': files}
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.index_path), suffix='.tmp')
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(index))
+        os.replace(tmp_path, self.index_path)
+        self.create_symlink()
+        self.stats = SnapshotStats(len(files), sum(f[1] for f in files),
+                                   sum(1 for path, *m, _ in files if last.get(path) == m),
+                                   time.perf_counter() - start)
+        return self.stats
+
+    def last_index(self) -> Dict[str, List[int]]:
+        """
+        Returns [size, mtime_ns] by file path of the last snapshot, or an empty dictionary if it is not an archive.
+        """
+        if not os.path.islink(self.last_snapshot_link):
+            return {}
+        try:
+            with open(os.readlink(self.last_snapshot_link) + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+                return {path: m for path, *m, _ in json.load(f)['files']}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def extract(snapshot_path: str, path: str, dest: str) -> str:
+        """
+        Extracts the file `path` (relative to the root of the snapshot) of the archive snapshot in `snapshot_path` to
+        `dest`, decompressing only the blocks it spans.
+
+        :return: `dest`.
+        :raises FileNotFoundError: if there is no such file in the snapshot.
+        """
+        with open(snapshot_path + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        offsets = {p: offset for p, *_, offset in index['files']}
+        if os.path.normpath(path) not in offsets:
+            raise FileNotFoundError(f'{path} is not in the snapshot {snapshot_path}')
+        offset = offsets[os.path.normpath(path)]
+        blocks = index['blocks']
+        compressed, start = blocks[bisect_right([b[1] for b in blocks], offset) - 1]
+        with open(os.path.join(os.path.dirname(snapshot_path), index['archive']), 'rb') as f:
+            f.seek(compressed)
+            # reads on through the following blocks, if the file spans them
+            stream: IO[bytes] = COMPRESSIONS[index['compression']][2](f)
+            stream.seek(offset - start)
+            with tarfile.open(fileobj=stream, mode='r|') as tar:
+                member = tar.next()
+                os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), suffix='.tmp')
+                with open(fd, 'wb') as out:
+                    shutil.copyfileobj(tar.extractfile(member), out)
+                os.chmod(tmp_path, member.mode)
+                os.replace(tmp_path, dest)
+        return dest
+
+    @staticmethod
+    def restore(snapshot_path: str, dest: str) -> str:
+        """
+        Extracts the archive snapshot in `snapshot_path` to `dest`. Files already in `dest` (e.g. extracted by
+        :py:meth:`tmt.history.archive_snapshot.ArchiveSnapshotManager.extract`) are left as they are.
+
+        :return: `dest`.
+        """
+        with open(snapshot_path + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        # the archive is made by tmt, but only regular files with relative paths are expected anyway
+        kwargs = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+        with tarfile.open(os.path.join(os.path.dirname(snapshot_path), index['archive']), 'r:*') as tar:
+            for member in tar:
+                if not os.path.exists(os.path.join(dest, member.name)):
+                    tar.extract(member, dest, **kwargs)
+        return dest
@@ -1,6 +1,5 @@
 from __future__ import annotations
 from tmt.storage.schema import Entry, Result
-from tmt.storage.json_db import DbManager
 from uuid import uuid4
 from datetime import datetime
 from contextvars import ContextVar
@@ -8,6 +7,7 @@ from tmt.configs.parser import Configs
 from typing import Optional, Any, Callable
 from tmt.exceptions import DuplicatedNameError
 from tmt.utils.duplicates import DuplicateStrategy, DuplicatePolicy
+from tmt.storage.base import BaseDbManager
 import os
 import sys
 import pickle
@@ -17,7 +17,8 @@ context_manager: ContextVar[ContextManager] = ContextVar('context_manager', defa
 
 
 class ContextManager:
-    def __init__(self, name: str, config_path: Optional[str] = None, duplicate_strategy=DuplicateStrategy(), description=""):
+    def __init__(self, name: str, config_path: Optional[str] = None, duplicate_strategy=DuplicateStrategy(), description="",
+                 db_manager: Optional[BaseDbManager] = None):
         if config_path:
             self.config = Configs.from_config(config_path)
         else:
@@ -31,7 +32,9 @@ class ContextManager:
             local_results_path=self.config.results_path,
         )
         self.duplicate_strat = duplicate_strategy
-        self.parent = DbManager(self.config.json_db_path).get_entries_by_name(name)
+        # the database the entry is saved to, e.g. the one of a session (see `tmt.utils.session.session`)
+        self.db = db = db_manager or self.config.init_db_manager()
+        self.parent = db.get_entries_by_name(name)
         if self.parent:
             if self.duplicate_strat.policy is DuplicatePolicy.DONT_ALLOW:
                 raise DuplicatedNameError(f'one (or more) entry with name {name} already exists. Set '
@@ -41,7 +44,8 @@ class ContextManager:
                     parent_id = self.duplicate_strat.parent_id
                     parent_dict = {e.id: e for e in self.parent}
                     if not self.duplicate_strat.parent_id or self.duplicate_strat.parent_id not in parent_dict:
-                        parent = sorted(self.parent, key=lambda e: e.date_created, reverse=True)[0]
+                        # the most recent among all the entries matching `name`, not only the exact matches
+                        parent = max(self.parent, key=lambda e: e.date_created)
                         warnings.warn(f'{len(self.parent)} entries already exist with this name and a '
                                       f'valid DuplicateStrategy.parent_id was not specified. I will use {parent.short_str()} as '
                                       f'the parent entry. See documentation for DuplicateStrategy.')
@@ -49,11 +53,19 @@ class ContextManager:
                     self.parent = parent_dict[parent_id]
                 else:
                     self.parent = self.parent[0]
+                if not db._exists(self.parent):
+                    # archived (see `tmt.storage.archive`): new runs go on in the database, which takes precedence
+                    db.add_new_entries([self.parent])
+                # the sub-entry is stored on its own and linked to the parent when the database is read
+                self.entry.parent_id = self.parent.id
                 self.parent.other_runs.append(self.entry)
             elif self.duplicate_strat.policy is DuplicatePolicy.AS_NEW_ENTRY:
                 self.parent = None
         self.snap_manager = self.config.init_snapshot_manager(self.entry.id)
         self.entry.local_snapshot_path = self.snap_manager.snapshot_dest
+        if self.config.background_snapshot:
+            # captures the code at launch, while the experiment runs. See `recorder`
+            self.snap_manager.start_snapshot()
         os.makedirs(self.get_save_path(), exist_ok=True)
         self.last_saved_counter = 0
 
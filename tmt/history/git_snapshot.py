@@ -0,0 +1,150 @@
+"""
+Snapshot strategy for projects in a git repository (``"snapshot_strategy": "git"`` in the configuration). Instead of
+a tree of files, a snapshot is the commit of ``HEAD``, a binary patch of the uncommitted changes and the untracked,
+not ignored files (stored in the object store, see :py:mod:`tmt.history.objects`). It takes a couple of files per
+run, however large the project is, and :py:func:`tmt.history.restore.restore_snapshot` (or the ``restore`` command
+of :py:mod:`tmt.tmt_cli`) rebuilds the tree when it is needed.
+
+The commit must stay in the repository for the snapshot to be restored: snapshots of commits which are later
+rebased away (and garbage collected) can't be restored. Submodules are not part of the snapshot.
+"""
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, List, Optional
+from tmt.history.objects import ObjectStore
+from tmt.history.snapshot import SnapshotManager, SnapshotStats
+import json
+import os
+import subprocess
+import tempfile
+import time
+import warnings
+
+GIT_SUFFIX = '.git.json'
+PATCH_SUFFIX = '.patch'
+
+
+def git(*args: str, cwd: str, env: Optional[Dict[str, str]] = None) -> bytes:
+    """
+    Runs git with `args` in `cwd` and returns its output.
+
+    :raises subprocess.CalledProcessError: if git fails.
+    :raises FileNotFoundError: if git is not installed.
+    """
+    return subprocess.run(('git',) + args, cwd=cwd, env=env, check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE).stdout
+
+
+@dataclass
+class GitSnapshotManager(SnapshotManager):
+    """
+    Makes snapshots as commit, patch and untracked files, see :py:mod:`tmt.history.git_snapshot`. If
+    `snapshot_source` is not in a git repository with at least a commit, the snapshot is a tree of files, as made by
+    :py:class:`tmt.history.snapshot.SnapshotManager`.
+    """
+
+    @cached_property
+    def record_path(self) -> str:
+        return self.snapshot_dest + GIT_SUFFIX
+
+    def make_snapshot(self) -> SnapshotStats:
+        start = time.perf_counter()
+        source = self.snapshot_source
+        try:
+            commit = git('rev-parse', '--verify', 'HEAD', cwd=source).decode().strip()
+            repo = git('rev-parse', '--show-toplevel', cwd=source).decode().strip()
+            prefix = git('rev-parse', '--show-prefix', cwd=source).decode().strip()
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            warnings.warn(f'{source} is not in a git repository with commits ({e}): the snapshot is a copy of its '
+                          f'files')
+            return super().make_snapshot()
+        patch = git('diff', '--binary', '--no-color', '--no-ext-diff', '--relative', 'HEAD', '--', '.', cwd=source)
+        last = self.last_record()
+        last_files = {f[0]: f[2] for f in last.get('files', [])}
+        files = []
+        for path in self.untracked_files():
+            try:
+                st = os.stat(os.path.join(source, path))
+            except FileNotFoundError:
+                continue
+            if os.path.isfile(os.path.join(source, path)):
+                files.append([path, st.st_size, self.objects.add(os.path.join(source, path), st)])
+        os.makedirs(os.path.dirname(self.record_path), exist_ok=True)
+        if patch:
+            self.__write(self.snapshot_dest + PATCH_SUFFIX, patch)
+        record = {'commit': commit, 'repo': repo, 'prefix': prefix, 'patch': bool(patch), 'files': files,
+                  'objects': os.path.abspath(self.objects.path)}
+        self.__write(self.record_path, json.dumps(record).encode('utf-8'))
+        self.objects.save_cache(source, (f[0] for f in files))
+        self.create_symlink()
+        self.stats = SnapshotStats(len(files), len(patch) + sum(f[1] for f in files),
+                                   sum(1 for path, _, name in files if last_files.get(path) == name),
+                                   time.perf_counter() - start)
+        return self.stats
+
+    def untracked_files(self) -> List[str]:
+        """
+        Returns the files of `snapshot_source` (relative to it) which are neither tracked nor ignored, by git or by
+        the ignore files of the snapshot (see :py:mod:`tmt.history.walker`).
+        """
+        args = ['ls-files', '-z', '--others', '--exclude-standard', '--', '.']
+        tmt_dir = os.path.relpath(os.path.abspath(self.tmt_dir), os.path.abspath(self.snapshot_source))
+        if not tmt_dir.startswith(os.pardir):
+            # the tmt directory is usually untracked, but never worth listing
+            args.append(f':(exclude){tmt_dir}')
+        output = git(*args, cwd=self.snapshot_source).decode('utf-8', errors='surrogateescape')
+        return [path for path in output.split('\0') if path and not self.walker.is_ignored(path)]
+
+    def last_record(self) -> Dict[str, Any]:
+        """
+        Returns the record of the last snapshot, or an empty one if it is not a git snapshot.
+        """
+        if not os.path.islink(self.last_snapshot_link):
+            return {}
+        try:
+            with open(os.readlink(self.last_snapshot_link) + GIT_SUFFIX, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def restore(snapshot_path: str, dest: str) -> str:
+        """
+        Rebuilds the tree of the git snapshot in `snapshot_path` in `dest`: checks out the commit (without touching
+        the index or the working tree of the repository), applies the patch and links the untracked files.
+
+        :return: `dest`.
+        :raises subprocess.CalledProcessError: if the commit is no longer in the repository, or the patch does not
+            apply.
+        """
+        with open(snapshot_path + GIT_SUFFIX, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        dest = os.path.abspath(dest)
+        os.makedirs(dest, exist_ok=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            # a temporary index, so that the one of the repository is left alone
+            env = {**os.environ, 'GIT_INDEX_FILE': os.path.join(tmp, 'index')}
+            tree = f'{record["commit"]}:{record["prefix"]}' if record['prefix'] else record['commit']
+            git('read-tree', tree, cwd=record['repo'], env=env)
+            git('--work-tree', dest, 'checkout-index', '--all', '--force', cwd=record['repo'], env=env)
+        if record['patch']:
+            # not applied to the repository `dest` may be in (e.g. the one of the snapshots)
+            env = {**os.environ, 'GIT_CEILING_DIRECTORIES': os.path.dirname(dest)}
+            git('apply', '--binary', '--whitespace=nowarn', os.path.abspath(snapshot_path + PATCH_SUFFIX), cwd=dest,
+                env=env)
+        objects = ObjectStore(record['objects'])
+        for path, _, name in record['files']:
+            target = os.path.join(dest, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.exists(target):
+                os.remove(target)
+            objects.link(name, target)
+        return dest
+
+    @staticmethod
+    def __write(path: str, content: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix='.tmp')
+        with open(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
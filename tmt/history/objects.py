@@ -0,0 +1,141 @@
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+
+HASH_CACHE = 'hash_cache.json'
+# files modified this recently may still change within the same mtime, their hashes are not cached
+RACY_NS = 2_000_000_000
+
+
+class ObjectStore:
+    """
+    Content-addressed store of the files of code snapshots: every distinct content is stored once, in
+    ``path/<first 2 hex digits>/<rest of the sha256>``, and snapshots are made of hard links to it. Since objects are
+    looked up by content, a file is never copied twice, whichever snapshot (or working copy) it was in before.
+
+    Hashes are cached by path, size, mtime and inode in ``path/hash_cache.json``, so that unchanged files are not
+    read again. Objects are read-only, so that editing a file of a snapshot does not change the others.
+
+    :param path: directory of the store.
+    :type path: str
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.cache_path = os.path.join(path, HASH_CACHE)
+        self.__cache: Optional[Dict[str, List]] = None
+        self.__dirty = False
+        # snapshots may add files from several threads (see `SnapshotManager.workers`)
+        self.__lock = threading.Lock()
+
+    def add(self, path: str, st: Optional[os.stat_result] = None) -> str:
+        """
+        Adds the file in `path` to the store, unless an object with the same content (and executable bit) is already
+        there, and returns the name of the object.
+        """
+        st = st or os.stat(path)
+        executable = bool(st.st_mode & stat.S_IXUSR)
+        name = self.name(self.digest(path, st), executable)
+        obj = self.object_path(name)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(obj), suffix='.tmp')
+            os.close(fd)
+            try:
+                shutil.copyfile(path, tmp_path)
+                os.chmod(tmp_path, 0o555 if executable else 0o444)
+                # renamed when complete, so that a half-copied object is never linked
+                os.replace(tmp_path, obj)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        return name
+
+    def link(self, name: str, dest: str):
+        """
+        Hard links the object called `name` to `dest`. If `dest` is on another file system, the object is copied
+        instead.
+
+        :raises FileNotFoundError: if there is no such object.
+        """
+        obj = self.object_path(name)
+        try:
+            os.link(obj, dest)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copy(obj, dest)
+
+    def object_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def name(digest: str, executable: bool) -> str:
+        """
+        Returns the name of the object with the content hashed to `digest`.
+        """
+        return os.path.join(digest[:2], digest[2:] + ('.x' if executable else ''))
+
+    @staticmethod
+    def is_executable(name: str) -> bool:
+        return name.endswith('.x')
+
+    def digest(self, path: str, st: Optional[os.stat_result] = None) -> str:
+        """
+        Returns the sha256 of the file in `path`, reading it only if it changed since it was last hashed.
+        """
+        st = st or os.stat(path)
+        key = os.path.abspath(path)
+        signature = [st.st_mtime_ns, st.st_size, st.st_ino]
+        cached = self.__load_cache().get(key)
+        if cached is not None and cached[:3] == signature:
+            return cached[3]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        cache = self.__load_cache()
+        if time.time_ns() - st.st_mtime_ns > RACY_NS:
+            cache[key] = signature + [digest]
+        else:
+            cache.pop(key, None)
+        self.__dirty = True
+        return digest
+
+    def save_cache(self, root: Optional[str] = None, files: Iterable[str] = ()):
+        """
+        Writes the hash cache, if it changed. If `root` is given, the cached files under it which are not in `files`
+        (paths relative to `root`, e.g. all the files of a snapshot) are dropped, since they were deleted.
+        """
+        if self.__cache is None or not self.__dirty:
+            self.__cache = None
+            return
+        if root is not None:
+            root = os.path.abspath(root)
+            prefix = os.path.join(root, '')
+            keep = {os.path.join(root, f) for f in files}
+            self.__cache = {k: v for k, v in self.__cache.items() if not k.startswith(prefix) or k in keep}
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=f'{HASH_CACHE}.', suffix='.tmp')
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.__cache))
+        # other processes may be writing it too: the last one wins, which is fine for a cache
+        os.replace(tmp_path, self.cache_path)
+        self.__cache, self.__dirty = None, False
+
+    def __load_cache(self) -> Dict[str, List]:
+        with self.__lock:
+            if self.__cache is None:
+                try:
+                    with open(self.cache_path, 'r', encoding='utf-8') as f:
+                        self.__cache = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    self.__cache = {}
+            return self.__cache
@@ -0,0 +1,67 @@
+"""
+Access to the snapshots of past experiments, whatever the strategy they were made with (see ``snapshot_strategy`` in
+the configuration): trees of files (:py:mod:`tmt.history.snapshot`), git commits and patches
+(:py:mod:`tmt.history.git_snapshot`) or compressed archives (:py:mod:`tmt.history.archive_snapshot`).
+"""
+from typing import Optional
+from tmt.history.archive_snapshot import ArchiveSnapshotManager, INDEX_SUFFIX
+from tmt.history.git_snapshot import GitSnapshotManager, GIT_SUFFIX
+from tmt.history.snapshot import SnapshotManager, MANIFEST_SUFFIX
+import os
+
+
+def restore_snapshot(snapshot_path: str, dest: Optional[str] = None) -> str:
+    """
+    Rebuilds the tree of the snapshot in `snapshot_path` (i.e. the `local_snapshot_path` of an entry). Rebuilding a
+    snapshot in place only adds the files which are missing.
+
+    :param snapshot_path: path of the snapshot.
+    :type snapshot_path: str
+    :param dest: directory the tree is rebuilt in. Defaults to None, i.e. `snapshot_path`.
+    :type dest: Optional[str], optional
+    :return: the directory of the tree.
+    :raises FileNotFoundError: if there is no snapshot in `snapshot_path`.
+    :raises FileExistsError: if `dest` is another directory, which is not empty.
+    """
+    in_place = dest is None or os.path.abspath(dest) == os.path.abspath(snapshot_path)
+    dest = dest or snapshot_path
+    if os.path.exists(snapshot_path + INDEX_SUFFIX):
+        restore = ArchiveSnapshotManager.restore
+    elif os.path.exists(snapshot_path + GIT_SUFFIX):
+        restore = GitSnapshotManager.restore
+    elif os.path.exists(snapshot_path + MANIFEST_SUFFIX):
+        restore = SnapshotManager.restore
+    else:
+        raise FileNotFoundError(f'No snapshot found in {snapshot_path}')
+    if os.path.isdir(dest) and os.listdir(dest):
+        if not in_place:
+            raise FileExistsError(f'{dest} is not empty')
+        if restore is GitSnapshotManager.restore:
+            # the patch can't be applied twice: already restored
+            return dest
+    return restore(snapshot_path, dest)
+
+
+def snapshot_file(snapshot_path: str, path: str) -> str:
+    """
+    Returns where the file `path` (relative to the root of the snapshot) of the snapshot in `snapshot_path` is on
+    disk. The file of an archive snapshot is extracted on its own, while git snapshots are restored in place (see
+    :py:func:`tmt.history.restore.restore_snapshot`).
+
+    :param snapshot_path: path of the snapshot.
+    :type snapshot_path: str
+    :param path: path of the file, relative to the root of the snapshot (i.e. to ``snapshot_source``).
+    :type path: str
+    :return: the path of the file.
+    :raises FileNotFoundError: if there is no such file in the snapshot.
+    """
+    target = os.path.join(snapshot_path, path)
+    if os.path.isfile(target):
+        return target
+    if os.path.exists(snapshot_path + INDEX_SUFFIX):
+        return ArchiveSnapshotManager.extract(snapshot_path, path, target)
+    if os.path.exists(snapshot_path + GIT_SUFFIX) and not os.path.isdir(snapshot_path):
+        restore_snapshot(snapshot_path)
+        if os.path.isfile(target):
+            return target
+    raise FileNotFoundError(f'{path} is not in the snapshot {snapshot_path}')
@@ -1,11 +1,44 @@
-from filecmp import dircmp
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from functools import cached_property
-from typing import Set, Optional
-import itertools
-import pathspec
+from typing import Any, Dict, Iterator, List, Set, Optional, Tuple
+from tmt.history.objects import ObjectStore, RACY_NS
+from tmt.history.walker import IgnoreWalker
+import glob
+import json
 import os
 import shutil
+import stat
+import tempfile
+import threading
+import time
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+@dataclass
+class SnapshotStats:
+    """
+    Throughput of a snapshot, see :py:meth:`tmt.history.snapshot.SnapshotManager.make_snapshot`.
+    """
+    files: int
+    # total size of the files of the snapshot (most of them are usually linked, not copied)
+    bytes: int
+    # files with the same content as in the last snapshot
+    unchanged: int
+    seconds: float
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds else float('inf')
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 2 ** 20 / self.seconds if self.seconds else float('inf')
+
+    def __str__(self) -> str:
+        return f'{self.files} files ({self.bytes / 2 ** 20:.1f} MB, {self.unchanged} unchanged) in ' \
+               f'{self.seconds:.2f}s: {self.files_per_second:.0f} files/s, {self.mb_per_second:.1f} MB/s'
 
 
 @dataclass
@@ -16,71 +49,208 @@ class SnapshotManager:
     snapshot_source: str
     last_snapshot_link: str
     ignore_path: Optional[str] = None
+    # threads linking (and copying) files, see `copy_files`
+    workers: int = 1
+    # throughput of the last snapshot made
+    stats: Optional[SnapshotStats] = field(default=None, init=False, repr=False)
+    # the snapshot started by `start_snapshot`
+    _background: Optional[Future] = field(default=None, init=False, repr=False)
+    # target of `last_snapshot_link` before `create_symlink` moved it, see `discard_snapshot`
+    _previous_link: Optional[str] = field(default=None, init=False, repr=False)
 
     @cached_property
-    def gitignored_files(self) -> Set[str]: 
-        ignore_tmt = {self.tmt_dir}
-        if not self.ignore_path or not os.path.exists(self.ignore_path):
-            return ignore_tmt
-        with open(self.ignore_path, 'r') as f:
-            spec = pathspec.PathSpec.from_lines('gitwildmatch', f)
-        ignore_tmt.update(spec.match_tree(self.snapshot_source))
-        return ignore_tmt
-    
+    def walker(self) -> IgnoreWalker:
+        return IgnoreWalker(self.snapshot_source, self.ignore_path, excluded=(self.tmt_dir,))
+
+    @cached_property
+    def gitignored_files(self) -> Set[str]:
+        """
+        The tmt directory and the ignored paths of `snapshot_source` (relative to it). Files of ignored directories
+        are not listed, since those are not walked.
+        """
+        ignored = {self.tmt_dir}
+        for _ in self.walker.walk():
+            pass
+        ignored.update(self.walker.ignored)
+        return ignored
+
     @cached_property
     def snapshot_dest(self) -> str:
         return os.path.join(os.path.abspath(self.snapshot_target), self.id)
 
-    def make_snapshot(self):
-        if not os.path.exists(self.last_snapshot_link):
-            self.copy_files()
+    @cached_property
+    def objects(self) -> ObjectStore:
+        # shared by all the snapshots (and working copies) using this tmt_dir
+        return ObjectStore(os.path.join(self.tmt_dir, 'objects'))
+
+    def make_snapshot(self) -> SnapshotStats:
+        return self.copy_files()
+
+    def start_snapshot(self):
+        """
+        Starts making the snapshot in a background thread, so that it captures the code as it is now while the
+        experiment runs. Use :py:meth:`tmt.history.snapshot.SnapshotManager.wait_snapshot` to wait for it.
+        """
+        if self._background is not None:
             return
-        last_snapshot_path = os.readlink(self.last_snapshot_link)
-        cmp = dircmp(self.snapshot_source, last_snapshot_path)
-        os.makedirs(self.snapshot_dest, exist_ok=True)
-        for push_file in itertools.chain(self.get_diff_files(cmp, ''), self.get_new_files(cmp, '')):
-            os.makedirs(os.path.join(self.snapshot_dest, os.path.dirname(push_file)), exist_ok=True)
-            if os.path.isfile(os.path.join(self.snapshot_source, push_file)):
-                shutil.copy(os.path.join(self.snapshot_source, push_file), os.path.join(self.snapshot_dest, push_file))
-        for eq_file in self.get_equal_files(cmp, ''):
-            os.makedirs(os.path.join(self.snapshot_dest, os.path.dirname(eq_file)), exist_ok=True)
-            if os.path.isfile(os.path.join(self.snapshot_source, eq_file)):
-                os.link(os.path.join(last_snapshot_path, eq_file), os.path.join(self.snapshot_dest, eq_file))
-        self.create_symlink()
+        self._background = future = Future()
+
+        def run():
+            try:
+                future.set_result(self.make_snapshot())
+            except BaseException as e:
+                future.set_exception(e)
+
+        # not a daemon, so that an interpreter exiting meanwhile does not leave the snapshot half-made
+        threading.Thread(target=run, name=f'tmt-snapshot-{self.id}').start()
+
+    def wait_snapshot(self) -> SnapshotStats:
+        """
+        Waits for the snapshot started by :py:meth:`tmt.history.snapshot.SnapshotManager.start_snapshot`, or makes
+        it now if none was started.
 
-    def copy_files(self):
-        shutil.copytree(self.snapshot_source, self.snapshot_dest, ignore=shutil.ignore_patterns(*self.gitignored_files))
+        :return: the throughput of the snapshot.
+        :raises Exception: any exception raised while making the snapshot in the background.
+        """
+        if self._background is None:
+            return self.make_snapshot()
+        return self._background.result()
+
+    def discard_snapshot(self):
+        """
+        Removes the snapshot (e.g. of an experiment which failed), waiting for it first if it is being made in the
+        background. `last_snapshot_link` points again to the previous snapshot, unless another one was made since.
+        Objects already added to the store are kept, since other snapshots may share them.
+        """
+        if self._background is not None:
+            try:
+                self._background.result()
+            except Exception:
+                # discarded anyway
+                pass
+        if os.path.islink(self.last_snapshot_link) and os.readlink(self.last_snapshot_link) == self.snapshot_dest:
+            if self._previous_link is not None:
+                tmp_link = f'{self.last_snapshot_link}.{self.id}.tmp'
+                os.symlink(self._previous_link, tmp_link)
+                os.replace(tmp_link, self.last_snapshot_link)
+            else:
+                os.remove(self.last_snapshot_link)
+        shutil.rmtree(self.snapshot_dest, ignore_errors=True)
+        # the manifest, git record, patch, archive and index of the snapshot (and any temporary file), whatever the
+        # strategy which made it
+        for path in glob.glob(glob.escape(self.snapshot_dest) + '.*'):
+            os.remove(path)
+
+    @cached_property
+    def manifest_path(self) -> str:
+        return self.snapshot_dest + MANIFEST_SUFFIX
+
+    def copy_files(self) -> SnapshotStats:
+        """
+        Makes the snapshot of the files found by a single walk of `snapshot_source`. Every file is a hard link to its
+        content in the object store, which is only copied the first time it is seen. Files whose size, mtime and
+        inode are the ones in the manifest of the last snapshot are linked to the same object, without being read.
+
+        The directories of the snapshot are made first, then files are linked by `workers` threads.
+
+        :return: the number and size of the files of the snapshot and the time it took.
+        """
+        start = time.perf_counter()
+        last = self.last_manifest()
+        files = list(self.source_files())
+        for directory in sorted({os.path.dirname(path) for path, _ in files}):
+            os.makedirs(os.path.join(self.snapshot_dest, directory), exist_ok=True)
+        now = time.time_ns()
+
+        def link(file: Tuple[str, os.stat_result]) -> List[Any]:
+            path, st = file
+            name = self.__link(path, st, last.get(path))
+            # a file modified this recently may change again without changing its mtime: it will be hashed next time
+            mtime = st.st_mtime_ns if now - st.st_mtime_ns > RACY_NS else 0
+            return [path, st.st_size, mtime, st.st_ino, name]
+
+        if self.workers > 1 and len(files) > 1:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix='tmt-snapshot') as executor:
+                manifest = list(executor.map(link, files))
+        else:
+            manifest = [link(f) for f in files]
+        self.__write_manifest(manifest)
+        self.objects.save_cache(self.snapshot_source, (m[0] for m in manifest))
         self.create_symlink()
+        self.stats = SnapshotStats(len(manifest), sum(m[1] for m in manifest),
+                                   sum(1 for path, *_, name in manifest if path in last and last[path][3] == name),
+                                   time.perf_counter() - start)
+        return self.stats
 
-    def create_symlink(self):
-        if os.path.exists(self.last_snapshot_link):
-            os.remove(self.last_snapshot_link)
-        os.symlink(self.snapshot_dest, self.last_snapshot_link)
+    def __link(self, path: str, st: os.stat_result, last: Optional[List[Any]]) -> str:
+        """
+        Links the file in `path` into the snapshot and returns the name of its object.
+        """
+        dest = os.path.join(self.snapshot_dest, path)
+        if last is not None and last[:3] == [st.st_size, st.st_mtime_ns, st.st_ino] and \
+                ObjectStore.is_executable(last[3]) == bool(st.st_mode & stat.S_IXUSR):
+            try:
+                self.objects.link(last[3], dest)
+                return last[3]
+            except FileNotFoundError:
+                # the object was removed from the store
+                pass
+        name = self.objects.add(os.path.join(self.snapshot_source, path), st)
+        self.objects.link(name, dest)
+        return name
 
-    @staticmethod
-    def get_diff_files(cmp: dircmp, directory: str):
-        for n in cmp.diff_files:
-            yield os.path.join(directory, n)
-        for d, sub_cmp in cmp.subdirs.items():
-            yield from SnapshotManager.get_diff_files(sub_cmp, os.path.join(directory, d))
+    def last_manifest(self) -> Dict[str, List[Any]]:
+        """
+        Returns the manifest of the last snapshot, i.e. [size, mtime_ns, inode, object name] by file path (relative
+        to `snapshot_source`), or an empty one if there is no last snapshot (or it has no manifest).
+        """
+        if not os.path.islink(self.last_snapshot_link):
+            return {}
+        try:
+            with open(os.readlink(self.last_snapshot_link) + MANIFEST_SUFFIX, 'r', encoding='utf-8') as f:
+                return {m[0]: m[1:] for m in json.load(f)['files']}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
 
-    @staticmethod
-    def get_new_files(cmp: dircmp, directory: str):
-        for n in cmp.left_only:
-            yield os.path.join(directory, n)
-        for d, sub_cmp in cmp.subdirs.items():
-            yield from SnapshotManager.get_new_files(sub_cmp, os.path.join(directory, d))
+    def __write_manifest(self, manifest: List[List[Any]]):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.manifest_path),
+                                        prefix=os.path.basename(self.manifest_path), suffix='.tmp')
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'files': manifest, 'objects': os.path.abspath(self.objects.path)}))
+        os.replace(tmp_path, self.manifest_path)
 
     @staticmethod
-    def get_removed_files(cmp: dircmp, directory: str):
-        for n in cmp.right_only:
-            yield os.path.join(directory, n)
-        for d, sub_cmp in cmp.subdirs.items():
-            yield from SnapshotManager.get_removed_files(sub_cmp, os.path.join(directory, d))
+    def restore(snapshot_path: str, dest: str) -> str:
+        """
+        Rebuilds the tree of the snapshot in `snapshot_path` (e.g. removed to save inodes) in `dest`, from its
+        manifest and the object store.
+
+        :return: `dest`.
+        :raises FileNotFoundError: if the snapshot has no manifest, or some of its files are no longer in the store.
+        """
+        with open(snapshot_path + MANIFEST_SUFFIX, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        objects = ObjectStore(manifest['objects'])
+        for path, *_, name in manifest['files']:
+            target = os.path.join(dest, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if not os.path.exists(target):
+                objects.link(name, target)
+        return dest
+
+    def source_files(self) -> Iterator[Tuple[str, os.stat_result]]:
+        """
+        Yields the path (relative to `snapshot_source`) and the stat of the files to snapshot. Ignored directories
+        (see :py:mod:`tmt.history.walker`) are not walked.
+        """
+        return self.walker.walk()
+
+    def create_symlink(self):
+        # the new link replaces the old one at once, so that experiments recorded at the same time (by other threads
+        # or processes) always find a valid last snapshot
+        if os.path.islink(self.last_snapshot_link):
+            self._previous_link = os.readlink(self.last_snapshot_link)
+        tmp_link = f'{self.last_snapshot_link}.{self.id}.tmp'
+        os.symlink(self.snapshot_dest, tmp_link)
+        os.replace(tmp_link, self.last_snapshot_link)
 
-    @staticmethod
-    def get_equal_files(cmp: dircmp, directory: str):
-        for n in cmp.same_files:
-            yield os.path.join(directory, n)
-        for d, sub_cmp in cmp.subdirs.items():
-            yield from SnapshotManager.get_equal_files(sub_cmp, os.path.join(directory, d))
\ No newline at end of file
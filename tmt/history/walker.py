@@ -0,0 +1,130 @@
+"""
+Walk of the files to snapshot which evaluates ignore rules directory by directory, like git does, and never descends
+into ignored directories (virtual environments, datasets, ``.git``...).
+
+Besides the ignore file of the configuration (``gitignore_path``), which applies to the whole source, every
+``.gitignore`` and ``.tmtignore`` found in the walked directories applies to that directory and its subdirectories.
+``.tmtignore`` files have the same syntax and can ignore (or, with ``!pattern``, keep) files which git should track
+but snapshots should not (or vice versa). As in git, rules of deeper files take precedence, and files of an ignored
+directory cannot be kept.
+"""
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+import os
+import pathspec
+import stat
+
+GIT_IGNORE = '.gitignore'
+TMT_IGNORE = '.tmtignore'
+# never part of a snapshot
+ALWAYS_IGNORED = ('.git',)
+
+
+class IgnoreWalker:
+    """
+    Walks the regular files under `root` which are not ignored.
+
+    :param root: directory to walk. Symbolic links to directories are followed.
+    :type root: str
+    :param ignore_path: ignore file (gitignore syntax) whose rules apply to the whole `root`, with the lowest
+        precedence. Defaults to None.
+    :type ignore_path: Optional[str], optional
+    :param excluded: directories which are never walked (e.g. the tmt directory). Defaults to ().
+    :type excluded: Iterable[str], optional
+    :param ignore_files: names of the ignore files read in every directory, in increasing order of precedence.
+        Defaults to (".gitignore", ".tmtignore").
+    :type ignore_files: Iterable[str], optional
+    """
+
+    def __init__(self, root: str, ignore_path: Optional[str] = None, excluded: Iterable[str] = (),
+                 ignore_files: Iterable[str] = (GIT_IGNORE, TMT_IGNORE)):
+        self.root = os.path.abspath(root)
+        self.ignore_path = ignore_path
+        self.excluded = {os.path.abspath(e) for e in excluded}
+        self.ignore_files = tuple(ignore_files)
+        # paths (relative to `root`) found ignored by the last walk. Files of ignored directories are not listed
+        self.ignored: List[str] = []
+
+    def walk(self) -> Iterator[Tuple[str, os.stat_result]]:
+        """
+        Yields the path (relative to `root`) and the stat of every file which is not ignored.
+        """
+        self.ignored = []
+        st = os.stat(self.root)
+        yield from self.__walk('', self.__base_specs(), {(st.st_dev, st.st_ino)})
+
+    def __walk(self, directory: str, specs: List[Tuple[str, pathspec.GitIgnoreSpec]],
+               visited: Set[Tuple[int, int]]) -> Iterator[Tuple[str, os.stat_result]]:
+        path = os.path.join(self.root, directory)
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return
+        names = {e.name for e in entries}
+        specs = specs + [(directory, self.__read_spec(os.path.join(path, n)))
+                         for n in self.ignore_files if n in names]
+        for e in entries:
+            relpath = os.path.join(directory, e.name)
+            try:
+                # follows symbolic links
+                st = e.stat()
+            except (FileNotFoundError, PermissionError):
+                # a broken symbolic link
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            if not is_dir and not stat.S_ISREG(st.st_mode):
+                continue
+            if e.name in ALWAYS_IGNORED or self.__is_ignored(relpath, is_dir, specs) or \
+                    (is_dir and self.__is_excluded(e.path)):
+                self.ignored.append(relpath)
+            elif is_dir:
+                if (st.st_dev, st.st_ino) in visited:
+                    # a symbolic link to one of its parents
+                    continue
+                yield from self.__walk(relpath, specs, visited | {(st.st_dev, st.st_ino)})
+            else:
+                yield relpath, st
+
+    def is_ignored(self, path: str) -> bool:
+        """
+        Returns `True` if the file in `path` (relative to `root`) would not be walked, i.e. if it or one of its
+        directories is ignored.
+        """
+        specs = self.__base_specs()
+        directory = ''
+        parts = os.path.normpath(path).split(os.sep)
+        for i, part in enumerate(parts):
+            specs = specs + [(directory, self.__read_spec(os.path.join(self.root, directory, n)))
+                             for n in self.ignore_files if os.path.isfile(os.path.join(self.root, directory, n))]
+            relpath = os.path.join(directory, part)
+            is_dir = i < len(parts) - 1
+            if part in ALWAYS_IGNORED or self.__is_ignored(relpath, is_dir, specs) or \
+                    (is_dir and self.__is_excluded(os.path.join(self.root, relpath))):
+                return True
+            directory = relpath
+        return False
+
+    def __base_specs(self) -> List[Tuple[str, pathspec.GitIgnoreSpec]]:
+        if self.ignore_path and os.path.isfile(self.ignore_path):
+            return [('', self.__read_spec(self.ignore_path))]
+        return []
+
+    def __is_excluded(self, path: str) -> bool:
+        return os.path.abspath(path) in self.excluded or os.path.realpath(path) in self.excluded
+
+    @staticmethod
+    def __is_ignored(relpath: str, is_dir: bool, specs: List[Tuple[str, pathspec.GitIgnoreSpec]]) -> bool:
+        # the deepest rule matching the path decides, as in git
+        for base, spec in reversed(specs):
+            path = os.path.relpath(relpath, base) if base else relpath
+            result = spec.check_file(path.replace(os.sep, '/') + ('/' if is_dir else ''))
+            if result.include is not None:
+                return result.include
+        return False
+
+    @staticmethod
+    def __read_spec(path: str) -> pathspec.GitIgnoreSpec:
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return pathspec.GitIgnoreSpec.from_lines(f)
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return pathspec.GitIgnoreSpec.from_lines([])
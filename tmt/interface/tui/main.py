@@ -59,7 +59,9 @@ class MainApp(BaseApp):
         self.app.layout = Layout(layout, focused_element=layout)
 
     def search_by_date(self, clear=True):
-        pass
+        self.search_by = SearchBy.DATE
+        layout = self.search_layout.search_by_date_layout(clear)
+        self.app.layout = Layout(layout, focused_element=layout)
 
     def entry_display(self, entry: Entry):
         if self.search_by is SearchBy.NAME:
@@ -6,12 +6,14 @@ from prompt_toolkit.buffer import Buffer
 from prompt_toolkit.utils import Event
 from typing import Optional, Callable, Iterable
 from tmt.configs.parser import Configs
-from tmt.storage.json_db import DbManager
 from tmt.storage.schema import Entry
 from tmt.interface.tui.base import BaseApp, FocusableText, date_formatter
 from functools import partial
+from datetime import datetime, timedelta
 from enum import Enum, auto
 
+MOST_RECENT_ENTRIES = 50
+
 
 class SearchBy(Enum):
     NAME = auto()
@@ -26,7 +28,7 @@ class SearchLayout(BaseApp):
             self.config = Configs.from_config(config_path)
         else:
             self.config = Configs.from_default_path_or_default_config()
-        self.db = DbManager(self.config.json_db_path, read_only=True)
+        self.db = self.config.init_db_manager(read_only=True)
         self.results_box = HSplit([Label(text='No results...')])
         self.search_label = Label(text='', dont_extend_width=True)
         self.search_text = Buffer(multiline=False)
@@ -50,6 +52,14 @@ class SearchLayout(BaseApp):
             self.__clear_search_text()
         return self.__search_layout()
 
+    def search_by_date_layout(self, clear):
+        self.search_label.text = 'Search date (YYYY-MM-DD [YYYY-MM-DD]):'
+        self.search_text.on_text_changed = Event(self.search_text, self.search_by_date)
+        if clear:
+            self.__clear_search_text()
+            self.search_by_date(self.search_text)
+        return self.__search_layout()
+
     def search_by_name(self, buffer: Buffer):
         try:
             entries = self.db.get_entries_by_name_regex(buffer.text)
@@ -69,8 +79,23 @@ class SearchLayout(BaseApp):
         self._show_results((entry,))
     
     def search_by_date(self, buffer: Buffer):
-        pass
-        
+        if buffer.text.strip() == '':
+            entries = self.db.get_most_recent_entries(MOST_RECENT_ENTRIES)
+        else:
+            try:
+                dates = [datetime.strptime(d, '%Y-%m-%d') for d in buffer.text.split()]
+            except ValueError:
+                dates = []
+            if not 1 <= len(dates) <= 2:
+                self.__clear_results()
+                return
+            # the last day is included
+            entries = self.db.get_entries_between_dates(dates[0], dates[-1] + timedelta(days=1) - timedelta(seconds=1))
+        if len(entries) == 0:
+            self.__clear_results()
+            return
+        self._show_results(entries)
+
     def _show_results(self, entries: Iterable[Entry]):
         self.results_box.children = []
         ids = HSplit([Label(text='ID')])
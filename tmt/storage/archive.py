@@ -0,0 +1,233 @@
+"""
+Archival of old entries, so that the database parsed by every recorder and search only holds the recent ones.
+:py:func:`tmt.storage.archive.archive_entries` moves the entries older than a date (or matching a query) to a
+compressed, read-only segment in ``db_path + '.archive'``.
+
+The manifest of the archive keeps a small index of every segment (ids, names, metric names and date ranges). Queries
+of :py:class:`tmt.storage.base.BaseDbManager` check it to read only the segments which could hold matching entries.
+See also the ``archive`` command of :py:mod:`tmt.tmt_cli`.
+"""
+from __future__ import annotations
+from tmt.storage.base import BaseDbManager
+from tmt.storage.locks import ProcessFileLock
+from tmt.storage.query import Query
+from tmt.storage.schema import Entry, DATE_FIELDS
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+from dataclasses import dataclass, asdict, field
+from functools import cached_property
+from datetime import datetime
+import gzip
+import itertools
+import json
+import os
+import re
+import tempfile
+
+MANIFEST = 'manifest.json'
+
+
+@dataclass
+class Segment:
+    """
+    Index of an archive segment, as stored in the manifest.
+    """
+    # file name, relative to the archive directory
+    file: str
+    count: int
+    ids: List[str] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    metrics: List[str] = field(default_factory=list)
+    # date field -> [min, max] of the entries with that date, or None if no entry has it
+    dates: Dict[str, Optional[List[float]]] = field(default_factory=dict)
+
+    @cached_property
+    def id_set(self) -> frozenset:
+        return frozenset(self.ids)
+
+    @classmethod
+    def of(cls, file: str, data: List[Dict[str, Any]]) -> Segment:
+        """
+        Returns the index of the (top-level) raw entries in `data`.
+        """
+        dates = {}
+        for name in DATE_FIELDS:
+            values = [d[name] for d in data if d.get(name) is not None]
+            dates[name] = [min(values), max(values)] if values else None
+        return cls(file, len(data), [d['id'] for d in data], sorted({d['name'] for d in data}),
+                   sorted({m['name'] for d in data for m in d['metrics']}), dates)
+
+    def could_match(self, query: Query, metric_names: Iterable[str] = ()) -> bool:
+        """
+        Returns `False` if, according to the index, no entry of this segment matches the criteria of `query` and
+        has all the metrics in `metric_names`.
+        """
+        if query.ids is not None and query.ids.isdisjoint(self.id_set):
+            return False
+        if query.exact_names is not None and query.exact_names.isdisjoint(self.names):
+            return False
+        for substring in query.substrings:
+            if not any(substring in name for name in self.names):
+                return False
+        for regex in query.regexes:
+            match = re.compile(regex).match
+            if not any(match(name) for name in self.names):
+                return False
+        for r in query.dates:
+            bounds = self.dates.get(r.field)
+            if bounds is None or not r.overlaps(*bounds):
+                return False
+        return all(name in self.metrics for name in itertools.chain((m.name for m in query.metrics), metric_names))
+
+
+class SegmentDbManager(BaseDbManager):
+    """
+    Read-only access to an archive segment, a gzipped json list of raw records (i.e. top-level entries, each followed
+    by its sub-entries).
+
+    :param db_path: path to the segment file.
+    :type db_path: str
+    """
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path, read_only=True)
+
+    check_can_write = BaseDbManager.check_can_write
+
+    # segments are written once, by `Archive.add_segment`: writes are denied, as by any read-only database
+    @check_can_write
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        pass
+
+    @check_can_write
+    def delete_entry(self, entry: Entry) -> bool:
+        return False
+
+    @check_can_write
+    def delete_all(self):
+        pass
+
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        with gzip.open(self.db_path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _signature(self) -> Hashable:
+        return self._stat_signature(self.db_path)
+
+    def _archived(self, query: Query, predicate=None, metric_names: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        return []
+
+
+class Archive:
+    """
+    The archive of the database in `db_path`, i.e. the segments listed in ``db_path + '.archive/manifest.json'``.
+
+    :param db_path: path to the database.
+    :type db_path: str
+    """
+
+    def __init__(self, db_path: str):
+        self.path = f'{db_path}.archive'
+        self.manifest_path = os.path.join(self.path, MANIFEST)
+        self.__manifest: Tuple[Optional[Hashable], List[Segment]] = (None, [])
+        self.__segments: Dict[str, SegmentDbManager] = {}
+
+    def segments(self) -> List[Segment]:
+        """
+        Returns the segments of the archive, oldest first. The manifest is only read again when it changes.
+        """
+        try:
+            signature = BaseDbManager._stat_signature(self.manifest_path)
+        except FileNotFoundError:
+            return []
+        if self.__manifest[0] != signature:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.__manifest = (signature, [Segment(**s) for s in json.load(f)['segments']])
+        return self.__manifest[1]
+
+    def open(self, segment: Segment) -> SegmentDbManager:
+        if segment.file not in self.__segments:
+            self.__segments[segment.file] = SegmentDbManager(os.path.join(self.path, segment.file))
+        return self.__segments[segment.file]
+
+    def add_segment(self, data: List[Dict[str, Any]]) -> Segment:
+        """
+        Writes the raw (top-level) entries in `data` to a new segment and adds it to the manifest. Both files are
+        written to a temporary file and then renamed, so that readers never see them half-written.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with ProcessFileLock(f'{self.manifest_path}.lock'):
+            segments = self.segments()
+            segment = Segment.of(f'segment-{len(segments) + 1:06d}.json.gz', data)
+            records = [r for d in data for r in BaseDbManager._split_records(d)]
+            self.__write(segment.file, gzip.compress(json.dumps(records).encode('utf-8')))
+            manifest = {'segments': [asdict(s) for s in segments + [segment]]}
+            self.__write(MANIFEST, json.dumps(manifest).encode('utf-8'))
+        return segment
+
+    def __write(self, name: str, content: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=f'{name}.', suffix='.tmp')
+        try:
+            with open(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.path, name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+@dataclass
+class ArchiveReport:
+    """
+    Outcome of :py:func:`tmt.storage.archive.archive_entries`.
+    """
+    # entries moved to the archive
+    archived: int = 0
+    # the new segment, or None if no entry was archived
+    segment: Optional[Segment] = None
+
+
+def archive_entries(db: BaseDbManager, before: Optional[Union[datetime, int]] = None, query: Optional[Query] = None,
+                    field='date_created') -> ArchiveReport:
+    """
+    Moves the entries of `db` matching `query` whose `field` date is older than `before` (either criterion can be
+    omitted), together with their sub-entries, to a new archive segment. Archived entries are still returned by the
+    queries of `db`, which read the segments only when their index says they could match (see
+    :py:class:`tmt.storage.archive.Segment`).
+
+    The segment is written before the entries are deleted from `db`: should the process die in between, the entries
+    are in both and queries return the ones in `db`.
+
+    **Usage**:
+
+    .. code-block:: python
+
+        db = DbManager('.tmt/tmt_db.json')
+        # archive what is older than a year, and every run of the old baseline
+        archive_entries(db, before=datetime.now() - timedelta(days=365))
+        archive_entries(db, query=db.query().name_regex(r'baseline_v1.*'))
+
+    :param db: the database to archive entries from.
+    :type db: BaseDbManager
+    :param before: if given, entries whose `field` date is older than this are archived. Defaults to None.
+    :type before: Optional[Union[datetime, int]], optional
+    :param query: if given, entries matching it are archived. Defaults to None.
+    :type query: Optional[Query], optional
+    :param field: the date `before` refers to, either "date_created" or "date_saved". Defaults to "date_created".
+    :type field: str, optional
+    :raises ValueError: if neither `before` nor `query` is given.
+    """
+    if before is None and query is None:
+        raise ValueError('Specify `before` and/or `query` to select the entries to archive')
+    query = query or db.query()
+    if before is not None:
+        query.before(before, field)
+    # only the database itself, entries already archived stay where they are
+    entries = list(db._execute_query(query))
+    if not entries:
+        return ArchiveReport()
+    segment = db.archive.add_segment([e.to_dict() for e in entries])
+    db.delete_entries(entries)
+    return ArchiveReport(len(entries), segment)
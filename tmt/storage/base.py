@@ -0,0 +1,710 @@
+from abc import ABC, abstractmethod
+from tmt.storage.schema import Entry, DATE_FIELDS
+from tmt.storage.compact import CompactEntry
+from tmt.storage.query import Query
+from typing import TYPE_CHECKING, List, Optional, Union, Iterable, Iterator, Generator, Dict, Any, Callable, \
+    Hashable, Tuple
+from dataclasses import dataclass
+from functools import cached_property
+from contextlib import closing
+from datetime import datetime
+import bisect
+import heapq
+import itertools
+import operator
+import os
+import warnings
+import re
+
+if TYPE_CHECKING:
+    from tmt.storage.archive import Archive
+    from tmt.storage.columnar import MetricColumns
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """
+    Position in a database, used to paginate through it with :py:meth:`tmt.storage.base.BaseDbManager.get_page`.
+    Cursors should be treated as opaque values.
+    """
+    # number of entries preceding this position, in database order
+    position: int
+    # id of the entry preceding this position, used to resume from the right entry if the database changed
+    last_id: Optional[str] = None
+    # backend-specific hint to reach this position without scanning the preceding entries (e.g. a file offset)
+    token: Any = None
+
+
+@dataclass
+class Page:
+    """
+    A page of entries returned by :py:meth:`tmt.storage.base.BaseDbManager.get_page`. `cursor` is the position of
+    the next page, or `None` if there are no more entries.
+    """
+    entries: List[Entry]
+    cursor: Optional[Cursor]
+
+
+class DateIndex:
+    """
+    Entries sorted by one of their dates (i.e. `date_created` or `date_saved`), so that range queries are a
+    binary search. Entries without a date are not indexed.
+    """
+
+    def __init__(self, data: List[Dict[str, Any]], field: str):
+        self.data = data
+        # entries are mostly appended in chronological order, so this sort is close to linear
+        self.positions = sorted((i for i, d in enumerate(data) if d.get(field) is not None),
+                                key=lambda i: data[i][field])
+        self.dates = [data[i][field] for i in self.positions]
+
+    def between(self, first: Optional[float] = None, second: Optional[float] = None,
+                include_first=True, include_second=True) -> List[Dict[str, Any]]:
+        """
+        Returns the entries dated between `first` and `second`, in chronological order. A `None` bound is open.
+        """
+        return [self.data[i] for i in self.positions_between(first, second, include_first, include_second)]
+
+    def positions_between(self, first: Optional[float] = None, second: Optional[float] = None,
+                          include_first=True, include_second=True) -> List[int]:
+        """
+        Same as :py:meth:`tmt.storage.base.DateIndex.between`, but returns the positions of the entries in the
+        database.
+        """
+        lo, hi = 0, len(self.dates)
+        if first is not None:
+            lo = (bisect.bisect_left if include_first else bisect.bisect_right)(self.dates, first)
+        if second is not None:
+            hi = (bisect.bisect_right if include_second else bisect.bisect_left)(self.dates, second)
+        return self.positions[lo:hi]
+
+    def most_recent(self, n: int) -> List[Dict[str, Any]]:
+        return [self.data[i] for i in reversed(self.positions[max(len(self.positions) - n, 0):])]
+
+
+class DbView:
+    """
+    Parsed content of a database, together with the indexes derived from it. Views are cached by
+    :py:class:`tmt.storage.base.BaseDbManager` and must be treated as immutable.
+
+    Sub-entries stored as separate records (i.e. with a `parent_id`, see
+    :py:meth:`tmt.storage.base.BaseDbManager._split_records`) are appended to the `other_runs` of their parent, so that
+    `data` only holds top-level entries, like the database used to.
+
+    :param data: the raw records stored in the database.
+    :type data: List[Dict[str, Any]]
+    """
+
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = self.__link_sub_entries(data)
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_name: Dict[str, List[int]] = {}
+        for i, d in enumerate(self.data):
+            self.by_id.setdefault(d['id'], d)
+            self.by_name.setdefault(d['name'], []).append(i)
+
+    @cached_property
+    def sub_entries_by_id(self) -> Dict[str, Dict[str, Any]]:
+        return {c['id']: c for d in self.data for c in d['other_runs']}
+
+    @staticmethod
+    def link_sub_entries(d: Dict[str, Any], sub_entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Returns the top-level record `d` with `sub_entries` (i.e. its sub-entries stored as separate records)
+        appended to its `other_runs`.
+        """
+        # sub-entries saved by older versions are stored in their parent, without a parent_id
+        other_runs = [c if c.get('parent_id') is not None else dict(c, parent_id=d['id']) for c in d['other_runs']]
+        if not sub_entries and all(c is o for c, o in zip(other_runs, d['other_runs'])):
+            return d
+        # the records are copied rather than annotated or extended: backends may keep them (e.g. the jsonl one), and
+        # must not write back the parent_id nor the sub-entries stored separately
+        return dict(d, other_runs=other_runs + (sub_entries or []))
+
+    @classmethod
+    def __link_sub_entries(cls, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        sub_entries: Dict[str, List[Dict[str, Any]]] = {}
+        for d in data:
+            if d.get('parent_id') is not None:
+                sub_entries.setdefault(d['parent_id'], []).append(d)
+        return [cls.link_sub_entries(d, sub_entries.get(d['id'])) for d in data if d.get('parent_id') is None]
+
+    def with_name(self, predicate: Callable[[str], Any]) -> List[Dict[str, Any]]:
+        """
+        Returns the entries whose name satisfies `predicate`, in database order. The predicate is evaluated once
+        for each distinct name.
+        """
+        positions = sorted(i for name, pos in self.by_name.items() if predicate(name) for i in pos)
+        return [self.data[i] for i in positions]
+
+    def date_index(self, field: str) -> DateIndex:
+        if field not in DATE_FIELDS:
+            raise ValueError(f'{field} is not a date field. Use one of {", ".join(DATE_FIELDS)}')
+        return self.date_indexes[field]
+
+    @cached_property
+    def date_indexes(self) -> Dict[str, DateIndex]:
+        return {field: DateIndex(self.data, field) for field in DATE_FIELDS}
+
+
+class BaseDbManager(ABC):
+    """
+    Base class for every `tmt` database backend. Backends must implement the deletions,
+    :py:meth:`tmt.storage.base.BaseDbManager._write_raw`, which adds and updates raw (i.e. json-like) entries, and
+    :py:meth:`tmt.storage.base.BaseDbManager._read_raw`, which returns the raw entries stored in the database.
+    Every query is implemented on top of it, so that all backends expose the same public API of
+    :py:class:`tmt.storage.json_db.DbManager`. If `read_only` is `True`, all operations which add and/or modify the
+    database won't be allowed.
+
+    :param db_path: path to the database file.
+    :type db_path: str
+    :param read_only: if `True` all writing access is denied, defaults to False.
+    :type read_only: bool, optional
+    """
+    # Parsed databases shared by all the instances in this process, see `_view`
+    _views: Dict[Tuple[type, str], Tuple[Hashable, DbView]] = {}
+
+    def __init__(self, db_path: str, read_only=False):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.read_only = read_only
+        # (what the columns were built from, columns), without and with the archive. See `metric_columns`
+        self.__columns: Dict[bool, Tuple[Hashable, 'MetricColumns']] = {}
+
+    def check_can_write(func):
+        def inner(*args, **kwargs):
+            if not args[0].read_only:
+                return func(*args, **kwargs)
+        return inner
+
+    def add_new_entries(self, entries: List[Entry]):
+        """
+        Adds `entries` to the database. Entries which already exist, or sub-entries whose parent does not exist, are
+        skipped with a warning.
+        """
+        self._write_raw([e.to_dict() for e in entries], [])
+
+    def update_entries(self, entries: List[Entry]):
+        """
+        Updates `entries` in the database. Entries which don't exist are ignored, while sub-entries added to the
+        `other_runs` of an updated entry are added as well.
+        """
+        self._write_raw([], [e.to_dict() for e in entries])
+
+    @abstractmethod
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        """
+        Adds the raw (i.e. json-like) entries in `added` and updates the ones in `updated`, in a single write.
+        See :py:meth:`tmt.storage.base.BaseDbManager._new_records` and
+        :py:meth:`tmt.storage.base.BaseDbManager._updated_records`, which implement the rules shared by all
+        backends.
+        """
+        ...
+
+    @abstractmethod
+    def delete_entry(self, entry: Entry) -> bool:
+        ...
+
+    @abstractmethod
+    def delete_all(self):
+        ...
+
+    @check_can_write
+    def delete_entries(self, entries: List[Entry]) -> int:
+        """
+        Deletes `entries` (with their sub-entries) and returns how many of them were in the database. Backends
+        should override this to delete them in a single write.
+        """
+        return sum(bool(self.delete_entry(e)) for e in entries)
+
+    @abstractmethod
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        """
+        Returns the list of entries stored in the database, as dictionaries.
+        """
+        ...
+
+    def _signature(self) -> Optional[Hashable]:
+        """
+        Returns a value which changes every time the database changes, used to validate the cached
+        :py:class:`tmt.storage.base.DbView`. Backends returning `None` (the default) are never cached.
+        """
+        return None
+
+    def _view(self) -> DbView:
+        """
+        Returns the parsed database. The parsed data is cached and only read again when
+        :py:meth:`tmt.storage.base.BaseDbManager._signature` changes, so that repeated queries on an unchanged
+        database don't need to read it again.
+        """
+        # the signature must be taken before reading: if the db changes in between we'll just read it again
+        signature = self._signature()
+        if signature is None:
+            return DbView(self._read_raw())
+        view = self._cached_view(signature)
+        if view is None:
+            view = DbView(self._read_raw())
+            self._views[self.__view_key()] = (signature, view)
+        return view
+
+    def _cached_view(self, signature: Hashable) -> Optional[DbView]:
+        cached = self._views.get(self.__view_key())
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        return None
+
+    def _iter_raw(self, cursor: Optional[Cursor] = None) -> Iterator[Tuple[Dict[str, Any], Cursor]]:
+        """
+        Iterates over the raw entries starting from `cursor` (or from the beginning), yielding each of them with the
+        cursor of the following position. Backends able to stream the database should override this, the default
+        implementation goes through the (cached) parsed database.
+        """
+        data = self._view().data
+        start = 0
+        if cursor is not None:
+            start = next((i + 1 for i, d in enumerate(data) if d['id'] == cursor.last_id), cursor.position)
+        for i in range(start, len(data)):
+            yield data[i], Cursor(i + 1, data[i]['id'])
+
+    def _store_view(self, data: List[Dict[str, Any]]):
+        """
+        Caches `data` as the current content of the database. Backends should call this after a write, while
+        still holding their lock, so that the next query does not need to read the database again.
+        """
+        signature = self._signature()
+        if signature is not None:
+            self._views[self.__view_key()] = (signature, DbView(data))
+
+    def _invalidate_view(self):
+        self._views.pop(self.__view_key(), None)
+
+    def __view_key(self) -> Tuple[type, str]:
+        return type(self), os.path.abspath(self.db_path)
+
+    @staticmethod
+    def _split_records(d: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Returns the records to store for the raw entry `d`: the entry itself, followed by the sub-entries in its
+        `other_runs` whose `parent_id` is the id of `d`. Those are stored as separate records, so that adding a run to
+        an experiment with many runs doesn't need to rewrite all of them, and are linked back to their parent when
+        the database is read (see :py:class:`tmt.storage.base.DbView`). Sub-entries without a `parent_id` (i.e. saved
+        by older versions) are kept in the parent record.
+        """
+        linked = [c for c in d['other_runs'] if c.get('parent_id') == d['id']]
+        if linked:
+            d = dict(d, other_runs=[c for c in d['other_runs'] if c.get('parent_id') != d['id']])
+        return [d, *linked]
+
+    def _new_records(self, added: Iterable[Dict[str, Any]], exists: Callable[[str], bool],
+                     is_parent: Callable[[str], bool]) -> List[Dict[str, Any]]:
+        """
+        Returns the records to add for the raw entries in `added`. Entries which already exist and sub-entries whose
+        parent does not exist are skipped, with a warning.
+
+        :param exists: returns `True` if a record with the given id is stored in the database.
+        :type exists: Callable[[str], bool]
+        :param is_parent: returns `True` if a top-level entry with the given id is stored in the database.
+        :type is_parent: Callable[[str], bool]
+        """
+        records, ids, parent_ids = [], set(), set()
+        for d in added:
+            if exists(d['id']) or d['id'] in ids:
+                warnings.warn(f'Entry with id {d["id"]} already exists. This will not be overwritten.')
+                continue
+            parent_id = d.get('parent_id')
+            if parent_id is not None and parent_id not in parent_ids and not is_parent(parent_id):
+                warnings.warn(f'Parent entry with id {parent_id} does not exist. Entry with id {d["id"]} will not be '
+                              f'added.')
+                continue
+            for r in self._split_records(d):
+                if not exists(r['id']) and r['id'] not in ids:
+                    ids.add(r['id'])
+                    records.append(r)
+            if parent_id is None:
+                parent_ids.add(d['id'])
+        return records
+
+    def _updated_records(self, updated: Iterable[Dict[str, Any]],
+                         exists: Callable[[str], bool]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Returns the records to replace and the records to add for the raw entries in `updated`. Entries which don't
+        exist are ignored; sub-entries added to the `other_runs` of an updated entry are added.
+        """
+        replaced, added = [], []
+        for d in updated:
+            if not exists(d['id']):
+                continue
+            record, *sub_entries = self._split_records(d)
+            replaced.append(record)
+            for s in sub_entries:
+                (replaced if exists(s['id']) else added).append(s)
+        return replaced, added
+
+    def _apply_raw(self, data: List[Dict[str, Any]], added: List[Dict[str, Any]],
+                   updated: List[Dict[str, Any]]) -> bool:
+        """
+        Adds and updates the raw entries in `added` and `updated` in the records `data` (i.e. top-level entries and
+        sub-entries stored separately), in place, following the same rules as
+        :py:meth:`tmt.storage.base.BaseDbManager._write_raw`. Returns `True` if `data` changed.
+        """
+        positions = {d['id']: i for i, d in enumerate(data)}
+        replaced, new_records = self._updated_records(updated, positions.__contains__)
+        for d in replaced:
+            data[positions[d['id']]] = d
+        data.extend(new_records)
+        positions.update((d['id'], i) for i, d in enumerate(new_records, start=len(data) - len(new_records)))
+
+        def is_parent(id: str) -> bool:
+            return id in positions and data[positions[id]].get('parent_id') is None
+
+        added_records = self._new_records(added, positions.__contains__, is_parent)
+        data.extend(added_records)
+        return bool(replaced or new_records or added_records)
+
+    @staticmethod
+    def _stat_signature(path: Union[str, int]) -> Hashable:
+        # `path` can also be the descriptor of an open file
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _execute_query(self, query: Query) -> Iterator[Entry]:
+        """
+        Returns the entries matching `query`. The candidates are taken from the most selective index among the
+        exact names and the date ranges of the query, then all the criteria are checked on the raw entries in a
+        single pass. Only the matching entries (or, if the query is sorted and limited, only the top ones) are
+        decoded. Backends able to evaluate queries natively should override this.
+        """
+        view = self._view()
+        candidates = None
+        if query.exact_names is not None:
+            candidates = sorted(i for name in query.exact_names for i in view.by_name.get(name, []))
+        for r in query.dates:
+            positions = view.date_index(r.field).positions_between(r.first, r.second, r.include_first,
+                                                                   r.include_second)
+            if candidates is None or len(positions) < len(candidates):
+                candidates = sorted(positions)
+        data = view.data if candidates is None else [view.data[i] for i in candidates]
+        matching = filter(query.raw_predicate(), data)
+        start, stop = query.window()
+        if query.sort_field is not None:
+            matching = self.__sorted(query, matching, None if query.predicates else stop)
+        entries = map(Entry.from_dict, matching)
+        for predicate in query.predicates:
+            entries = filter(predicate, entries)
+        return itertools.islice(entries, start, stop)
+
+    @staticmethod
+    def __sorted(query: Query, data: Iterable[Dict[str, Any]], n: Optional[int]) -> List[Dict[str, Any]]:
+        present, missing = [], []
+        for d in data:
+            value = query.sort_value(d)
+            (missing if value is None else present).append((value, d))
+        if n is None:
+            present.sort(key=operator.itemgetter(0), reverse=query.sort_descending)
+        else:
+            # both are stable, i.e. ties are kept in database order
+            top = heapq.nlargest if query.sort_descending else heapq.nsmallest
+            present = top(n, present, key=operator.itemgetter(0))
+        return [d for _, d in itertools.chain(present, missing)]
+
+    def metric_columns(self, archived=False) -> 'MetricColumns':
+        """
+        Returns the metrics of the database as a :py:class:`tmt.storage.columnar.MetricColumns`, for vectorized
+        queries across entries. The columns are kept by this instance and only updated (incrementally) when the
+        database changes. Requires `numpy`.
+
+        :param archived: if `True`, the archived entries (see :py:mod:`tmt.storage.archive`) come first in the
+            columns, which requires reading the whole archive once. Defaults to False.
+        :type archived: bool, optional
+        """
+        from tmt.storage.columnar import MetricColumns
+        view = self._view()
+        segments = self.archive.segments() if archived else None
+        source, columns = self.__columns.get(archived, (None, None))
+        if columns is None:
+            columns = MetricColumns()
+        # the list of segments is the same object until the archive changes
+        if source is None or source[0] is not view or source[1] is not segments:
+            columns.update(self.__with_archived(view.data, self._archived(Query(self))) if archived else view.data)
+            self.__columns[archived] = ((view, segments), columns)
+        return columns
+
+    @cached_property
+    def archive(self) -> 'Archive':
+        """
+        The archive of this database, see :py:mod:`tmt.storage.archive`.
+        """
+        from tmt.storage.archive import Archive
+        return Archive(self.db_path)
+
+    def _archived(self, query: Query, predicate: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                  metric_names: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Returns the archived raw entries matching `query` (but its :py:meth:`tmt.storage.query.Query.where`
+        predicates, order and window) or, if given, `predicate`. Only the segments whose index says they could hold
+        matching entries (with all the metrics in `metric_names`) are read.
+        """
+        segments = self.archive.segments()
+        if not segments:
+            return []
+        data = []
+        for segment in segments:
+            if segment.could_match(query, metric_names):
+                predicate = predicate or query.raw_predicate()
+                data.extend(filter(predicate, self.archive.open(segment)._view().data))
+        return data
+
+    @staticmethod
+    def __with_archived(data: List[Dict[str, Any]], archived: List[Dict[str, Any]],
+                        key: Optional[Callable[[Dict[str, Any]], Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the raw entries in `data` preceded by the `archived` ones which are not in `data` (entries are
+        archived before being deleted, so for a while they may be in both), sorted by `key` if given.
+        """
+        if not archived:
+            return data
+        ids = {d['id'] for d in data}
+        data = [d for d in archived if d['id'] not in ids] + data
+        if key is not None:
+            data.sort(key=key)
+        return data
+
+    @staticmethod
+    def _with_archived_entries(entries: List[Entry], archived: List[Dict[str, Any]],
+                               field: Optional[str] = None) -> List[Entry]:
+        """
+        Same as the private `__with_archived`, for backends whose getters don't work on raw entries (e.g.
+        :py:class:`tmt.storage.sqlite_db.SqliteDbManager`): the `archived` raw entries which are not in `entries`
+        come first, and all of them are sorted by their `field` date if given.
+        """
+        if not archived:
+            return entries
+        ids = {e.id for e in entries}
+        entries = [Entry.from_dict(d) for d in archived if d['id'] not in ids] + entries
+        if field is not None:
+            entries.sort(key=operator.attrgetter(field))
+        return entries
+
+    def query(self) -> Query:
+        """
+        Returns a new :py:class:`tmt.storage.query.Query` on this database, which combines several criteria in a
+        single pass over the database (or in a single SQL statement, for
+        :py:class:`tmt.storage.sqlite_db.SqliteDbManager`).
+
+        **Usage**:
+
+        .. code-block:: python
+
+            entries = db.query().name_regex(r'resnet.*').metric('f1', '>', 0.8).limit(5).all()
+        """
+        return Query(self)
+
+    def _exists(self, entry: Entry) -> bool:
+        """
+        Returns `True` if `entry` (either a top-level entry or a sub-entry) is already stored in the database.
+        """
+        view = self._view()
+        return entry.id in (view.by_id if entry.parent_id is None else view.sub_entries_by_id)
+
+    @check_can_write
+    def add_or_update_entry(self, entry: Entry):
+        """
+        Adds `entry` to the database, or updates it if it already exists. `entry` can also be a sub-entry (i.e. with
+        a `parent_id`), in which case only the sub-entry is written.
+        """
+        if self._exists(entry):
+            self.update_entries([entry])
+        else:
+            self.add_new_entries([entry])
+
+    def get_all_entries(self, compact=False, archived=False) -> List[Union[Entry, CompactEntry]]:
+        """
+        Returns all the entries in the database.
+
+        :param compact: if `True`, returns :py:class:`tmt.storage.compact.CompactEntry` objects, which take less
+            than half the memory of :py:class:`tmt.storage.schema.Entry`. Defaults to False.
+        :type compact: bool, optional
+        :param archived: if `True`, the archived entries (see :py:mod:`tmt.storage.archive`) are returned as well,
+            which requires reading the whole archive. Defaults to False.
+        :type archived: bool, optional
+        """
+        data = self._view().data
+        if archived:
+            data = self.__with_archived(data, self._archived(Query(self)))
+        return list(map(CompactEntry.from_dict if compact else Entry.from_dict, data))
+
+    def iter_entries(self, predicate: Optional[Callable[[Entry], Any]] = None, offset=0,
+                     limit: Optional[int] = None, archived=False) -> Generator[Entry, None, None]:
+        """
+        Lazily iterates over the entries in the database. Entries are decoded one at a time and, where the backend
+        supports it (e.g. :py:class:`tmt.storage.json_db.DbManager`), the database is parsed incrementally, so that
+        huge databases can be scanned without loading them in memory.
+
+        **Usage**:
+
+        .. code-block:: python
+
+            for entry in db.iter_entries(lambda e: e.name.startswith('resnet'), limit=100):
+                ...
+
+        :param predicate: if given, only entries for which it returns a true value are yielded.
+        :type predicate: Optional[Callable[[Entry], Any]], optional
+        :param offset: number of (matching) entries to skip, defaults to 0.
+        :type offset: int, optional
+        :param limit: maximum number of entries to yield, defaults to None (i.e. no limit).
+        :type limit: Optional[int], optional
+        :param archived: if `True`, the archived entries (see :py:mod:`tmt.storage.archive`) which are not in the
+            database are yielded after the ones in the database, one segment at a time. Defaults to False.
+        :type archived: bool, optional
+        """
+        with closing(self._iter_raw()) as raw:
+            data = (d for d, _ in raw)
+            if archived:
+                ids = set()
+
+                def live(data: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+                    for d in data:
+                        ids.add(d['id'])
+                        yield d
+
+                # only started once the database was read, i.e. when `ids` is complete
+                data = itertools.chain(live(data), (d for segment in self.archive.segments()
+                                                for d in self.archive.open(segment)._view().data
+                                                if d['id'] not in ids))
+            entries = filter(predicate, map(Entry.from_dict, data))
+            yield from itertools.islice(entries, offset, None if limit is None else offset + limit)
+
+    def get_page(self, limit: int, cursor: Optional[Cursor] = None,
+                 predicate: Optional[Callable[[Entry], Any]] = None) -> Page:
+        """
+        Returns at most `limit` entries, starting from `cursor`. Archived entries (see :py:mod:`tmt.storage.archive`)
+        are not paged: use :py:meth:`tmt.storage.base.BaseDbManager.iter_entries` with ``archived=True`` to go through
+        them as well. Use the cursor of the returned :py:class:`tmt.storage.base.Page` to get the next page:
+
+        .. code-block:: python
+
+            page = db.get_page(100)
+            while page.cursor is not None:
+                page = db.get_page(100, page.cursor)
+
+        :param limit: maximum number of entries in the page.
+        :type limit: int
+        :param cursor: where the page starts, i.e. the cursor of the previous page. Defaults to None (i.e. the
+            first page).
+        :type cursor: Optional[Cursor], optional
+        :param predicate: if given, only entries for which it returns a true value are returned.
+        :type predicate: Optional[Callable[[Entry], Any]], optional
+        """
+        entries = []
+        with closing(self._iter_raw(cursor)) as raw:
+            for d, next_cursor in raw:
+                entry = Entry.from_dict(d)
+                if predicate is None or predicate(entry):
+                    entries.append(entry)
+                    if len(entries) == limit:
+                        return Page(entries, next_cursor)
+        return Page(entries, None)
+
+    def get_entry_by_id(self, id: str) -> Optional[Entry]:
+        d = self._view().by_id.get(id)
+        if d is None:
+            d = next(iter(self._archived(Query(self).id(id))), None)
+        return Entry.from_dict(d) if d is not None else None
+
+    def get_entry_by_exact_name(self, name: str) -> Optional[Entry]:
+        view = self._view()
+        entries = self.__with_archived([view.data[i] for i in view.by_name.get(name, [])],
+                                       self._archived(Query(self).name(name, exact=True)))
+        if len(entries) > 1:
+            warnings.warn(f'Found {len(entries)} entries for name {name}. Returning the first one.')
+        return Entry.from_dict(entries[0])
+
+    def get_entries_by_name(self, name: str) -> List[Entry]:
+        entries = self.__with_archived(self._view().with_name(lambda n: name in n),
+                                       self._archived(Query(self).name(name)))
+        return list(map(Entry.from_dict, entries))
+
+    def get_entries_by_name_regex(self, regex: str) -> List[Entry]:
+        pattern = re.compile(regex)
+        entries = self.__with_archived(self._view().with_name(pattern.match),
+                                       self._archived(Query(self).name_regex(regex)))
+        return list(map(Entry.from_dict, entries))
+
+    def get_entries_between_dates(self, first: Union[datetime, int], second: Union[datetime, int],
+                                  field='date_created') -> List[Entry]:
+        """
+        Returns the entries whose `field` date is between `first` and `second` (both included), in chronological
+        order.
+
+        :param field: the date to search by, either "date_created" or "date_saved". Defaults to "date_created".
+        :type field: str, optional
+        """
+        first, second = self._convert_date_to_timestamp(first, second)
+        entries = self.__with_archived(self._view().date_index(field).between(first, second),
+                                       self._archived(Query(self).between(first, second, field)),
+                                       operator.itemgetter(field))
+        return list(map(Entry.from_dict, entries))
+
+    def get_entries_greater_than_date(self, date: Union[datetime, int], field='date_created') -> List[Entry]:
+        timestamp = next(self._convert_date_to_timestamp(date))
+        entries = self.__with_archived(self._view().date_index(field).between(timestamp, include_first=False),
+                                       self._archived(Query(self).after(timestamp, field)),
+                                       operator.itemgetter(field))
+        return list(map(Entry.from_dict, entries))
+
+    def get_entries_lower_than_date(self, date: Union[datetime, int], field='date_created') -> List[Entry]:
+        timestamp = next(self._convert_date_to_timestamp(date))
+        entries = self.__with_archived(self._view().date_index(field).between(second=timestamp,
+                                                                               include_second=False),
+                                       self._archived(Query(self).before(timestamp, field)),
+                                       operator.itemgetter(field))
+        return list(map(Entry.from_dict, entries))
+
+    def get_most_recent_entries(self, n: int, name: Optional[str] = None, field='date_created') -> List[Entry]:
+        """
+        Returns the `n` most recent entries, the most recent first.
+
+        :param n: number of entries to return.
+        :type n: int
+        :param name: if given, only entries with exactly this name are considered. Defaults to None.
+        :type name: Optional[str], optional
+        :param field: the date to sort by, either "date_created" or "date_saved". Defaults to "date_created".
+        :type field: str, optional
+        """
+        view = self._view()
+        index = view.date_index(field)
+        if name is None:
+            entries = index.most_recent(n)
+        else:
+            # reversed, so that the last entry in the database wins ties
+            entries = [view.data[i] for i in reversed(view.by_name.get(name, []))]
+            entries = heapq.nlargest(n, (d for d in entries if d.get(field) is not None), key=lambda d: d[field])
+        # archived entries only matter if they are more recent than the ones found
+        query = Query(self).between(entries[-1][field] if len(entries) == n > 0 else None, field=field)
+        if name is not None:
+            query.name(name, exact=True)
+        archived = self._archived(query)
+        if archived:
+            ids = {d['id'] for d in entries}
+            entries = heapq.nlargest(n, entries + [d for d in archived if d['id'] not in ids], key=lambda d: d[field])
+        return list(map(Entry.from_dict, entries))
+
+    def get_entries_by_metric(self, name: str, min_value: Optional[float] = None,
+                              max_value: Optional[float] = None) -> List[Entry]:
+        """
+        Returns the entries with a metric called `name` whose value is in [`min_value`, `max_value`]. If one of
+        the two bounds is `None`, the interval is open on that side.
+        """
+        def matches(d: Dict[str, Any]) -> bool:
+            return any(m['name'] == name and (min_value is None or m['value'] >= min_value) and
+                       (max_value is None or m['value'] <= max_value) for m in d['metrics'])
+        entries = self.__with_archived(list(filter(matches, self._view().data)),
+                                       self._archived(Query(self), matches, [name]))
+        return list(map(Entry.from_dict, entries))
+
+    @staticmethod
+    def _convert_date_to_timestamp(*dates: Iterable[Union[datetime, int]]) -> Generator[int, None, None]:
+        for date in dates:
+            if isinstance(date, datetime):
+                date = date.timestamp()
+            yield date
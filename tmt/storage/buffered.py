@@ -0,0 +1,110 @@
+from tmt.storage.base import BaseDbManager
+from tmt.storage.schema import Entry
+from typing import List, Dict, Any, Hashable, Optional, Tuple
+import threading
+import time
+import warnings
+
+
+class BufferedDbManager(BaseDbManager):
+    """
+    Write-behind wrapper of another database manager: writes are queued in memory and written to `db` in a single
+    batch by :py:meth:`tmt.storage.buffered.BufferedDbManager.flush`, which is called automatically once
+    `max_pending` entries are queued or the oldest one has been queued for `max_delay` seconds (checked at every
+    write). Reads see the queued entries as if they were already written. Used by :py:func:`tmt.utils.session.session`.
+
+    Queued writes of the same entry are merged, i.e. an entry added and then updated is added once, with its last
+    content.
+
+    :param db: the database to write to.
+    :type db: BaseDbManager
+    :param max_pending: number of queued entries which triggers a flush, defaults to 100.
+    :type max_pending: int, optional
+    :param max_delay: age (in seconds) of the oldest queued entry which triggers a flush, defaults to 60. If `None`,
+        only `max_pending` is considered.
+    :type max_delay: Optional[float], optional
+    """
+
+    def __init__(self, db: BaseDbManager, max_pending=100, max_delay: Optional[float] = 60.):
+        super().__init__(db.db_path, db.read_only)
+        self.db = db
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        # entry id -> (True if the entry is new, raw entry), in write order
+        self.pending: Dict[str, Tuple[bool, Dict[str, Any]]] = {}
+        self.__oldest: Optional[float] = None
+        self.__generation = 0
+        self.__lock = threading.RLock()
+
+    check_can_write = BaseDbManager.check_can_write
+
+    @check_can_write
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        with self.__lock:
+            for d in updated:
+                is_new = self.pending.get(d['id'], (False, None))[0]
+                self.pending[d['id']] = (is_new, d)
+            for d in added:
+                if d['id'] in self.pending:
+                    warnings.warn(f'Entry with id {d["id"]} already exists. This will not be overwritten.')
+                    continue
+                self.pending[d['id']] = (True, d)
+            self.__generation += 1
+            if self.__oldest is None:
+                self.__oldest = time.monotonic()
+            if len(self.pending) >= self.max_pending or \
+                    (self.max_delay is not None and time.monotonic() - self.__oldest >= self.max_delay):
+                self.flush()
+
+    @check_can_write
+    def flush(self):
+        """
+        Writes the queued entries to the database, in a single write.
+        """
+        with self.__lock:
+            if not self.pending:
+                return
+            added = [d for is_new, d in self.pending.values() if is_new]
+            updated = [d for is_new, d in self.pending.values() if not is_new]
+            self.db._write_raw(added, updated)
+            self.pending.clear()
+            self.__oldest = None
+            self.__generation += 1
+
+    @check_can_write
+    def delete_entry(self, entry: Entry) -> bool:
+        with self.__lock:
+            self.flush()
+            return self.db.delete_entry(entry)
+
+    @check_can_write
+    def delete_entries(self, entries: List[Entry]) -> int:
+        with self.__lock:
+            self.flush()
+            return self.db.delete_entries(entries)
+
+    @check_can_write
+    def delete_all(self):
+        with self.__lock:
+            self.pending.clear()
+            self.__oldest = None
+            self.__generation += 1
+            self.db.delete_all()
+
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        with self.__lock:
+            data = self.db._view().data
+            if not self.pending:
+                return data
+            records = [r for d in data for r in self._split_records(d)]
+            with warnings.catch_warnings():
+                # reported by the flush
+                warnings.simplefilter('ignore')
+                self._apply_raw(records, [d for is_new, d in self.pending.values() if is_new],
+                                [d for is_new, d in self.pending.values() if not is_new])
+            return records
+
+    def _signature(self) -> Optional[Hashable]:
+        signature = self.db._signature()
+        # views are shared by the managers of the same database, but the queued entries are not
+        return None if signature is None else (signature, id(self), self.__generation)
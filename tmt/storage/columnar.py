@@ -0,0 +1,266 @@
+"""
+Columnar (NumPy) view of the metrics stored in a `tmt` database, used for vectorized queries across many experiments
+such as :py:meth:`tmt.utils.manager.TmtManager.top_k` and :py:meth:`tmt.utils.manager.TmtManager.leaderboard`.
+
+Instead of a list of :py:class:`tmt.storage.schema.Metric` per entry, every metric of every entry (and sub-entry) is a
+row of three parallel arrays: the entry it belongs to, the metric name (as an integer code) and its value. This module
+requires `numpy`, which is imported only when a :py:class:`tmt.storage.columnar.MetricColumns` is created.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STATISTICS = ('count', 'mean', 'std', 'min', 'max')
+
+
+@dataclass
+class MetricAggregates:
+    """
+    Statistics of metrics grouped by experiment, as returned by :py:meth:`tmt.storage.columnar.MetricColumns.aggregate`.
+    Every statistic is a matrix with a row for each entry in `entry_ids` and a column for each metric in
+    `metric_names`; where an experiment has no value for a metric the count is 0 and the other statistics are `nan`.
+    """
+    entry_ids: List[str]
+    metric_names: List[str]
+    count: 'np.ndarray'
+    mean: 'np.ndarray'
+    std: 'np.ndarray'
+    min: 'np.ndarray'
+    max: 'np.ndarray'
+
+    def get(self, entry_id: str) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the statistics of an experiment as ``{metric: {statistic: value}}``, skipping the metrics it lacks.
+        """
+        i = self.entry_ids.index(entry_id)
+        return {name: {stat: (int if stat == 'count' else float)(getattr(self, stat)[i, j]) for stat in STATISTICS}
+                for j, name in enumerate(self.metric_names) if self.count[i, j] > 0}
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        return {entry_id: self.get(entry_id) for entry_id in self.entry_ids}
+
+
+class MetricColumns:
+    """
+    Metrics of a database stored column-wise. Entries and sub-entries (i.e. `other_runs`) are numbered in database
+    order, each sub-entry right after its parent; metric rows are sorted by entry. Use
+    :py:meth:`tmt.storage.columnar.MetricColumns.update` to (re)build it from the raw entries of a database: entries
+    which did not change since the last update are not decoded again, so that keeping the columns up to date while
+    experiments are appended to the database is cheap.
+
+    :ivar entry_ids: id of each entry.
+    :ivar entry_names: name of each entry.
+    :ivar parents: for each entry, the index of its top-level entry (i.e. itself, unless it's a sub-entry).
+    :ivar entries: for each metric row, the index of its entry.
+    :ivar metrics: for each metric row, the index of its name in `metric_names`.
+    :ivar values: for each metric row, its value (`nan` if missing).
+    """
+
+    def __init__(self):
+        if np is None:
+            raise ImportError('numpy is required for columnar metric queries (e.g. top_k and leaderboard). '
+                              'Install it with `pip install numpy`.')
+        self.entry_ids: List[str] = []
+        self.entry_names: List[str] = []
+        self.parents = np.empty(0, dtype=np.int64)
+        self.entries = np.empty(0, dtype=np.int64)
+        self.metrics = np.empty(0, dtype=np.int32)
+        self.values = np.empty(0, dtype=np.float64)
+        self.metric_names: List[str] = []
+        self.metric_codes: Dict[str, int] = {}
+        # (fingerprint, first entry index, first metric row) of each top-level entry, see `update`
+        self.__built: List[Tuple[Tuple, int, int]] = []
+        self.__index: Optional[Dict[str, int]] = None
+
+    def update(self, data: Iterable[Dict[str, Any]]):
+        """
+        Updates the columns with the raw entries of a database (in database order). The columns of the longest
+        unchanged prefix of the database are kept, so appending entries only decodes the new ones.
+
+        An entry is considered unchanged if its id, `date_saved`, metrics (names and values) and sub-entries are the
+        same.
+        """
+        data = list(data)
+        keep = 0
+        for d, (fingerprint, _, _) in zip(data, self.__built):
+            if self.__fingerprint(d) != fingerprint:
+                break
+            keep += 1
+        if keep == len(data) == len(self.__built):
+            return
+        self.__index = None
+        n_entries, n_rows = (self.__built[keep][1], self.__built[keep][2]) if keep < len(self.__built) \
+            else (len(self.entry_ids), len(self.values))
+        del self.__built[keep:], self.entry_ids[n_entries:], self.entry_names[n_entries:]
+        parents, entries, metrics, values = [], [], [], []
+        for d in data[keep:]:
+            self.__built.append((self.__fingerprint(d), n_entries + len(parents), n_rows + len(values)))
+            parent = n_entries + len(parents)
+            for e in (d, *d['other_runs']):
+                index = n_entries + len(parents)
+                self.entry_ids.append(e['id'])
+                self.entry_names.append(e['name'])
+                parents.append(parent)
+                for m in e['metrics']:
+                    entries.append(index)
+                    metrics.append(self.__code(m['name']))
+                    values.append(math.nan if m['value'] is None else m['value'])
+        self.parents = np.concatenate((self.parents[:n_entries], np.array(parents, dtype=np.int64)))
+        self.entries = np.concatenate((self.entries[:n_rows], np.array(entries, dtype=np.int64)))
+        self.metrics = np.concatenate((self.metrics[:n_rows], np.array(metrics, dtype=np.int32)))
+        self.values = np.concatenate((self.values[:n_rows], np.array(values, dtype=np.float64)))
+
+    def find(self, entry_id: str) -> Optional[int]:
+        """
+        Returns the index of the top-level entry with id `entry_id`, or `None` if there is none.
+        """
+        if self.__index is None:
+            self.__index = {}
+            for i in np.flatnonzero(self.parents == np.arange(len(self.parents))).tolist():
+                self.__index.setdefault(self.entry_ids[i], i)
+        return self.__index.get(entry_id)
+
+    def column(self, name: str, include_sub_entries=False) -> Tuple['np.ndarray', 'np.ndarray']:
+        """
+        Returns the indexes of the entries having a metric called `name` and its values. If an entry has more than
+        one metric with the same name, the first one is used. Missing (`nan`) values are skipped.
+
+        :param include_sub_entries: if `True`, the metrics of sub-entries are returned as well. Defaults to False.
+        :type include_sub_entries: bool, optional
+        """
+        code = self.metric_codes.get(name)
+        if code is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        mask = (self.metrics == code) & ~np.isnan(self.values)
+        if not include_sub_entries:
+            mask &= self.parents[self.entries] == self.entries
+        rows = np.flatnonzero(mask)
+        # rows are sorted by entry, so this keeps the first metric of each entry
+        entries, first = np.unique(self.entries[rows], return_index=True)
+        return entries, self.values[rows[first]]
+
+    def top_k(self, name: str, k: int, largest=True, include_sub_entries=False) -> List[Tuple[int, float]]:
+        """
+        Returns the (entry index, value) of the `k` entries with the best value of metric `name`, best first. Ties
+        are kept in database order.
+
+        :param largest: if `True` (the default), higher values are better.
+        :type largest: bool, optional
+        """
+        entries, values = self.column(name, include_sub_entries)
+        keys = -values if largest else values
+        candidates = np.arange(len(keys))
+        if k < len(keys):
+            # every entry at least as good as the k-th one, including all the ties
+            candidates = np.flatnonzero(keys <= np.partition(keys, k - 1)[k - 1])
+        order = candidates[np.lexsort((entries[candidates], keys[candidates]))][:k]
+        return list(zip(entries[order].tolist(), values[order].tolist()))
+
+    def table(self, names: List[str], include_sub_entries=False) -> Tuple['np.ndarray', 'np.ndarray']:
+        """
+        Returns the indexes of the entries having at least one of the metrics in `names`, and a matrix with a row for
+        each of those entries and a column for each metric (`nan` where an entry lacks a metric).
+        """
+        columns = [self.column(name, include_sub_entries) for name in names]
+        entries = np.unique(np.concatenate([c[0] for c in columns])) if columns else np.empty(0, dtype=np.int64)
+        matrix = np.full((len(entries), len(names)), np.nan)
+        for j, (column_entries, values) in enumerate(columns):
+            matrix[np.searchsorted(entries, column_entries), j] = values
+        return entries, matrix
+
+    def leaderboard(self, names: List[str], sort_by: str, largest=True, k: Optional[int] = None,
+                    include_sub_entries=False) -> List[Tuple[int, List[Optional[float]]]]:
+        """
+        Returns the (entry index, values of the metrics in `names`) of the entries having at least one of them, sorted
+        by metric `sort_by`. Entries without it come last, ties are kept in database order. Missing values are `None`.
+
+        :param largest: if `True` (the default), higher values come first.
+        :type largest: bool, optional
+        :param k: maximum number of entries, defaults to None (i.e. all of them).
+        :type k: Optional[int], optional
+        """
+        columns = names if sort_by in names else [*names, sort_by]
+        entries, table = self.table(columns, include_sub_entries)
+        keys = table[:, columns.index(sort_by)]
+        order = np.lexsort((entries, -keys if largest else keys, np.isnan(keys)))[:k]
+        rows = table[order, :len(names)]
+        return [(index, [None if math.isnan(v) else v for v in row])
+                for index, row in zip(entries[order].tolist(), rows.tolist())]
+
+    def summary(self, names: Optional[List[str]] = None, include_sub_entries=False) -> Dict[str, Dict[str, float]]:
+        """
+        Returns count, mean, (population) standard deviation, min and max of each metric in `names` (by default,
+        every metric in the database).
+        """
+        stats = {}
+        for name in self.metric_names if names is None else names:
+            _, values = self.column(name, include_sub_entries)
+            if len(values) == 0:
+                stats[name] = {**dict.fromkeys(STATISTICS, math.nan), 'count': 0}
+                continue
+            stats[name] = {'count': len(values), 'mean': float(values.mean()), 'std': float(values.std()),
+                           'min': float(values.min()), 'max': float(values.max())}
+        return stats
+
+    def aggregate(self, entries: Optional[List[int]] = None,
+                  names: Optional[List[str]] = None) -> MetricAggregates:
+        """
+        Computes count, mean, (population) standard deviation, min and max of each metric over every experiment and
+        its sub-entries (e.g. all the seeds of a run saved with
+        :py:attr:`tmt.utils.duplicates.DuplicatePolicy.AS_SUB_ENTRY`). All the groups are computed at once, with
+        vectorized operations over the metric rows.
+
+        :param entries: indexes of the top-level entries to aggregate, defaults to None (i.e. all of them).
+        :type entries: Optional[List[int]], optional
+        :param names: metrics to aggregate, defaults to None (i.e. all of them).
+        :type names: Optional[List[str]], optional
+        """
+        groups = np.flatnonzero(self.parents == np.arange(len(self.parents))) if entries is None \
+            else np.asarray(entries, dtype=np.int64)
+        names = self.metric_names if names is None else list(names)
+        shape = (len(groups), len(names))
+        # metric code -> column, entry index -> row (-1 if not requested)
+        columns = np.full(len(self.metric_names), -1)
+        known = [j for j, name in enumerate(names) if name in self.metric_codes]
+        columns[[self.metric_codes[names[j]] for j in known]] = known
+        rows = np.full(len(self.parents), -1)
+        rows[groups] = np.arange(len(groups))
+        row, column = rows[self.parents[self.entries]], columns[self.metrics]
+        mask = (row >= 0) & (column >= 0) & ~np.isnan(self.values)
+        # if an entry has more than one metric with the same name, keep the first one (as `column` does)
+        _, first = np.unique(self.entries[mask] * len(self.metric_names) + self.metrics[mask], return_index=True)
+        cells = row[mask][first] * len(names) + column[mask][first]
+        values = self.values[mask][first]
+
+        size = shape[0] * shape[1]
+        count = np.bincount(cells, minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(cells, values, minlength=size) / count
+            std = np.sqrt(np.bincount(cells, (values - mean[cells]) ** 2, minlength=size) / count)
+        minimum, maximum = np.full(size, np.nan), np.full(size, np.nan)
+        if len(cells):
+            order = np.argsort(cells, kind='stable')
+            sorted_cells = cells[order]
+            starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+            minimum[sorted_cells[starts]] = np.minimum.reduceat(values[order], starts)
+            maximum[sorted_cells[starts]] = np.maximum.reduceat(values[order], starts)
+        return MetricAggregates([self.entry_ids[i] for i in groups], names, count.reshape(shape),
+                                mean.reshape(shape), std.reshape(shape), minimum.reshape(shape),
+                                maximum.reshape(shape))
+
+    def __code(self, name: str) -> int:
+        code = self.metric_codes.get(name)
+        if code is None:
+            code = self.metric_codes[name] = len(self.metric_names)
+            self.metric_names.append(name)
+        return code
+
+    @staticmethod
+    def __fingerprint(d: Dict[str, Any]) -> Tuple:
+        return tuple((e['id'], e.get('date_saved'), hash(tuple((m['name'], m['value']) for m in e['metrics'])))
+                     for e in (d, *d['other_runs']))
@@ -0,0 +1,137 @@
+"""
+Memory efficient, read-only representations of :py:class:`tmt.storage.schema.Entry`,
+:py:class:`tmt.storage.schema.Metric` and :py:class:`tmt.storage.schema.Result`, meant for loading a whole database
+in memory for analysis (see :py:meth:`tmt.storage.base.BaseDbManager.get_all_entries`).
+
+Compared to the dataclasses in :py:mod:`tmt.storage.schema`:
+
+ - objects use ``__slots__``, i.e. they have no per-object ``__dict__``;
+ - repeated strings (entry ids, names, metric and result names, args...) are interned, so that e.g. the
+   ``entry_id`` of every metric points to the very same string object of its entry id;
+ - lists (metrics, results and sub-entries) are stored as tuples.
+
+The json representation is the same of :py:mod:`tmt.storage.schema`, so these objects can be converted back and
+forth with ``from_dict``/``to_dict`` or ``from_*``/``to_*``.
+
+With 20 metrics and 5 results per entry, an entry loaded from the database takes about 7KB as
+:py:class:`tmt.storage.schema.Entry` and less than 3KB as :py:class:`tmt.storage.compact.CompactEntry`
+(see ``benchmarks/bench_memory.py``).
+"""
+from __future__ import annotations
+from tmt.storage.schema import Entry, Metric, Result
+from typing import Any, Dict, Optional, Tuple
+import sys
+
+
+def _intern(s: Optional[str]) -> Optional[str]:
+    return sys.intern(s) if type(s) is str else s
+
+
+class _CompactBase:
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, s) == getattr(other, s) for s in self.__slots__)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({", ".join(f"{s}={getattr(self, s)!r}" for s in self.__slots__)})'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {s: getattr(self, s) for s in self.__slots__}
+
+
+class CompactResult(_CompactBase):
+    __slots__ = ('entry_id', 'name', 'path')
+
+    def __init__(self, entry_id: str, name: str, path: str):
+        self.entry_id = _intern(entry_id)
+        self.name = _intern(name)
+        self.path = path
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> CompactResult:
+        return cls(d.get('entry_id'), d.get('name'), d.get('path'))
+
+    @classmethod
+    def from_result(cls, result: Result) -> CompactResult:
+        return cls(result.entry_id, result.name, result.path)
+
+    def to_result(self) -> Result:
+        return Result(self.entry_id, self.name, self.path)
+
+
+class CompactMetric(_CompactBase):
+    __slots__ = ('entry_id', 'name', 'value')
+
+    def __init__(self, entry_id: str, name: str, value: float):
+        self.entry_id = _intern(entry_id)
+        self.name = _intern(name)
+        self.value = value
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> CompactMetric:
+        return cls(d.get('entry_id'), d.get('name'), d.get('value'))
+
+    @classmethod
+    def from_metric(cls, metric: Metric) -> CompactMetric:
+        return cls(metric.entry_id, metric.name, metric.value)
+
+    def to_metric(self) -> Metric:
+        return Metric(self.entry_id, self.name, self.value)
+
+
+class CompactEntry(_CompactBase):
+    __slots__ = ('id', 'name', 'args', 'date_created', 'local_results_path', 'local_snapshot_path', 'description',
+                 'date_saved', 'metrics', 'other_runs', 'results', 'version', 'parent_id')
+
+    def __init__(self, id: str, name: str, args: str, date_created: int, local_results_path: str,
+                 local_snapshot_path: str, description: str, date_saved: Optional[int],
+                 metrics: Tuple[CompactMetric, ...], other_runs: Tuple[CompactEntry, ...],
+                 results: Tuple[CompactResult, ...], version: str, parent_id: Optional[str] = None):
+        self.id = _intern(id)
+        self.name = _intern(name)
+        self.args = _intern(args)
+        self.date_created = date_created
+        self.local_results_path = _intern(local_results_path)
+        self.local_snapshot_path = local_snapshot_path
+        self.description = _intern(description)
+        self.date_saved = date_saved
+        self.metrics = metrics
+        self.other_runs = other_runs
+        self.results = results
+        self.version = _intern(version)
+        self.parent_id = _intern(parent_id)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> CompactEntry:
+        return cls(d.get('id'), d.get('name'), d.get('args'), d.get('date_created'), d.get('local_results_path'),
+                   d.get('local_snapshot_path'), d.get('description'), d.get('date_saved') or None,
+                   tuple(map(CompactMetric.from_dict, d.get('metrics'))),
+                   tuple(map(CompactEntry.from_dict, d.get('other_runs'))),
+                   tuple(map(CompactResult.from_dict, d.get('results'))),
+                   d.get('version'), d.get('parent_id') or None)
+
+    @classmethod
+    def from_entry(cls, entry: Entry) -> CompactEntry:
+        return cls(entry.id, entry.name, entry.args, entry.date_created, entry.local_results_path,
+                   entry.local_snapshot_path, entry.description, entry.date_saved,
+                   tuple(map(CompactMetric.from_metric, entry.metrics)),
+                   tuple(map(CompactEntry.from_entry, entry.other_runs)),
+                   tuple(map(CompactResult.from_result, entry.results)),
+                   entry.version, entry.parent_id)
+
+    def to_entry(self) -> Entry:
+        return Entry(self.id, self.name, self.args, self.date_created, self.local_results_path,
+                     self.local_snapshot_path, self.description, self.date_saved,
+                     [m.to_metric() for m in self.metrics], [e.to_entry() for e in self.other_runs],
+                     [r.to_result() for r in self.results], self.version, self.parent_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = super().to_dict()
+        d['metrics'] = [m.to_dict() for m in self.metrics]
+        d['other_runs'] = [e.to_dict() for e in self.other_runs]
+        d['results'] = [r.to_dict() for r in self.results]
+        return d
+
+    def short_str(self) -> str:
+        return f"Entry with id {self.id}, name {self.name}, timestamp {self.date_created}"
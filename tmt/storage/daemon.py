@@ -0,0 +1,425 @@
+"""
+Local daemon owning a `tmt` database, so that many short-lived processes (recorders, scripts using
+:py:class:`tmt.utils.manager.TmtManager`, the TUI) don't each have to parse it from scratch and take its lock.
+
+:py:class:`tmt.storage.daemon.DbServer` keeps the database (and its indexes) in memory and serves it over a Unix
+domain socket, with one json request per line. :py:class:`tmt.storage.daemon.DaemonDbManager` is the client: it
+exposes the usual database API and, when no daemon is running, falls back to reading and writing the database
+directly. Start a daemon with ``python -m tmt.tmt_cli serve``; :py:meth:`tmt.configs.parser.Configs.init_db_manager`
+connects to it when the ``use_daemon`` configuration option is set.
+
+Sockets live in a directory only the current user can access (see :py:func:`tmt.storage.daemon.runtime_dir`), and
+clients only connect to daemons run by the current user.
+"""
+from tmt.storage.base import BaseDbManager
+from tmt.storage.json_db import DbManager
+from tmt.storage.schema import Entry
+from typing import Any, Dict, Hashable, List, Optional, Type, Union
+from datetime import datetime
+import hashlib
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+import uuid
+import warnings
+
+# methods a client can call, besides "signature" and "data" (see `DbServer`)
+READ_METHODS = ('get_entry_by_id', 'get_entry_by_exact_name', 'get_entries_by_name', 'get_entries_by_name_regex',
+                'get_entries_between_dates', 'get_entries_greater_than_date', 'get_entries_lower_than_date',
+                'get_most_recent_entries', 'get_entries_by_metric', '_exists')
+WRITE_METHODS = ('_write_raw', 'delete_entry', 'delete_all')
+# methods whose first argument is an entry
+ENTRY_METHODS = ('_exists', 'delete_entry')
+
+
+def runtime_dir() -> str:
+    """
+    Returns the directory of the sockets of the daemons of the current user: ``$XDG_RUNTIME_DIR`` or, if it is not
+    set, ``tmt-<uid>`` in the temporary directory, created if needed. Sockets don't live in the tmt directory since
+    their paths can't be longer than about 100 characters.
+
+    :raises PermissionError: if the directory is not owned by the current user, or other users can access it (e.g.
+        because another user created it first in the shared temporary directory).
+    """
+    path = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(tempfile.gettempdir(), f'tmt-{os.getuid()}')
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f'{path} must be a directory owned by the current user, and only accessible by them')
+    return path
+
+
+def socket_path(db_path: str) -> str:
+    """
+    Returns the path of the socket of the daemon serving the database in `db_path`, in
+    :py:func:`tmt.storage.daemon.runtime_dir`.
+    """
+    digest = hashlib.sha1(os.path.abspath(db_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(runtime_dir(), f'tmt-{digest}.sock')
+
+
+def _is_own_socket(path: str) -> bool:
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+
+class DbServer:
+    """
+    Serves the database `db` on a Unix domain socket. Requests are executed one at a time by the thread calling
+    :py:meth:`tmt.storage.daemon.DbServer.serve_forever` (so that backends don't need to be thread-safe), and writes
+    received while another request was running are applied together, in a single write of the database.
+
+    Every request is a json line like ``{"method": "get_entry_by_id", "args": ["..."], "kwargs": {}}``, answered with
+    ``{"result": ..., "warnings": [...]}`` or ``{"error": "..."}``; entries are sent as dictionaries.
+
+    :param db: the database to serve.
+    :type db: BaseDbManager
+    :param path: path of the socket, defaults to None (i.e. :py:func:`tmt.storage.daemon.socket_path`).
+    :type path: Optional[str], optional
+    """
+
+    def __init__(self, db: BaseDbManager, path: Optional[str] = None):
+        self.db = db
+        self.path = path or socket_path(db.db_path)
+        self.requests: 'queue.Queue[Optional[_Request]]' = queue.Queue()
+        # identifies this daemon in the signatures, so that clients don't mix up the views of two daemons
+        self.id = uuid.uuid4().hex
+        self.generation = 0
+        self.__view = None
+        self.__connections = set()
+        self.__connections_lock = threading.Lock()
+        if os.path.exists(self.path):
+            connection = _connect(self.path)
+            if connection is not None:
+                connection.close()
+                raise RuntimeError(f'A daemon is already serving {db.db_path} on {self.path}')
+            # left by a daemon which was killed
+            os.remove(self.path)
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                server._track(self.connection, True)
+
+            def finish(self):
+                server._track(self.connection, False)
+                super().finish()
+
+            def handle(self):
+                for line in self.rfile:
+                    request = _Request(json.loads(line))
+                    server.requests.put(request)
+                    request.done.wait()
+                    self.wfile.write(json.dumps(request.response).encode('utf-8') + b'\n')
+
+        # only the current user can connect, from the moment the socket exists
+        umask = os.umask(0o077)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        finally:
+            os.umask(umask)
+        self.server.daemon_threads = True
+
+    def serve_forever(self):
+        """
+        Serves requests until :py:meth:`tmt.storage.daemon.DbServer.shutdown` is called (e.g. by another thread).
+        """
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = [self.requests.get()]
+                while True:
+                    try:
+                        batch.append(self.requests.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    batch.remove(None)
+                    self.__execute(batch)
+                    break
+                self.__execute(batch)
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            thread.join()
+            # clients notice the daemon is gone (and fall back to the database) when their connection is closed
+            with self.__connections_lock:
+                for connection in self.__connections:
+                    connection.shutdown(socket.SHUT_RDWR)
+            while not self.requests.empty():
+                request = self.requests.get_nowait()
+                if request is not None:
+                    request.response = {'error': 'The daemon stopped', 'warnings': []}
+                    request.done.set()
+
+    def shutdown(self):
+        self.requests.put(None)
+
+    def _track(self, connection: socket.socket, active: bool):
+        with self.__connections_lock:
+            (self.__connections.add if active else self.__connections.discard)(connection)
+
+    def __execute(self, batch: List['_Request']):
+        i = 0
+        while i < len(batch):
+            if batch[i].method != '_write_raw':
+                self.__run([batch[i]], lambda: self.__call(batch[i]))
+                i += 1
+                continue
+            # consecutive writes are applied at once
+            writes = [batch[i]]
+            while i + len(writes) < len(batch) and batch[i + len(writes)].method == '_write_raw':
+                writes.append(batch[i + len(writes)])
+            self.__run(writes, lambda: self.db._write_raw([d for w in writes for d in w.args[0]],
+                                                          [d for w in writes for d in w.args[1]]))
+            i += len(writes)
+
+    @staticmethod
+    def __run(requests: List['_Request'], call):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            try:
+                response = {'result': call()}
+            except Exception as e:
+                response = {'error': f'{type(e).__name__}: {e}'}
+        response['warnings'] = [str(w.message) for w in caught]
+        for request in requests:
+            request.response = response
+            request.done.set()
+
+    def __call(self, request: '_Request') -> Any:
+        if request.method == 'signature':
+            return self.__signature()
+        if request.method == 'data':
+            return self.db._view().data
+        if request.method not in READ_METHODS + WRITE_METHODS:
+            raise ValueError(f'Unknown method {request.method}')
+        args = list(request.args)
+        if request.method in ENTRY_METHODS:
+            args[0] = Entry.from_dict(args[0])
+        result = getattr(self.db, request.method)(*args, **request.kwargs)
+        if isinstance(result, Entry):
+            return result.to_dict()
+        if isinstance(result, list):
+            return [e.to_dict() for e in result]
+        return result
+
+    def __signature(self) -> List[Union[str, int]]:
+        view = self.db._view()
+        if view is not self.__view:
+            self.__view = view
+            self.generation += 1
+        return [self.id, self.generation]
+
+
+class _Request:
+
+    def __init__(self, request: Dict[str, Any]):
+        self.method: str = request['method']
+        self.args: List[Any] = request.get('args', [])
+        self.kwargs: Dict[str, Any] = request.get('kwargs', {})
+        self.response: Optional[Dict[str, Any]] = None
+        self.done = threading.Event()
+
+
+class _Connection:
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+
+    def request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError('The daemon closed the connection')
+        return json.loads(line)
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+# idle connections by socket path, reused by all the clients of this process
+_pool: Dict[str, List[_Connection]] = {}
+_pool_lock = threading.Lock()
+
+
+def _connect(path: str) -> Optional[_Connection]:
+    """
+    Connects to the daemon listening on `path`, provided that it is run by the current user.
+    """
+    if not _is_own_socket(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        if hasattr(socket, 'SO_PEERCRED'):
+            _, uid, _ = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                            struct.calcsize('3i')))
+            if uid != os.getuid():
+                raise PermissionError(f'The tmt daemon on {path} is run by another user')
+    except OSError:
+        sock.close()
+        return None
+    return _Connection(sock)
+
+
+class DaemonDbManager(BaseDbManager):
+    """
+    Client of a :py:class:`tmt.storage.daemon.DbServer`. Lookups (e.g.
+    :py:meth:`tmt.storage.base.BaseDbManager.get_entry_by_id`) are answered by the daemon from its in-memory
+    indexes, so only the matching entries are sent; the other queries work on a copy of the database which is only
+    fetched again when the daemon reports a change. Writes are sent to the daemon, which batches them.
+
+    Connections are pooled and reused by all the clients in the process. If no daemon is running (or it stops), the
+    client falls back to accessing the database directly with `backend`.
+
+    :param db_path: path to the database file.
+    :type db_path: str
+    :param read_only: if `True` all writing access is denied, defaults to False.
+    :type read_only: bool, optional
+    :param backend: backend used when no daemon is running, defaults to :py:class:`tmt.storage.json_db.DbManager`.
+    :type backend: Type[BaseDbManager], optional
+    """
+
+    def __init__(self, db_path: str, read_only=False, backend: Type[BaseDbManager] = DbManager):
+        super().__init__(db_path, read_only)
+        self.socket_path = socket_path(db_path)
+        self.backend = backend
+        self.__direct: Optional[BaseDbManager] = None
+
+    check_can_write = BaseDbManager.check_can_write
+
+    @property
+    def connected(self) -> bool:
+        """
+        `False` if the daemon could not be reached and the database is accessed directly.
+        """
+        return self.__direct is None
+
+    @check_can_write
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        self.__call('_write_raw', added, updated)
+
+    @check_can_write
+    def delete_entry(self, entry: Entry) -> bool:
+        return self.__call('delete_entry', entry)
+
+    @check_can_write
+    def delete_all(self):
+        self.__call('delete_all')
+
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        return self.__call('data')
+
+    def _signature(self) -> Optional[Hashable]:
+        signature = self.__call('signature')
+        return tuple(signature) if isinstance(signature, list) else signature
+
+    def _exists(self, entry: Entry) -> bool:
+        return self.__call('_exists', entry)
+
+    def get_entry_by_id(self, id: str) -> Optional[Entry]:
+        return self.__call('get_entry_by_id', id)
+
+    def get_entry_by_exact_name(self, name: str) -> Optional[Entry]:
+        return self.__call('get_entry_by_exact_name', name)
+
+    def get_entries_by_name(self, name: str) -> List[Entry]:
+        return self.__call('get_entries_by_name', name)
+
+    def get_entries_by_name_regex(self, regex: str) -> List[Entry]:
+        return self.__call('get_entries_by_name_regex', regex)
+
+    def get_entries_between_dates(self, first: Union[datetime, int], second: Union[datetime, int],
+                                  field='date_created') -> List[Entry]:
+        return self.__call('get_entries_between_dates', *self._convert_date_to_timestamp(first, second), field=field)
+
+    def get_entries_greater_than_date(self, date: Union[datetime, int], field='date_created') -> List[Entry]:
+        return self.__call('get_entries_greater_than_date', *self._convert_date_to_timestamp(date), field=field)
+
+    def get_entries_lower_than_date(self, date: Union[datetime, int], field='date_created') -> List[Entry]:
+        return self.__call('get_entries_lower_than_date', *self._convert_date_to_timestamp(date), field=field)
+
+    def get_most_recent_entries(self, n: int, name: Optional[str] = None, field='date_created') -> List[Entry]:
+        return self.__call('get_most_recent_entries', n, name=name, field=field)
+
+    def get_entries_by_metric(self, name: str, min_value: Optional[float] = None,
+                              max_value: Optional[float] = None) -> List[Entry]:
+        return self.__call('get_entries_by_metric', name, min_value=min_value, max_value=max_value)
+
+    def __call(self, method: str, *args, **kwargs) -> Any:
+        if self.__direct is None:
+            try:
+                response = self.__request({'method': method, 'kwargs': kwargs,
+                                           'args': [a.to_dict() if isinstance(a, Entry) else a for a in args]})
+            except OSError:
+                self.__direct = self.backend(self.db_path, read_only=self.read_only)
+            else:
+                for message in response['warnings']:
+                    warnings.warn(message)
+                if 'error' in response:
+                    raise RuntimeError(f'The tmt daemon failed to run {method}: {response["error"]}')
+                return self.__decode(method, response['result'])
+        if method == 'signature':
+            return self.__direct._signature()
+        if method == 'data':
+            return self.__direct._view().data
+        return getattr(self.__direct, method)(*args, **kwargs)
+
+    def __request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        with _pool_lock:
+            idle = _pool.setdefault(self.socket_path, [])
+            connection = idle.pop() if idle else None
+        if connection is None:
+            connection = _connect(self.socket_path)
+            if connection is None:
+                raise ConnectionRefusedError(f'No tmt daemon is listening on {self.socket_path}')
+        try:
+            response = connection.request(request)
+        except (OSError, ValueError):
+            connection.close()
+            raise ConnectionError('Lost the connection to the tmt daemon')
+        with _pool_lock:
+            _pool[self.socket_path].append(connection)
+        return response
+
+    @staticmethod
+    def __decode(method: str, result: Any) -> Any:
+        if method in ('get_entry_by_id', 'get_entry_by_exact_name'):
+            return None if result is None else Entry.from_dict(result)
+        if method.startswith('get_'):
+            return list(map(Entry.from_dict, result))
+        return result
+
+
+def connect(db_path: str, read_only=False, backend: Type[BaseDbManager] = DbManager) -> BaseDbManager:
+    """
+    Returns a :py:class:`tmt.storage.daemon.DaemonDbManager` if a daemon of the current user is serving the
+    database in `db_path`, otherwise a `backend` accessing it directly.
+    """
+    try:
+        own = _is_own_socket(socket_path(db_path))
+    except PermissionError as e:
+        warnings.warn(f'Not connecting to the tmt daemon: {e}')
+        own = False
+    if own:
+        return DaemonDbManager(db_path, read_only, backend)
+    return backend(db_path, read_only=read_only)
@@ -1,14 +1,22 @@
-from filelock import FileLock
+from tmt.storage.locks import ProcessFileLock
+from tmt.storage.base import BaseDbManager, Cursor, DbView
 from tmt.storage.schema import Entry
-from typing import List, Optional, Union, Iterable, Generator
-from datetime import datetime
+from tmt.storage.stream import JsonArrayStream
+from typing import BinaryIO, Callable, List, Dict, Any, Hashable, Iterator, Optional, Tuple
+import contextlib
+import itertools
+import mmap
 import os
 import json
-import warnings
 import re
+import tempfile
 
+# every write puts the version counter of the database first, see `DbManager._transaction`
+VERSION_HEADER = re.compile(rb'\{"version": (\d+),')
+VERSION_HEADER_SIZE = 32
 
-class DbManager:
+
+class DbManager(BaseDbManager):
     """
     Class to interact with the underlying json database. If `read_only` is `True`, all operations
     which add and/or modify the database won't be allowed.
@@ -20,129 +28,217 @@ class DbManager:
     """
 
     def __init__(self, db_path: str, read_only=False):
-        self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        super().__init__(db_path, read_only)
+        self.lock = ProcessFileLock(f"{db_path}.lock")
+        # (signature, offsets) of the sub-entry records of the last database streamed, see `__sub_entry_offsets`
+        self.__sub_entries: Tuple[Optional[Hashable], Dict[str, List[int]]] = (None, {})
         if not os.path.exists(db_path):
-            self.__init_db()
-        self.lock = FileLock(f"{db_path}.lock")
-        self.read_only = read_only
+            with self.lock:
+                if not os.path.exists(db_path):
+                    self.__replace(self.__dump({'version': 0, 'data': []}))
+            self._invalidate_view()
 
-    def check_can_write(func):
-        def inner(*args, **kwargs):
-            if not args[0].read_only:
-                return func(*args, **kwargs)
-        return inner
+    check_can_write = BaseDbManager.check_can_write
 
     @check_can_write
-    def add_new_entries(self, entries: List[Entry]):
-        with self.lock:
-            with open(self.db_path, 'r+') as f:
-                db_data = json.load(f)
-                for entry in entries:
-                    if entry.id in {d['id'] for d in db_data['data']}:
-                        warnings.warn(f'Entry with id {entry.id} already exists. This will not be overwritten.')
-                        continue
-                    db_data['data'].append(entry.to_dict())
-                self.__write(db_data, f)
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        self._transaction(lambda db_data: self._apply_raw(db_data['data'], added, updated))
 
     @check_can_write
-    def add_or_update_entry(self, entry: Entry):
-        if self.get_entry_by_id(entry.id):
-            self.update_entries([entry])
-        else:
-            self.add_new_entries([entry])
+    def delete_entry(self, entry: Entry) -> bool:
+        def apply(db_data: Dict[str, Any]) -> bool:
+            if not any(d['id'] == entry.id for d in db_data['data']):
+                return False
+            # sub-entries stored as separate records are deleted with their parent
+            db_data['data'] = [d for d in db_data['data'] if d['id'] != entry.id and d.get('parent_id') != entry.id]
+            return True
 
-    @check_can_write
-    def update_entries(self, entries: List[Entry]):
-        with self.lock:
-            with open(self.db_path, 'r+') as f:
-                db_data = json.load(f)
-                e_ids = {e.id: e for e in entries}
-                for i, d in enumerate(db_data['data'].copy()):
-                    if d['id'] in e_ids:
-                        db_data['data'][i] = e_ids[d['id']].to_dict()
-                self.__write(db_data, f)
+        return self._transaction(apply)
 
     @check_can_write
-    def delete_entry(self, entry: Entry) -> bool:
-        with self.lock:
-            with open(self.db_path, 'r+', encoding='utf-8') as f:
-                db_data = json.load(f)
-                for i, d in enumerate(db_data['data']):
-                    if d['id'] == entry.id:
-                        del db_data['data'][i]
-                        self.__write(db_data, f)
-                        return True
-        return False
+    def delete_entries(self, entries: List[Entry]) -> int:
+        ids = {e.id for e in entries}
+        deleted = 0
+
+        def apply(db_data: Dict[str, Any]) -> bool:
+            nonlocal deleted
+            deleted = sum(d['id'] in ids for d in db_data['data'])
+            db_data['data'] = [d for d in db_data['data'] if d['id'] not in ids and d.get('parent_id') not in ids]
+            return deleted > 0
+
+        self._transaction(apply)
+        return deleted
 
     @check_can_write
     def delete_all(self):
-        self.__init_db()
-
-    def get_entry_by_id(self, id: str) -> Optional[Entry]:
-        with self.lock:
-            with open(self.db_path, 'r') as f:
-                db_data = json.load(f)['data']
+        def apply(db_data: Dict[str, Any]) -> bool:
+            db_data['data'] = []
+            return True
+
+        self._transaction(apply)
+
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        # writers replace the whole file at once (see `_transaction`), so readers don't need the lock
+        with open(self.db_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['data']
+
+    def _signature(self) -> Hashable:
+        return self._stat_signature(self.db_path)
+
+    def _iter_raw(self, cursor: Optional[Cursor] = None) -> Iterator[Tuple[Dict[str, Any], Cursor]]:
+        if self._cached_view(self._signature()) is not None:
+            yield from super()._iter_raw(cursor)
+            return
+        f, sub_entries_file = self.__open_twice()
+        with f, sub_entries_file:
+            # the file may have been replaced since the check above: the cursors must refer to the one being read
+            signature = self._stat_signature(f.fileno())
+            sub_entries = self.__sub_entry_offsets(f, signature)
+            f.seek(0)
+            stream = JsonArrayStream(f)
+
+            def top_level(stream: JsonArrayStream) -> Iterator[Tuple[Dict[str, Any], int]]:
+                for d, offset in stream:
+                    if d.get('parent_id') is None:
+                        yield DbView.link_sub_entries(d, [self.__read_at(sub_entries_file, o)
+                                                          for o in sub_entries.get(d['id'], [])]), offset
+
+            if cursor is None:
+                yield from self.__stream(top_level(stream), signature, 0)
+            elif cursor.token is not None and cursor.token[0] == signature:
+                # the db didn't change since the cursor was created, we can jump straight to it
+                stream.resume(cursor.token[1])
+                yield from self.__stream(top_level(stream), signature, cursor.position)
+            else:
+                # look for the last entry returned; if it was deleted, fall back to the cursor position
+                found = False
+                for position, (d, offset) in enumerate(top_level(stream), start=1):
+                    if found:
+                        yield d, Cursor(position, d['id'], (signature, offset))
+                    found = found or d['id'] == cursor.last_id
+                if not found:
+                    f.seek(0)
+                    yield from itertools.islice(self.__stream(top_level(JsonArrayStream(f)), signature, 0),
+                                                cursor.position, None)
+
+    @staticmethod
+    def __stream(entries: Iterator[Tuple[Dict[str, Any], int]], signature: Hashable,
+                 position: int) -> Iterator[Tuple[Dict[str, Any], Cursor]]:
+        for position, (d, offset) in enumerate(entries, start=position + 1):
+            yield d, Cursor(position, d['id'], (signature, offset))
+
+    def __sub_entry_offsets(self, f: BinaryIO, signature: Hashable) -> Dict[str, List[int]]:
+        """
+        Returns the offsets in `f` of the sub-entries stored as separate records, by parent id. Only the offsets are
+        kept, so that streaming the database still holds a single entry (with its sub-entries) at a time. They are
+        found with a first pass over the file, so sub-entries may be anywhere in it, and kept until the database
+        changes, so that the following streams (e.g. the next pages of
+        :py:meth:`tmt.storage.base.BaseDbManager.get_page`) don't parse it twice.
+        """
+        cached_signature, offsets = self.__sub_entries
+        if cached_signature == signature:
+            return offsets
+        offsets = {}
+        if os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                # quick check, to avoid parsing the file twice when there are no sub-entry records
+                has_sub_entries = m.find(b'"parent_id": "') != -1
+            stream = JsonArrayStream(f)
+            start = stream.start() if has_sub_entries else None
+            if start is not None:
+                # every record starts where the previous one ends
+                for d, end in stream:
+                    if d.get('parent_id') is not None:
+                        offsets.setdefault(d['parent_id'], []).append(start)
+                    start = end
+        self.__sub_entries = signature, offsets
+        return offsets
+
+    @staticmethod
+    def __read_at(f: BinaryIO, offset: int) -> Dict[str, Any]:
+        stream = JsonArrayStream(f)
+        stream.resume(offset)
+        return next(iter(stream))[0]
+
+    def _transaction(self, apply: Callable[[Dict[str, Any]], bool]) -> bool:
+        """
+        Applies `apply` to the content of the database (i.e. ``{"data": [...]}``) and, if it returns `True`, writes it
+        back. The new content is written to a temporary file and then renamed over the database, so that readers
+        (which don't take the lock) and crashes only ever see a complete database.
+
+        The lock is only held to check that no other writer replaced the database since it was read (every write
+        increments the `version` counter at the beginning of the file) and to rename the temporary file. Otherwise,
+        the write is done again on the new content, so that no update is lost. The second attempt holds the lock
+        throughout, so that busy databases are serialized at most twice per write.
+        """
+        for locked in (False, True):
+            with self.lock if locked else contextlib.nullcontext():
+                with open(self.db_path, 'r', encoding='utf-8') as f:
+                    db_data = json.load(f)
+                version = db_data.get('version', 0)
+                if not apply(db_data):
+                    return False
+                # version first, so that `__version` only needs to read the beginning of the file
+                tmp_path = self.__dump({'version': version + 1,
+                                        **{k: v for k, v in db_data.items() if k != 'version'}})
+                replaced = False
                 try:
-                    return Entry.from_dict(next(filter(lambda e: e['id'] == id, db_data)))
-                except StopIteration:
-                    return None
-
-    def get_entry_by_exact_name(self, name: str) -> Optional[Entry]:
-        with self.lock:
-            with open(self.db_path, 'r') as f:
-                db_data = json.load(f)['data']
-                entries = [e for e in db_data if e['name'] == name]
-                if len(entries) > 1:
-                    warnings.warn(f'Found {len(entries)} entries for name {name}. Returning the first one.')
-                return Entry.from_dict(entries[0])
-
-    def get_entries_by_name(self, name: str) -> List[Entry]:
-        with self.lock:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                db_data = json.load(f)
-            return list(map(Entry.from_dict, filter(lambda d: name in d['name'], db_data['data'])))
-
-    def get_entries_by_name_regex(self, regex: str) -> List[Entry]:
-        with self.lock:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                db_data = json.load(f)
-            pattern = re.compile(regex)
-            return list(map(Entry.from_dict, filter(lambda d: pattern.match(d['name']), db_data['data'])))
-
-    def get_entries_between_dates(self, first: Union[datetime, int], second: Union[datetime, int]) -> List[Entry]:
-        with self.lock:
-            first, second = list(self.__convert_date_to_timestamp(first, second))
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                db_data = json.load(f)
-            return list(map(Entry.from_dict, filter(lambda d: first <= d['timestamp'] <= second, db_data['data'])))
-
-    def get_entries_greater_than_date(self, date: Union[datetime, int]) -> List[Entry]:
-        with self.lock:
-            timestamp = next(self.__convert_date_to_timestamp(date))
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                db_data = json.load(f)
-            return list(map(Entry.from_dict, filter(lambda d: d['timestamp'] > timestamp, db_data['data'])))
-
-    def get_entries_lower_than_date(self, date: Union[datetime, int]) -> List[Entry]:
-        with self.lock:
-            timestamp = next(self.__convert_date_to_timestamp(date))
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                db_data = json.load(f)
-            return list(map(Entry.from_dict, filter(lambda d: d['timestamp'] < timestamp, db_data['data'])))
-
-    def __convert_date_to_timestamp(*dates: Iterable[Union[datetime, int]]) -> Generator[int, None, None]:
-        for date in dates:
-            if type(date) is not int:
-                date = date.timestamp()
-            yield date
-
-    def __init_db(self):
-        with open(self.db_path, 'w') as f:
-            # I don't like this "data" thing, but we used to use PysonDB...
-            json.dump({"data": []}, f)
-
-    def __write(self, data, f):
-        f.seek(0)
-        f.truncate()
-        json.dump(data, f)
+                    with self.lock:
+                        if self.__version() == version:
+                            self.__replace(tmp_path)
+                            replaced = True
+                            self._store_view(db_data['data'])
+                            return True
+                finally:
+                    if not replaced:
+                        os.remove(tmp_path)
+        raise RuntimeError(f'{self.db_path} was replaced while its lock was held')
+
+    def __version(self) -> int:
+        with open(self.db_path, 'rb') as f:
+            match = VERSION_HEADER.match(f.read(VERSION_HEADER_SIZE))
+            if match is not None:
+                return int(match.group(1))
+            # written by an older version (or by hand)
+            f.seek(0)
+            return json.load(f).get('version', 0)
+
+    def __dump(self, db_data: Dict[str, Any]) -> str:
+        """
+        Writes `db_data` to a new temporary file next to the database and returns its path.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.db_path)),
+                                        prefix=f'{os.path.basename(self.db_path)}.', suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding='utf-8') as f:
+                # I don't like this "data" thing, but we used to use PysonDB...
+                # dumps (unlike dump) uses the C encoder and a single write
+                f.write(json.dumps(db_data))
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def __replace(self, tmp_path: str):
+        os.replace(tmp_path, self.db_path)
+        # make the rename itself durable (not supported on Windows)
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(os.path.dirname(os.path.abspath(self.db_path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def __open_twice(self) -> Tuple[BinaryIO, BinaryIO]:
+        """
+        Opens the database twice, making sure both files are the same version of it even if a writer replaces it in
+        the meantime.
+        """
+        while True:
+            f, g = open(self.db_path, 'rb'), open(self.db_path, 'rb')
+            if os.path.samestat(os.fstat(f.fileno()), os.fstat(g.fileno())):
+                return f, g
+            f.close()
+            g.close()
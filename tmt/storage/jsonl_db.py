@@ -0,0 +1,212 @@
+from tmt.storage.locks import ProcessFileLock
+from tmt.storage.base import BaseDbManager
+from tmt.storage.schema import Entry
+from typing import List, Dict, Any, Optional, Hashable
+import os
+import json
+import re
+import shutil
+import threading
+
+# start of a database in the format of `tmt.storage.json_db.DbManager`, i.e. {"version": ..., "data": [...]}
+LEGACY_HEADER = re.compile(rb'\s*\{\s*"(data|version)"\s*:')
+# start of a log, i.e. of its first record {"op": ...}
+LOG_HEADER = re.compile(rb'\s*\{\s*"op"\s*:')
+# bytes read to match the headers above
+HEADER_SIZE = 4096
+
+
+class JsonlDbManager(BaseDbManager):
+    """
+    Log-structured alternative to :py:class:`tmt.storage.json_db.DbManager`. The database is a json-lines file, where
+    every add, update or delete operation is a single appended record, i.e.:
+
+    .. code-block:: json
+
+        {"op": "add", "entry": {"id": "...", "name": "...", ...}}
+        {"op": "update", "entry": {"id": "...", "name": "...", ...}}
+        {"op": "delete", "id": "..."}
+
+    Writing an entry therefore costs as much as the entry itself, instead of a full parse and rewrite of the
+    database. The state of the database is rebuilt by replaying the log; each instance keeps the replayed state in
+    memory and only reads the records appended since its last access. When superseded records outnumber live
+    entries by :py:attr:`COMPACTION_RATIO`, the log is compacted, i.e. rewritten with a single record per entry.
+
+    If `db_path` points to a database in the old json format (i.e. ``{"data": [...]}``), it is migrated in place
+    and a backup of the old file is kept in ``db_path + '.bak'``. See also
+    :py:meth:`tmt.storage.jsonl_db.JsonlDbManager.migrate_from_json`.
+
+    :param db_path: path to the json-lines db file.
+    :type db_path: str
+    :param read_only: if `True` all writing access is denied, defaults to False.
+    :type read_only: bool, optional
+    """
+    COMPACTION_MIN_RECORDS = 1000
+    COMPACTION_RATIO = 2
+
+    def __init__(self, db_path: str, read_only=False):
+        super().__init__(db_path, read_only)
+        self.lock = ProcessFileLock(f"{db_path}.lock")
+        # guards the replayed state, which readers update without taking `lock`
+        self.__state_lock = threading.RLock()
+        self.__reset_state()
+        self._legacy = False
+        with self.lock:
+            if not os.path.exists(db_path):
+                open(db_path, 'a').close()
+            elif self.__is_json_db(db_path):
+                if read_only:
+                    # we are not allowed to migrate it, we'll read it as it is
+                    self._legacy = True
+                else:
+                    shutil.copy(db_path, f'{db_path}.bak')
+                    self.__migrate(db_path)
+
+    check_can_write = BaseDbManager.check_can_write
+
+    @check_can_write
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        with self.lock:
+            self.__catch_up()
+            replaced, new_records = self._updated_records(updated, self._entries.__contains__)
+            records = [{'op': 'update', 'entry': d} for d in replaced]
+            records.extend({'op': 'add', 'entry': d} for d in new_records)
+            ids = {d['id'] for d in new_records}
+
+            def exists(id: str) -> bool:
+                return id in self._entries or id in ids
+
+            def is_parent(id: str) -> bool:
+                return id in self._entries and self._entries[id].get('parent_id') is None
+
+            records.extend({'op': 'add', 'entry': d} for d in self._new_records(added, exists, is_parent))
+            self.__append(records)
+
+    @check_can_write
+    def delete_entry(self, entry: Entry) -> bool:
+        with self.lock:
+            self.__catch_up()
+            if entry.id not in self._entries:
+                return False
+            # sub-entries stored as separate records are deleted with their parent
+            self.__append([{'op': 'delete', 'id': id} for id, d in self._entries.items()
+                           if id == entry.id or d.get('parent_id') == entry.id])
+            return True
+
+    @check_can_write
+    def delete_entries(self, entries: List[Entry]) -> int:
+        with self.lock:
+            self.__catch_up()
+            ids = {e.id for e in entries if e.id in self._entries}
+            self.__append([{'op': 'delete', 'id': id} for id, d in self._entries.items()
+                           if id in ids or d.get('parent_id') in ids])
+            return len(ids)
+
+    @check_can_write
+    def delete_all(self):
+        with self.lock:
+            self.__replace_log([])
+
+    @check_can_write
+    def compact(self):
+        """
+        Rewrites the log keeping a single record for each live entry.
+        """
+        with self.lock:
+            self.__catch_up()
+            self.__replace_log(list(self._entries.values()))
+
+    @check_can_write
+    def migrate_from_json(self, json_path: str):
+        """
+        Replaces the content of this database with the entries found in a json database in the old
+        ``{"data": [...]}`` format (i.e. the one used by :py:class:`tmt.storage.json_db.DbManager`).
+
+        :param json_path: path to the json db file to migrate from.
+        :type json_path: str
+        """
+        with self.lock:
+            self.__migrate(json_path)
+
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        if self._legacy:
+            with open(self.db_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['data']
+        with self.__state_lock:
+            self.__catch_up()
+            return list(self._entries.values())
+
+    def _signature(self) -> Hashable:
+        if self._legacy:
+            return self._stat_signature(self.db_path)
+        with self.__state_lock:
+            self.__catch_up()
+            return self._inode, self._offset
+
+    def __migrate(self, json_path: str):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)['data']
+        self.__replace_log(data)
+
+    def __append(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        with open(self.db_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(r) + '\n' for r in records))
+        self.__catch_up()
+        if self._records > max(self.COMPACTION_MIN_RECORDS, self.COMPACTION_RATIO * len(self._entries)):
+            self.__replace_log(list(self._entries.values()))
+
+    def __replace_log(self, entries: List[Dict[str, Any]]):
+        tmp_path = f'{self.db_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(json.dumps({'op': 'add', 'entry': e}) + '\n' for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.db_path)
+        with self.__state_lock:
+            self.__reset_state()
+            self.__catch_up()
+
+    def __catch_up(self):
+        """
+        Replays the records appended to the log since the last call. If the log was replaced (e.g. it was
+        compacted by another process), the whole log is replayed.
+        """
+        with self.__state_lock, open(self.db_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self.__reset_state()
+                self._inode = stat.st_ino
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # partially written record, we'll read it next time
+                    break
+                self._offset += len(line)
+                self.__apply(json.loads(line))
+
+    def __apply(self, record: Dict[str, Any]):
+        self._records += 1
+        op = record['op']
+        if op == 'add':
+            self._entries.setdefault(record['entry']['id'], record['entry'])
+        elif op == 'update':
+            if record['entry']['id'] in self._entries:
+                self._entries[record['entry']['id']] = record['entry']
+        elif op == 'delete':
+            self._entries.pop(record['id'], None)
+        else:
+            raise ValueError(f'Unknown operation {op} in {self.db_path}')
+
+    def __reset_state(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._records = 0
+        self._offset = 0
+        self._inode: Optional[int] = None
+
+    @staticmethod
+    def __is_json_db(path: str) -> bool:
+        # only the start of the file is read: logs begin with {"op": ..., while json databases may be indented
+        with open(path, 'rb') as f:
+            return LEGACY_HEADER.match(f.read(HEADER_SIZE)) is not None
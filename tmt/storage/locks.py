@@ -0,0 +1,75 @@
+from filelock import FileLock, Timeout
+from typing import Dict, Tuple
+import os
+import threading
+import time
+
+# (thread lock, file lock) of every lock file used by this process, see `ProcessFileLock`
+_locks: Dict[str, Tuple[threading.RLock, FileLock]] = {}
+_locks_lock = threading.Lock()
+
+
+def _reset_locks():
+    global _locks_lock
+    # a forked process must not share the locks of its parent (which may be held by threads it doesn't have)
+    _locks.clear()
+    _locks_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_locks)
+
+
+class ProcessFileLock:
+    """
+    Lock held by a single thread of a single process at a time. A :py:class:`filelock.FileLock` alone only
+    excludes other processes: it is reentrant within a process, so two threads sharing it (or two instances for the
+    same file, depending on the `filelock` version) are not serialized against each other. Here a thread first takes
+    a :py:class:`threading.RLock` and then the file lock, both shared by all the instances for the same `lock_file`
+    in this process. Like :py:class:`filelock.FileLock`, it is reentrant for the thread holding it.
+
+    :param lock_file: path to the lock file.
+    :type lock_file: str
+    """
+
+    def __init__(self, lock_file: str):
+        self.lock_file = lock_file
+        self.__key = os.path.abspath(lock_file)
+
+    @property
+    def __locks(self) -> Tuple[threading.RLock, FileLock]:
+        # looked up every time, since the locks are replaced in a forked process
+        with _locks_lock:
+            if self.__key not in _locks:
+                # the thread lock already tells threads apart, the file lock is only for other processes
+                _locks[self.__key] = threading.RLock(), FileLock(self.__key, thread_local=False)
+            return _locks[self.__key]
+
+    def acquire(self, timeout: float = -1):
+        """
+        Acquires the lock, waiting at most `timeout` seconds (forever if negative).
+
+        :raises filelock.Timeout: if the lock could not be acquired within `timeout`.
+        """
+        start = time.monotonic()
+        thread_lock, file_lock = self.__locks
+        if not thread_lock.acquire(timeout=timeout):
+            raise Timeout(self.lock_file)
+        try:
+            remaining = -1 if timeout < 0 else max(0., timeout - (time.monotonic() - start))
+            file_lock.acquire(timeout=remaining)
+        except BaseException:
+            thread_lock.release()
+            raise
+
+    def release(self):
+        thread_lock, file_lock = self.__locks
+        file_lock.release()
+        thread_lock.release()
+
+    def __enter__(self) -> 'ProcessFileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self.release()
@@ -0,0 +1,151 @@
+"""
+Merge of several `tmt` databases into one, e.g. the databases written by experiments run on different machines.
+See :py:func:`tmt.storage.merge.merge_databases` and the ``merge`` command of :py:mod:`tmt.tmt_cli`.
+"""
+from tmt.storage.base import BaseDbManager
+from tmt.storage.json_db import DbManager
+from tmt.storage.jsonl_db import JsonlDbManager, HEADER_SIZE, LEGACY_HEADER, LOG_HEADER
+from tmt.storage.sqlite_db import SqliteDbManager, SQLITE_HEADER
+from tmt.storage.wal_db import WalDbManager
+from typing import Any, Dict, Iterable, List, Optional, Type
+from contextlib import closing
+from dataclasses import dataclass
+import os
+
+
+@dataclass
+class MergeReport:
+    """
+    Outcome of :py:func:`tmt.storage.merge.merge_databases`.
+    """
+    # entries read from the source databases
+    read: int = 0
+    # entries which were not in the target database
+    added: int = 0
+    # entries already in the target database (or in a previous source) which got new sub-entries
+    merged: int = 0
+    # sub-entries added to the entries above
+    sub_entries: int = 0
+    # entries already in the target database, with no new sub-entries
+    skipped: int = 0
+
+
+def detect_backend(path: str, default: Type[BaseDbManager] = DbManager) -> Type[BaseDbManager]:
+    """
+    Returns the backend able to read the database in `path`, by looking at its first bytes (and at whether it has a
+    write-ahead log, see :py:class:`tmt.storage.wal_db.WalDbManager`). If the file does not exist, is empty or its
+    format is not recognized, returns `default`.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return default
+    if os.path.exists(f'{path}.wal') or os.path.exists(f'{path}.wal.checkpoint'):
+        return WalDbManager
+    with open(path, 'rb') as f:
+        # only the header: json databases are a single line, however large
+        header = f.read(max(HEADER_SIZE, len(SQLITE_HEADER)))
+    if header.startswith(SQLITE_HEADER):
+        return SqliteDbManager
+    if LOG_HEADER.match(header):
+        return JsonlDbManager
+    if LEGACY_HEADER.match(header):
+        return DbManager
+    return default
+
+
+def open_db(path: str, read_only=False, backend: Optional[Type[BaseDbManager]] = None) -> BaseDbManager:
+    """
+    Opens the database in `path` with `backend` or, if not given, with the backend detected by
+    :py:func:`tmt.storage.merge.detect_backend`.
+    """
+    return (backend or detect_backend(path))(path, read_only=read_only)
+
+
+class PathRewriter:
+    """
+    Rewrites the paths (i.e. results path, snapshot path and result files) of raw entries, replacing the longest
+    matching prefix in `prefixes` with its replacement. Prefixes match whole path components only, i.e.
+    ``/home/al`` matches ``/home/al/results`` but not ``/home/alice``.
+
+    :param prefixes: maps old path prefixes to the new ones, e.g. ``{'/home/alice/project': '/data/project'}``.
+    :type prefixes: Dict[str, str]
+    """
+
+    def __init__(self, prefixes: Dict[str, str]):
+        # a trailing separator would prevent the prefix from matching the directory itself
+        self.prefixes = sorted(((old.rstrip('/') or '/', new) for old, new in prefixes.items()),
+                               key=lambda p: len(p[0]), reverse=True)
+
+    def __call__(self, d: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.prefixes:
+            return d
+        return dict(d, local_results_path=self.rewrite(d.get('local_results_path')),
+                    local_snapshot_path=self.rewrite(d.get('local_snapshot_path')),
+                    results=[dict(r, path=self.rewrite(r.get('path'))) for r in d['results']],
+                    other_runs=[self(c) for c in d['other_runs']])
+
+    def rewrite(self, path: Optional[str]) -> Optional[str]:
+        if not path:
+            return path
+        for old, new in self.prefixes:
+            if path == old or path.startswith(old if old == '/' else old + '/'):
+                return new + path[len(old):]
+        return path
+
+
+def merge_databases(target: BaseDbManager, sources: Iterable[BaseDbManager],
+                    path_prefixes: Optional[Dict[str, str]] = None) -> MergeReport:
+    """
+    Merges the entries of `sources` into `target`. Sources are streamed one entry at a time and deduplicated by id
+    against a hash index of the target, then all the changes are written to `target` in a single write, so that
+    merging is linear in the number of entries.
+
+    When an entry already exists (in `target` or in a previous source), the existing one is kept, but the sub-entries
+    (i.e. `other_runs`) it lacks are added to it, so that runs of the same experiment done on different machines
+    end up together.
+
+    **Usage**:
+
+    .. code-block:: python
+
+        target = DbManager('.tmt/tmt_db.json')
+        sources = [DbManager(path, read_only=True) for path in ('node1/tmt_db.json', 'node2/tmt_db.json')]
+        report = merge_databases(target, sources, {'/scratch/node1': '/data/experiments'})
+
+    :param target: the database to merge into.
+    :type target: BaseDbManager
+    :param sources: the databases to merge.
+    :type sources: Iterable[BaseDbManager]
+    :param path_prefixes: path prefixes to rewrite in the merged entries, see
+        :py:class:`tmt.storage.merge.PathRewriter`. Defaults to None.
+    :type path_prefixes: Optional[Dict[str, str]], optional
+    """
+    report = MergeReport()
+    rewrite = PathRewriter(path_prefixes or {})
+    existing = {d['id']: d for d in target._view().data}
+    added: Dict[str, Dict[str, Any]] = {}
+    updated: Dict[str, Dict[str, Any]] = {}
+    for source in sources:
+        with closing(source._iter_raw()) as raw:
+            for d, _ in raw:
+                report.read += 1
+                id = d['id']
+                current = added.get(id) or updated.get(id) or existing.get(id)
+                if current is None:
+                    added[id] = rewrite(d)
+                    report.added += 1
+                    continue
+                sub_entries = _missing_sub_entries(current, d)
+                if not sub_entries:
+                    report.skipped += 1
+                    continue
+                merged = dict(current, other_runs=current['other_runs'] + [rewrite(s) for s in sub_entries])
+                (added if id in added else updated)[id] = merged
+                report.merged += 1
+                report.sub_entries += len(sub_entries)
+    target._write_raw(list(added.values()), list(updated.values()))
+    return report
+
+
+def _missing_sub_entries(current: Dict[str, Any], d: Dict[str, Any]) -> List[Dict[str, Any]]:
+    ids = {s['id'] for s in current['other_runs']}
+    return [dict(s, parent_id=current['id']) for s in d['other_runs'] if s['id'] not in ids]
@@ -0,0 +1,286 @@
+"""
+Composable queries over a `tmt` database, see :py:meth:`tmt.storage.base.BaseDbManager.query`.
+
+A :py:class:`tmt.storage.query.Query` only records the criteria, the backend decides how to evaluate them: the
+default implementation (:py:meth:`tmt.storage.base.BaseDbManager._execute_query`) looks up the candidate entries in
+the name and date indexes of the cached database, then checks every criterion on the raw (i.e. json-like) entries in a
+single pass, so that only the matching entries are decoded into :py:class:`tmt.storage.schema.Entry` objects.
+:py:class:`tmt.storage.sqlite_db.SqliteDbManager` translates the query to a single SQL statement instead.
+"""
+from __future__ import annotations
+from tmt.storage.schema import Entry, DATE_FIELDS
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass
+from datetime import datetime
+import copy
+import itertools
+import operator
+import re
+
+if TYPE_CHECKING:
+    from tmt.storage.base import BaseDbManager
+
+OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq,
+             '!=': operator.ne}
+# Entry fields which can be passed to `Query.order_by`, besides "metrics.<metric name>"
+ORDER_FIELDS = ('id', 'name', 'args', 'date_created', 'date_saved', 'description', 'version')
+METRIC_PREFIX = 'metrics.'
+
+
+@dataclass(frozen=True)
+class DateRange:
+    field: str
+    first: Optional[int] = None
+    second: Optional[int] = None
+    include_first: bool = True
+    include_second: bool = True
+
+    def matches(self, d: Dict[str, Any]) -> bool:
+        date = d.get(self.field)
+        if date is None:
+            return False
+        if self.first is not None and (date < self.first if self.include_first else date <= self.first):
+            return False
+        if self.second is not None and (date > self.second if self.include_second else date >= self.second):
+            return False
+        return True
+
+    def overlaps(self, first: float, second: float) -> bool:
+        """
+        Returns `True` if some date in [`first`, `second`] is in this range.
+        """
+        if self.first is not None and (second < self.first if self.include_first else second <= self.first):
+            return False
+        if self.second is not None and (first > self.second if self.include_second else first >= self.second):
+            return False
+        return True
+
+
+@dataclass(frozen=True)
+class MetricFilter:
+    name: str
+    op: str
+    value: float
+
+    def matches(self, d: Dict[str, Any]) -> bool:
+        compare = OPERATORS[self.op]
+        return any(m['name'] == self.name and m['value'] is not None and compare(m['value'], self.value)
+                   for m in d['metrics'])
+
+
+class Query:
+    """
+    Builder of database queries. Every method returns the query itself, so that criteria can be chained; all the
+    criteria must be satisfied by the returned entries. Use :py:meth:`tmt.storage.base.BaseDbManager.query` to create
+    one.
+
+    **Usage**:
+
+    .. code-block:: python
+
+        # the 10 best runs of resnet from last week with f1 > 0.8
+        entries = db.query() \\
+            .name_regex(r'resnet.*') \\
+            .after(datetime.now() - timedelta(days=7)) \\
+            .metric('f1', '>', 0.8) \\
+            .order_by('metrics.f1', descending=True) \\
+            .limit(10) \\
+            .all()
+
+    Unless :py:meth:`tmt.storage.query.Query.order_by` is used, entries are returned in database order.
+
+    :param db: the database to query.
+    :type db: BaseDbManager
+    """
+
+    def __init__(self, db: BaseDbManager):
+        self.db = db
+        self.ids: Optional[Set[str]] = None
+        self.exact_names: Optional[Set[str]] = None
+        self.substrings: List[str] = []
+        self.regexes: List[str] = []
+        self.dates: List[DateRange] = []
+        self.metrics: List[MetricFilter] = []
+        self.predicates: List[Callable[[Entry], Any]] = []
+        self.sort_field: Optional[str] = None
+        self.sort_descending = False
+        self.skip = 0
+        self.max_entries: Optional[int] = None
+
+    def id(self, *ids: str) -> Query:
+        """
+        Keeps the entries whose id is one of `ids`.
+        """
+        self.ids = set(ids) if self.ids is None else self.ids & set(ids)
+        return self
+
+    def name(self, name: str, exact=False) -> Query:
+        """
+        Keeps the entries whose name contains `name` or, if `exact` is `True`, is exactly `name`.
+        """
+        if exact:
+            self.exact_names = {name} if self.exact_names is None else self.exact_names & {name}
+        else:
+            self.substrings.append(name)
+        return self
+
+    def name_regex(self, regex: str) -> Query:
+        """
+        Keeps the entries whose name matches `regex` (with `re.match`, i.e. at the beginning of the name).
+        """
+        re.compile(regex)
+        self.regexes.append(regex)
+        return self
+
+    def between(self, first: Optional[Union[datetime, int]] = None, second: Optional[Union[datetime, int]] = None,
+                field='date_created') -> Query:
+        """
+        Keeps the entries whose `field` date is between `first` and `second` (both included). A `None` bound is
+        open. Entries without a `field` date are discarded.
+
+        :param field: the date to search by, either "date_created" or "date_saved". Defaults to "date_created".
+        :type field: str, optional
+        """
+        self.dates.append(DateRange(self.__date_field(field), self.__timestamp(first), self.__timestamp(second)))
+        return self
+
+    def after(self, date: Union[datetime, int], field='date_created') -> Query:
+        """
+        Keeps the entries whose `field` date is strictly greater than `date`.
+        """
+        self.dates.append(DateRange(self.__date_field(field), self.__timestamp(date), include_first=False))
+        return self
+
+    def before(self, date: Union[datetime, int], field='date_created') -> Query:
+        """
+        Keeps the entries whose `field` date is strictly lower than `date`.
+        """
+        self.dates.append(DateRange(self.__date_field(field), second=self.__timestamp(date), include_second=False))
+        return self
+
+    def metric(self, name: str, op: str, value: float) -> Query:
+        """
+        Keeps the entries with a metric called `name` whose value satisfies `op` `value`, e.g.
+        ``metric('f1', '>=', 0.8)``.
+
+        :param op: one of "<", "<=", ">", ">=", "==", "!=".
+        :type op: str
+        """
+        if op not in OPERATORS:
+            raise ValueError(f'Unknown operator {op}. Use one of {", ".join(OPERATORS)}')
+        self.metrics.append(MetricFilter(name, op, value))
+        return self
+
+    def where(self, predicate: Callable[[Entry], Any]) -> Query:
+        """
+        Keeps the entries for which `predicate` returns a true value. Since it needs decoded entries, this is
+        evaluated after every other criterion and can't be pushed down to the backend: prefer the other methods
+        when possible.
+        """
+        self.predicates.append(predicate)
+        return self
+
+    def order_by(self, field: str, descending=False) -> Query:
+        """
+        Sorts the entries by `field`, which is either an entry field (e.g. "date_created" or "name") or
+        "metrics.<name>" to sort by the value of a metric. Entries without a value for `field` always come last.
+        Ties are kept in database order.
+        """
+        if field not in ORDER_FIELDS and not field.startswith(METRIC_PREFIX):
+            raise ValueError(f'Cannot order by {field}. Use one of {", ".join(ORDER_FIELDS)} or '
+                             f'"{METRIC_PREFIX}<metric name>"')
+        self.sort_field = field
+        self.sort_descending = descending
+        return self
+
+    def offset(self, n: int) -> Query:
+        self.skip = n
+        return self
+
+    def limit(self, n: int) -> Query:
+        self.max_entries = n
+        return self
+
+    def all(self) -> List[Entry]:
+        return list(self)
+
+    def first(self) -> Optional[Entry]:
+        return next(iter(self.limit(1)), None)
+
+    def count(self) -> int:
+        return sum(1 for _ in self)
+
+    def __iter__(self) -> Iterator[Entry]:
+        archived = self.db._archived(self)
+        if not archived:
+            return self.db._execute_query(self)
+        return self.__with_archived(archived)
+
+    def __with_archived(self, archived: List[Dict[str, Any]]) -> Iterator[Entry]:
+        """
+        Returns the matching entries of the database together with the archived ones in `archived` (see
+        :py:mod:`tmt.storage.archive`), which come first since they were added earlier. The order and the window
+        apply to both.
+        """
+        query = copy.copy(self)
+        query.skip, query.max_entries, query.sort_field = 0, None, None
+        entries = list(self.db._execute_query(query))
+        ids = {e.id for e in entries}
+        archived_entries = map(Entry.from_dict, (d for d in archived if d['id'] not in ids))
+        for predicate in self.predicates:
+            archived_entries = filter(predicate, archived_entries)
+        entries = list(archived_entries) + entries
+        if self.sort_field is not None:
+            present, missing = [], []
+            for e in entries:
+                value = self.sort_value(e.to_dict())
+                (missing if value is None else present).append((value, e))
+            present.sort(key=operator.itemgetter(0), reverse=self.sort_descending)
+            entries = [e for _, e in itertools.chain(present, missing)]
+        start, stop = self.window()
+        return iter(entries[start:stop])
+
+    def raw_predicate(self) -> Callable[[Dict[str, Any]], bool]:
+        """
+        Returns a function checking every criterion but the ones of :py:meth:`tmt.storage.query.Query.where` on a
+        raw entry. Cheap checks (ids, names, dates) come first, so that metrics are only looked at when needed.
+        """
+        checks: List[Callable[[Dict[str, Any]], Any]] = []
+        if self.ids is not None:
+            checks.append(lambda d, ids=self.ids: d['id'] in ids)
+        if self.exact_names is not None:
+            checks.append(lambda d, names=self.exact_names: d['name'] in names)
+        for substring in self.substrings:
+            checks.append(lambda d, s=substring: s in d['name'])
+        for regex in self.regexes:
+            checks.append(lambda d, match=re.compile(regex).match: match(d['name']))
+        checks.extend(r.matches for r in self.dates)
+        checks.extend(m.matches for m in self.metrics)
+        return lambda d: all(check(d) for check in checks)
+
+    def sort_value(self, d: Dict[str, Any]) -> Any:
+        """
+        Returns the value `d` is sorted by, or `None` if it has none.
+        """
+        if self.sort_field.startswith(METRIC_PREFIX):
+            name = self.sort_field[len(METRIC_PREFIX):]
+            return next((m['value'] for m in d['metrics'] if m['name'] == name), None)
+        return d.get(self.sort_field)
+
+    def window(self) -> Tuple[int, Optional[int]]:
+        """
+        Returns the (start, stop) slice of the sorted and filtered entries to return.
+        """
+        return self.skip, None if self.max_entries is None else self.skip + self.max_entries
+
+    @staticmethod
+    def __date_field(field: str) -> str:
+        if field not in DATE_FIELDS:
+            raise ValueError(f'{field} is not a date field. Use one of {", ".join(DATE_FIELDS)}')
+        return field
+
+    @staticmethod
+    def __timestamp(date: Optional[Union[datetime, int]]) -> Optional[int]:
+        if isinstance(date, datetime):
+            return date.timestamp()
+        return date
@@ -1,69 +1,131 @@
 from __future__ import annotations
-from dataclasses import dataclass, field, asdict
-from typing import Any, NewType, List, Dict, Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, NewType, List, Dict, Optional, Callable
 from abc import ABC
 from tmt.info import __version__
 import typing
 import json
 
 Timestamp = NewType('Timestamp', int)
+# Fields of an Entry holding a Timestamp, i.e. the ones entries can be searched and sorted by date with
+DATE_FIELDS = ('date_created', 'date_saved')
 
 
 @dataclass
 class BaseJsonDataclass(ABC):
     @classmethod
     def from_dict(cls, d: Dict[str, Any]):
-        init_dict = {}
-        for key, val in typing.get_type_hints(cls).items():
-            field = cls.__solve_type(val, key, d)
-            init_dict[key] = field
-        return cls(**init_dict)
+        decoder = _decoders.get(cls)
+        if decoder is None:
+            decoder = _decoders[cls] = _compile_decoder(cls)
+        return decoder(cls, d)
 
     @classmethod
     def from_json(cls, s: str):
         return cls.from_dict(json.loads(s))
 
-    @staticmethod
-    def __solve_type(t, key, d):
-        args = typing.get_args(t)
-        if len(args) == 0:
-            if t is Timestamp:
-                return d.get(key)
-            elif issubclass(t, BaseJsonDataclass):
-                return BaseJsonDataclass.init_subclass(t, key, d)
-            else:
-                return d.get(key)
-        if BaseJsonDataclass.__is_optional_type(args):
-            if d.get(key):
-                return BaseJsonDataclass.__solve_type(args[0], key, d)
-            return None
-
-        container = typing.get_origin(t)
-        if len(args) == 1:  # in our case, this is a list
-            arg = args[0]
-            arg_args = typing.get_args(arg)
-
-            if len(arg_args) == 0:
-                return container(arg.from_dict(e) if hasattr(arg, 'from_dict') else arg(e) for e in d.get(key))
-            else:
-                return container(BaseJsonDataclass.__solve_type(arg, 'l', {'l': e}) for e in d.get(key))
-        else:
-            raise ValueError(
-                'There might be a Tuple or some kind of container which is not a list somewhere in the models. This '
-                'is not supported yet')
-
     @staticmethod
     def init_subclass(subcls, key: str, kvs: Dict):
         if key in kvs:
             return subcls.from_dict(kvs[key])
         return None
 
-    @staticmethod
-    def __is_optional_type(args):
-        return len(args) > 1 and typing.get_origin(args[1]) is None
-
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        encoder = _encoders.get(type(self))
+        if encoder is None:
+            encoder = _encoders[type(self)] = _compile_encoder(type(self))
+        return encoder(self)
+
+
+# Decoders and encoders are generated the first time a class is (de)serialized, resolving the type hints once.
+# This avoids calling `typing.get_type_hints` and walking the types for every object (or `dataclasses.asdict`,
+# which deep copies everything).
+_decoders: Dict[type, Callable[[type, Dict[str, Any]], Any]] = {}
+_encoders: Dict[type, Callable[[Any], Dict[str, Any]]] = {}
+
+
+def _is_optional_type(args) -> bool:
+    return len(args) > 1 and typing.get_origin(args[1]) is None
+
+
+def _is_json_dataclass(t) -> bool:
+    return t is not Timestamp and isinstance(t, type) and issubclass(t, BaseJsonDataclass)
+
+
+def _bind(ns: Dict[str, Any], obj: Any) -> str:
+    name = f'_{len(ns)}'
+    ns[name] = obj
+    return name
+
+
+def _decode_expr(t, key: str, d: str, ns: Dict[str, Any], depth=0) -> str:
+    """
+    Returns the source of an expression decoding `key` from the dict expression `d` as type `t`.
+    Objects referenced by the expression are added to `ns`.
+    """
+    args = typing.get_args(t)
+    if len(args) == 0:
+        if _is_json_dataclass(t):
+            return f'({_bind(ns, t)}.from_dict({d}[{key!r}]) if {key!r} in {d} else None)'
+        return f'{d}.get({key!r})'
+    if _is_optional_type(args):
+        return f'({_decode_expr(args[0], key, d, ns, depth)} if {d}.get({key!r}) else None)'
+
+    if len(args) == 1:  # in our case, this is a list
+        arg = args[0]
+        container = typing.get_origin(t)
+        var = f'e_{depth}'
+        if len(typing.get_args(arg)) == 0:
+            elem = f'{_bind(ns, arg.from_dict if hasattr(arg, "from_dict") else arg)}({var})'
+        else:
+            elem = _decode_expr(arg, 'l', f"{{'l': {var}}}", ns, depth + 1)
+        if container is list:
+            return f'[{elem} for {var} in {d}.get({key!r})]'
+        return f'{_bind(ns, container)}({elem} for {var} in {d}.get({key!r}))'
+    raise ValueError(
+        'There might be a Tuple or some kind of container which is not a list somewhere in the models. This '
+        'is not supported yet')
+
+
+def _encode_expr(t, value: str, ns: Dict[str, Any], depth=0) -> str:
+    """
+    Returns the source of an expression encoding `value`, of type `t`, to its json representation.
+    """
+    args = typing.get_args(t)
+    if len(args) == 0:
+        if _is_json_dataclass(t):
+            return f'({value}.to_dict() if {value} is not None else None)'
+        return value
+    if _is_optional_type(args):
+        inner = _encode_expr(args[0], value, ns, depth)
+        return inner if inner == value else f'({inner} if {value} is not None else None)'
+    if len(args) == 1:
+        var = f'e_{depth}'
+        elem = _encode_expr(args[0], var, ns, depth + 1)
+        if elem == var:
+            return f'(list({value}) if {value} is not None else None)'
+        return f'([{elem} for {var} in {value}] if {value} is not None else None)'
+    raise ValueError(
+        'There might be a Tuple or some kind of container which is not a list somewhere in the models. This '
+        'is not supported yet')
+
+
+def _compile(name: str, source: str, ns: Dict[str, Any]) -> Callable:
+    exec(source, ns)
+    return ns[name]
+
+
+def _compile_decoder(cls) -> Callable[[type, Dict[str, Any]], Any]:
+    ns = {}
+    kwargs = ', '.join(f'{key}={_decode_expr(t, key, "d", ns)}' for key, t in typing.get_type_hints(cls).items())
+    return _compile('decode', f'def decode(cls, d):\n    return cls({kwargs})', ns)
+
+
+def _compile_encoder(cls) -> Callable[[Any], Dict[str, Any]]:
+    ns = {}
+    hints = typing.get_type_hints(cls)
+    items = ', '.join(f'{f.name!r}: {_encode_expr(hints[f.name], f"obj.{f.name}", ns)}' for f in fields(cls))
+    return _compile('encode', f'def encode(obj):\n    return {{{items}}}', ns)
 
 
 @dataclass
@@ -94,6 +156,8 @@ class Entry(BaseJsonDataclass):
     other_runs: List[Entry] = field(default_factory=list)
     results: List[Result] = field(default_factory=list)
     version: str = __version__
+    # id of the parent entry, for sub-entries (see `other_runs` and tmt.utils.duplicates.DuplicatePolicy.AS_SUB_ENTRY)
+    parent_id: Optional[str] = None
 
     def short_str(self) -> str:
         return f"Entry with id {self.id}, name {self.name}, timestamp {self.date_created}"
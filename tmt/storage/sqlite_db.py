@@ -0,0 +1,428 @@
+from tmt.storage.base import BaseDbManager, Cursor, DATE_FIELDS
+from tmt.storage.query import Query, METRIC_PREFIX
+from tmt.storage.schema import Entry
+from typing import List, Dict, Any, Hashable, Optional, Union, Iterable, Iterator, Sequence, Tuple
+from datetime import datetime
+import heapq
+import itertools
+import operator
+import os
+import re
+import json
+import shutil
+import sqlite3
+import threading
+import warnings
+
+ENTRY_COLUMNS = ('id', 'name', 'args', 'date_created', 'local_results_path', 'local_snapshot_path', 'description',
+                 'date_saved', 'version')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT REFERENCES entries(id) ON DELETE CASCADE,
+    pos INTEGER NOT NULL DEFAULT 0,
+    name TEXT NOT NULL,
+    args TEXT,
+    date_created INTEGER,
+    local_results_path TEXT,
+    local_snapshot_path TEXT,
+    description TEXT,
+    date_saved INTEGER,
+    version TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_parent_idx ON entries(parent_id, pos);
+CREATE INDEX IF NOT EXISTS entries_name_idx ON entries(name);
+CREATE INDEX IF NOT EXISTS entries_date_created_idx ON entries(date_created);
+CREATE INDEX IF NOT EXISTS entries_date_saved_idx ON entries(date_saved);
+CREATE TABLE IF NOT EXISTS metrics (
+    owner_id TEXT NOT NULL REFERENCES entries(id) ON DELETE CASCADE,
+    pos INTEGER NOT NULL,
+    entry_id TEXT,
+    name TEXT,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS metrics_owner_idx ON metrics(owner_id, pos);
+CREATE INDEX IF NOT EXISTS metrics_name_value_idx ON metrics(name, value);
+CREATE TABLE IF NOT EXISTS results (
+    owner_id TEXT NOT NULL REFERENCES entries(id) ON DELETE CASCADE,
+    pos INTEGER NOT NULL,
+    entry_id TEXT,
+    name TEXT,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS results_owner_idx ON results(owner_id, pos);
+"""
+
+# Value of the first metric with a given name of an entry, used to sort by metric
+METRIC_VALUE = '(SELECT value FROM metrics m WHERE m.owner_id = entries.id AND m.name = ? ORDER BY m.pos LIMIT 1)'
+SQL_OPERATORS = {'<': '<', '<=': '<=', '>': '>', '>=': '>=', '==': '=', '!=': '<>'}
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER when using `IN (...)` clauses
+MAX_VARIABLES = 500
+# Number of entries loaded at a time when iterating over the database
+BATCH_SIZE = 100
+
+
+class SqliteDbManager(BaseDbManager):
+    """
+    `sqlite3` based alternative to :py:class:`tmt.storage.json_db.DbManager`. Entries, metrics, results and
+    sub-entries (i.e. `other_runs`) are stored in normalized tables, indexed on entry id, name, creation date and
+    metric name/value. Lookups by id, exact name, dates and metric values are therefore index lookups, instead of
+    linear scans over the whole database.
+
+    If `db_path` points to a database in the old json format (i.e. ``{"data": [...]}``), it is migrated in place
+    and a backup of the old file is kept in ``db_path + '.bak'``.
+
+    :param db_path: path to the sqlite db file.
+    :type db_path: str
+    The connection is shared by all the threads using an instance, one statement (or transaction) at a time.
+
+    :param read_only: if `True` all writing access is denied, defaults to False.
+    :type read_only: bool, optional
+    """
+
+    def __init__(self, db_path: str, read_only=False):
+        super().__init__(db_path, read_only)
+        # serializes the use of `conn`: a transaction (or a read spanning several statements) of a thread must not
+        # interleave with the statements of another
+        self.__lock = threading.RLock()
+        legacy_path = None
+        if os.path.exists(db_path) and os.path.getsize(db_path) > 0 and not self.__is_sqlite_db(db_path):
+            if read_only:
+                # we are not allowed to migrate it, we'll serve it from an in-memory copy
+                legacy_path = db_path
+                db_path = ':memory:'
+            else:
+                legacy_path = f'{db_path}.bak'
+                shutil.move(db_path, legacy_path)
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        # identifies this connection in the signature of the cached database, see `_signature`
+        self.__connection_token = object()
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.create_function('REGEXP', 2, self.__regexp_match, deterministic=True)
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+        if legacy_path is not None:
+            self.__import_json(legacy_path)
+
+    check_can_write = BaseDbManager.check_can_write
+
+    @check_can_write
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        with self.__lock, self.conn:
+            for d in updated:
+                self.__update(d)
+            for d in self._new_records(added, self.__exists, self.__is_parent):
+                self.__insert(d, d.get('parent_id'), self.__next_pos(d.get('parent_id')))
+
+    @check_can_write
+    def delete_entry(self, entry: Entry) -> bool:
+        with self.__lock, self.conn:
+            return self.conn.execute('DELETE FROM entries WHERE id = ?', (entry.id,)).rowcount > 0
+
+    @check_can_write
+    def delete_entries(self, entries: List[Entry]) -> int:
+        with self.__lock, self.conn:
+            return self.conn.executemany('DELETE FROM entries WHERE id = ?', [(e.id,) for e in entries]).rowcount
+
+    @check_can_write
+    def delete_all(self):
+        with self.__lock, self.conn:
+            self.conn.execute('DELETE FROM entries')
+
+    @check_can_write
+    def migrate_from_json(self, json_path: str):
+        """
+        Adds the entries found in a json database in the old ``{"data": [...]}`` format (i.e. the one used by
+        :py:class:`tmt.storage.json_db.DbManager`).
+
+        :param json_path: path to the json db file to migrate from.
+        :type json_path: str
+        """
+        self.__import_json(json_path)
+
+    def __import_json(self, json_path: str):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)['data']
+        with self.__lock, self.conn:
+            pos = self.__next_pos()
+            parent_ids = set()
+            for d in data:
+                parent_id = d.get('parent_id')
+                if parent_id is None:
+                    self.__insert(d, None, pos)
+                    parent_ids.add(d['id'])
+                    pos += 1
+                elif parent_id in parent_ids:
+                    # a sub-entry stored as a separate record, which always follows its parent
+                    self.__insert(d, parent_id, self.__next_pos(parent_id))
+
+    def get_entry_by_id(self, id: str) -> Optional[Entry]:
+        entries = self.__select('id = ?', (id,))
+        if not entries:
+            entries = self._with_archived_entries([], self._archived(Query(self).id(id)))
+        return entries[0] if entries else None
+
+    def get_entry_by_exact_name(self, name: str) -> Optional[Entry]:
+        entries = self._with_archived_entries(self.__select('name = ?', (name,)),
+                                              self._archived(Query(self).name(name, exact=True)))
+        if len(entries) > 1:
+            warnings.warn(f'Found {len(entries)} entries for name {name}. Returning the first one.')
+        return entries[0]
+
+    def get_entries_by_name(self, name: str) -> List[Entry]:
+        return self._with_archived_entries(self.__select('instr(name, ?) > 0', (name,)),
+                                           self._archived(Query(self).name(name)))
+
+    def get_entries_by_name_regex(self, regex: str) -> List[Entry]:
+        re.compile(regex)  # let invalid patterns raise here, as other backends do
+        return self._with_archived_entries(self.__select('name REGEXP ?', (regex,)),
+                                           self._archived(Query(self).name_regex(regex)))
+
+    def get_entries_between_dates(self, first: Union[datetime, int], second: Union[datetime, int],
+                                  field='date_created') -> List[Entry]:
+        first, second = self._convert_date_to_timestamp(first, second)
+        return self._with_archived_entries(
+            self.__select(f'{self.__date_field(field)} BETWEEN ? AND ?', (first, second), order_by=field),
+            self._archived(Query(self).between(first, second, field)), field)
+
+    def get_entries_greater_than_date(self, date: Union[datetime, int], field='date_created') -> List[Entry]:
+        timestamp = next(self._convert_date_to_timestamp(date))
+        return self._with_archived_entries(
+            self.__select(f'{self.__date_field(field)} > ?', (timestamp,), order_by=field),
+            self._archived(Query(self).after(timestamp, field)), field)
+
+    def get_entries_lower_than_date(self, date: Union[datetime, int], field='date_created') -> List[Entry]:
+        timestamp = next(self._convert_date_to_timestamp(date))
+        return self._with_archived_entries(
+            self.__select(f'{self.__date_field(field)} < ?', (timestamp,), order_by=field),
+            self._archived(Query(self).before(timestamp, field)), field)
+
+    def get_most_recent_entries(self, n: int, name: Optional[str] = None, field='date_created') -> List[Entry]:
+        where, params = f'{self.__date_field(field)} IS NOT NULL', []
+        if name is not None:
+            where += ' AND name = ?'
+            params.append(name)
+        entries = self.__select(f'{where} ORDER BY {field} DESC, pos DESC LIMIT ?', (*params, n), order_by=None)
+        # archived entries only matter if they are more recent than the ones found
+        query = Query(self).between(getattr(entries[-1], field) if len(entries) == n > 0 else None, field=field)
+        if name is not None:
+            query.name(name, exact=True)
+        archived = self._archived(query)
+        if archived:
+            ids = {e.id for e in entries}
+            entries = heapq.nlargest(n, entries + [Entry.from_dict(d) for d in archived if d['id'] not in ids],
+                                     key=operator.attrgetter(field))
+        return entries
+
+    def get_entries_by_metric(self, name: str, min_value: Optional[float] = None,
+                              max_value: Optional[float] = None) -> List[Entry]:
+        where = 'm.name = ?'
+        params = [name]
+        if min_value is not None:
+            where += ' AND m.value >= ?'
+            params.append(min_value)
+        if max_value is not None:
+            where += ' AND m.value <= ?'
+            params.append(max_value)
+
+        def matches(d: Dict[str, Any]) -> bool:
+            return any(m['name'] == name and (min_value is None or m['value'] >= min_value) and
+                       (max_value is None or m['value'] <= max_value) for m in d['metrics'])
+        return self._with_archived_entries(self.__select(f'id IN (SELECT m.owner_id FROM metrics m WHERE {where})',
+                                                         params),
+                                           self._archived(Query(self), matches, [name]))
+
+    def _execute_query(self, query: Query) -> Iterator[Entry]:
+        where, params = [], []
+        if query.ids is not None:
+            where.append('id IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(sorted(query.ids)))
+        if query.exact_names is not None:
+            where.append('name IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(sorted(query.exact_names)))
+        for substring in query.substrings:
+            where.append('instr(name, ?) > 0')
+            params.append(substring)
+        for regex in query.regexes:
+            where.append('name REGEXP ?')
+            params.append(regex)
+        for r in query.dates:
+            if r.first is not None:
+                where.append(f'{r.field} {">=" if r.include_first else ">"} ?')
+                params.append(r.first)
+            if r.second is not None:
+                where.append(f'{r.field} {"<=" if r.include_second else "<"} ?')
+                params.append(r.second)
+            if r.first is None and r.second is None:
+                where.append(f'{r.field} IS NOT NULL')
+        for m in query.metrics:
+            where.append(f'id IN (SELECT owner_id FROM metrics WHERE name = ? AND value {SQL_OPERATORS[m.op]} ?)')
+            params.extend((m.name, m.value))
+        sql = ' AND '.join(where) or '1'
+        order_by = 'pos'
+        if query.sort_field is not None:
+            key = query.sort_field
+            if key.startswith(METRIC_PREFIX):
+                key = METRIC_VALUE
+                # the key appears twice in the ORDER BY clause
+                params.extend([query.sort_field[len(METRIC_PREFIX):]] * 2)
+            # entries without a value come last, ties are kept in database order
+            order_by = f'{key} IS NULL, {key}{" DESC" if query.sort_descending else ""}, pos'
+        start, stop = query.window()
+        if not query.predicates:
+            sql += f' ORDER BY {order_by} LIMIT ? OFFSET ?'
+            params.extend((-1 if stop is None else stop - start, start))
+            return iter(self.__select(sql, params, order_by=None))
+        entries = iter(self.__select(f'{sql} ORDER BY {order_by}', params, order_by=None))
+        for predicate in query.predicates:
+            entries = filter(predicate, entries)
+        return itertools.islice(entries, start, stop)
+
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        return self.__load('1', ())
+
+    def _exists(self, entry: Entry) -> bool:
+        with self.__lock:
+            return self.__exists(entry.id)
+
+    def _signature(self) -> Hashable:
+        # data_version changes when other connections commit, total_changes when this one writes
+        with self.__lock:
+            return (self.__connection_token, self.conn.execute('PRAGMA data_version').fetchone()[0],
+                    self.conn.total_changes)
+
+    def _iter_raw(self, cursor: Optional[Cursor] = None) -> Iterator[Tuple[Dict[str, Any], Cursor]]:
+        position = cursor.position if cursor is not None else 0
+        last_pos = -1
+        if cursor is not None and cursor.token is not None:
+            last_pos = cursor.token
+        elif position > 0:
+            with self.__lock:
+                row = self.conn.execute('SELECT pos FROM entries WHERE parent_id IS NULL ORDER BY pos LIMIT 1 '
+                                        'OFFSET ?', (position - 1,)).fetchone()
+            if row is None:
+                return
+            last_pos = row['pos']
+        while True:
+            # not held while the batch is consumed
+            with self.__lock:
+                rows = self.conn.execute('SELECT * FROM entries WHERE parent_id IS NULL AND pos > ? ORDER BY pos '
+                                         'LIMIT ?', (last_pos, BATCH_SIZE)).fetchall()
+                batch = self.__from_rows(rows)
+            if not rows:
+                return
+            for row, d in zip(rows, batch):
+                position += 1
+                last_pos = row['pos']
+                yield d, Cursor(position, d['id'], last_pos)
+
+    def __select(self, where: str, params: Sequence, order_by: Optional[str] = 'pos') -> List[Entry]:
+        return list(map(Entry.from_dict, self.__load(where, params, order_by)))
+
+    def __load(self, where: str, params: Sequence, order_by: Optional[str] = 'pos') -> List[Dict[str, Any]]:
+        order = f' ORDER BY {order_by}, pos' if order_by else ''
+        with self.__lock:
+            return self.__from_rows(self.conn.execute(f'SELECT * FROM entries WHERE parent_id IS NULL AND '
+                                                      f'{where}{order}', params).fetchall())
+
+    def __from_rows(self, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        entries = [self.__row_to_dict(r) for r in rows]
+        self.__load_children(entries)
+        return entries
+
+    def __load_children(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        by_id = {e['id']: e for e in entries}
+        sub_entries = []
+        for ids in self.__chunks(list(by_id)):
+            placeholders = ', '.join('?' * len(ids))
+            for r in self.conn.execute(f'SELECT owner_id, entry_id, name, value FROM metrics '
+                                       f'WHERE owner_id IN ({placeholders}) ORDER BY owner_id, pos', ids):
+                by_id[r['owner_id']]['metrics'].append({'entry_id': r['entry_id'], 'name': r['name'],
+                                                        'value': r['value']})
+            for r in self.conn.execute(f'SELECT owner_id, entry_id, name, path FROM results '
+                                       f'WHERE owner_id IN ({placeholders}) ORDER BY owner_id, pos', ids):
+                by_id[r['owner_id']]['results'].append({'entry_id': r['entry_id'], 'name': r['name'],
+                                                        'path': r['path']})
+            for r in self.conn.execute(f'SELECT * FROM entries WHERE parent_id IN ({placeholders}) '
+                                       f'ORDER BY parent_id, pos', ids):
+                sub_entry = self.__row_to_dict(r)
+                by_id[r['parent_id']]['other_runs'].append(sub_entry)
+                sub_entries.append(sub_entry)
+        self.__load_children(sub_entries)
+
+    def __insert(self, d: Dict[str, Any], parent_id: Optional[str], pos: int):
+        self.conn.execute(f'INSERT INTO entries (parent_id, pos, {", ".join(ENTRY_COLUMNS)}) '
+                          f'VALUES (?, ?, {", ".join("?" * len(ENTRY_COLUMNS))})',
+                          [parent_id, pos] + [d.get(c) for c in ENTRY_COLUMNS])
+        self.__insert_children(d)
+
+    def __insert_children(self, d: Dict[str, Any]):
+        self.__insert_values(d)
+        for i, sub_entry in enumerate(d.get('other_runs') or []):
+            self.__insert(sub_entry, d['id'], i)
+
+    def __insert_values(self, d: Dict[str, Any]):
+        self.conn.executemany('INSERT INTO metrics (owner_id, pos, entry_id, name, value) VALUES (?, ?, ?, ?, ?)',
+                              [(d['id'], i, m.get('entry_id'), m.get('name'), m.get('value'))
+                               for i, m in enumerate(d.get('metrics') or [])])
+        self.conn.executemany('INSERT INTO results (owner_id, pos, entry_id, name, path) VALUES (?, ?, ?, ?, ?)',
+                              [(d['id'], i, r.get('entry_id'), r.get('name'), r.get('path'))
+                               for i, r in enumerate(d.get('results') or [])])
+
+    def __update(self, d: Dict[str, Any]):
+        cur = self.conn.execute(f'UPDATE entries SET {", ".join(f"{c} = ?" for c in ENTRY_COLUMNS[1:])} WHERE id = ?',
+                                [d.get(c) for c in ENTRY_COLUMNS[1:]] + [d['id']])
+        if cur.rowcount == 0:
+            return
+        self.conn.execute('DELETE FROM metrics WHERE owner_id = ?', (d['id'],))
+        self.conn.execute('DELETE FROM results WHERE owner_id = ?', (d['id'],))
+        self.__insert_values(d)
+        # sub-entries are rows on their own, new ones are appended to the existing ones
+        for sub_entry in d.get('other_runs') or []:
+            if self.__exists(sub_entry['id']):
+                self.__update(sub_entry)
+            else:
+                self.__insert(sub_entry, d['id'], self.__next_pos(d['id']))
+
+    def __exists(self, id: str) -> bool:
+        return self.conn.execute('SELECT 1 FROM entries WHERE id = ?', (id,)).fetchone() is not None
+
+    def __is_parent(self, id: str) -> bool:
+        return self.conn.execute('SELECT 1 FROM entries WHERE id = ? AND parent_id IS NULL', (id,)).fetchone() \
+            is not None
+
+    def __next_pos(self, parent_id: Optional[str] = None) -> int:
+        return self.conn.execute('SELECT COALESCE(MAX(pos), -1) + 1 FROM entries WHERE parent_id IS ?',
+                                 (parent_id,)).fetchone()[0]
+
+    @staticmethod
+    def __row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        d = {c: row[c] for c in ENTRY_COLUMNS}
+        d.update(metrics=[], other_runs=[], results=[], parent_id=row['parent_id'])
+        return d
+
+    @staticmethod
+    def __chunks(ids: List[str]) -> Iterable[List[str]]:
+        for i in range(0, len(ids), MAX_VARIABLES):
+            yield ids[i:i + MAX_VARIABLES]
+
+    @staticmethod
+    def __date_field(field: str) -> str:
+        if field not in DATE_FIELDS:
+            raise ValueError(f'{field} is not a date field. Use one of {", ".join(DATE_FIELDS)}')
+        return field
+
+    @staticmethod
+    def __regexp_match(pattern: str, value: str) -> bool:
+        return re.match(pattern, value) is not None
+
+    @staticmethod
+    def __is_sqlite_db(path: str) -> bool:
+        with open(path, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
@@ -0,0 +1,130 @@
+from typing import BinaryIO, Any, Dict, Generator, Optional, Tuple
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for json documents like ``{"data": [...]}``, which yields the elements of the array stored
+    under `key` one at a time. Only the element being decoded (plus a read buffer) is kept in memory, so that
+    arbitrarily large databases can be scanned with bounded memory.
+
+    **Usage**:
+
+    .. code-block:: python
+
+        with open('tmt_db.json', 'rb') as f:
+            for entry_dict, offset in JsonArrayStream(f):
+                ...
+
+    Every element is yielded together with the byte offset of the following element in the file. Passing that
+    offset to :py:meth:`tmt.storage.stream.JsonArrayStream.resume` restarts the parsing from there, provided that
+    the file did not change in the meantime.
+
+    :param f: the json file, opened in binary mode.
+    :type f: BinaryIO
+    :param key: key of the top-level object where the array is stored, defaults to "data".
+    :type key: str, optional
+    :param chunk_size: size of the reads from `f`, defaults to 64KB.
+    :type chunk_size: int, optional
+    """
+
+    def __init__(self, f: BinaryIO, key='data', chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.key = key
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.in_array = False
+        self.__reset(0)
+
+    def resume(self, offset: int):
+        """
+        Restarts the parsing from `offset`, which must be an offset returned while iterating this stream.
+        """
+        self.f.seek(offset)
+        self.__reset(offset)
+        self.in_array = True
+
+    def start(self) -> Optional[int]:
+        """
+        Finds the array and returns the byte offset of its first element, which can be passed to
+        :py:meth:`tmt.storage.stream.JsonArrayStream.resume` as well. Returns `None` if there is no array under `key`.
+        """
+        if not self.in_array and not self.__find_array():
+            return None
+        return self.pos_offset
+
+    def __iter__(self) -> Generator[Tuple[Dict[str, Any], int], None, None]:
+        if not self.in_array and not self.__find_array():
+            return
+        while self.__peek() != ']':
+            element = self.__decode_value()
+            if self.__peek() == ',':
+                self.__advance(self.pos + 1)
+            yield element, self.pos_offset
+
+    def __find_array(self) -> bool:
+        self.__expect('{')
+        while self.__peek() != '}':
+            key = self.__decode_value()
+            self.__expect(':')
+            if key == self.key:
+                self.__expect('[')
+                self.in_array = True
+                return True
+            self.__decode_value()
+            if self.__peek() == ',':
+                self.__advance(self.pos + 1)
+        return False
+
+    def __decode_value(self) -> Any:
+        self.__peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # e.g. a number could continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.__advance(end)
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.__fill(size)
+            size *= 2
+
+    def __peek(self) -> str:
+        while True:
+            self.__advance(WHITESPACE.match(self.buf, self.pos).end())
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise json.JSONDecodeError('Unexpected end of file', self.buf, self.pos)
+            self.__fill(self.chunk_size)
+
+    def __expect(self, char: str):
+        if self.__peek() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self.buf, self.pos)
+        self.__advance(self.pos + 1)
+
+    def __advance(self, pos: int):
+        text = self.buf[self.pos:pos]
+        self.pos_offset += len(text) if text.isascii() else len(text.encode('utf-8'))
+        self.pos = pos
+
+    def __fill(self, size: int):
+        data = self.f.read(size)
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + self.text_decoder.decode(data, final=self.eof)
+        self.pos = 0
+
+    def __reset(self, offset: int):
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.pos_offset = offset
+        self.eof = False
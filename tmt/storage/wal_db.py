@@ -0,0 +1,205 @@
+from filelock import Timeout
+from tmt.storage.base import BaseDbManager, Cursor
+from tmt.storage.json_db import DbManager
+from tmt.storage.locks import ProcessFileLock
+from tmt.storage.schema import Entry
+from typing import List, Dict, Any, Hashable, Iterator, Optional, Tuple
+import hashlib
+import json
+import os
+import uuid
+import warnings
+
+
+class WalDbManager(DbManager):
+    """
+    :py:class:`tmt.storage.json_db.DbManager` with a write-ahead log (WAL), for many processes recording experiments
+    at the same time (e.g. the workers of a sweep). Instead of rewriting the database, a write appends a small
+    record with the added and updated entries to ``db_path + '.wal'`` and returns. Pending records are folded into the
+    database in a single rewrite by a checkpoint: the writer which makes the log grow over
+    :py:attr:`CHECKPOINT_MIN_BYTES` runs one, unless another process holds the database lock (i.e. is already writing
+    it), in which case the records are left to the next checkpoint. Readers replay the pending records on top of the
+    database, so they are visible as soon as the write returns.
+
+    Since entries are checked when they are folded, warnings about existing entries (or missing parents) are raised
+    by the checkpoint rather than by the write. For the same reason,
+    :py:meth:`tmt.storage.base.BaseDbManager.add_or_update_entry` appends the entry without reading the database:
+    whether it is added or updated is decided when it is folded. Deletions checkpoint the log and then write the
+    database directly.
+
+    A checkpoint first renames the log to ``db_path + '.wal.checkpoint'``, so that new records go to a new log, then
+    rewrites the database together with the digest of the folded records and finally removes them. If a process
+    dies halfway, the next checkpoint (or reader) can tell whether the records were already folded.
+
+    :param db_path: path to the json db file.
+    :type db_path: str
+    :param read_only: if `True` all writing access is denied, defaults to False.
+    :type read_only: bool, optional
+    """
+    CHECKPOINT_MIN_BYTES = 1 << 20
+    # reads done without locks before locking out writers, see `_read_raw`
+    READ_ATTEMPTS = 3
+
+    def __init__(self, db_path: str, read_only=False):
+        super().__init__(db_path, read_only)
+        self.wal_path = f'{db_path}.wal'
+        self.checkpoint_path = f'{db_path}.wal.checkpoint'
+        self.wal_lock = ProcessFileLock(f'{db_path}.wal.lock')
+
+    check_can_write = BaseDbManager.check_can_write
+
+    @check_can_write
+    def _write_raw(self, added: List[Dict[str, Any]], updated: List[Dict[str, Any]]):
+        self.__append({'added': added, 'updated': updated})
+
+    @check_can_write
+    def add_or_update_entry(self, entry: Entry):
+        self.__append({'added': [], 'updated': [], 'upserted': [entry.to_dict()]})
+
+    def __append(self, record: Dict[str, Any]):
+        # the id makes every log unique, so that its digest tells whether it was folded (see `checkpoint`)
+        record = json.dumps({'id': uuid.uuid4().hex, **record}).encode('utf-8') + b'\n'
+        with self.wal_lock:
+            with open(self.wal_path, 'ab+') as f:
+                # a process which died while appending may have left a partial record
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        record = b'\n' + record
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+        self._invalidate_view()
+        if size >= self.CHECKPOINT_MIN_BYTES:
+            self.checkpoint(blocking=False)
+
+    @check_can_write
+    def delete_entry(self, entry: Entry) -> bool:
+        with self.lock:
+            self.checkpoint()
+            return super().delete_entry(entry)
+
+    @check_can_write
+    def delete_entries(self, entries: List[Entry]) -> int:
+        with self.lock:
+            self.checkpoint()
+            return super().delete_entries(entries)
+
+    @check_can_write
+    def delete_all(self):
+        with self.lock:
+            self.checkpoint()
+            super().delete_all()
+
+    @check_can_write
+    def checkpoint(self, blocking=True) -> bool:
+        """
+        Folds the pending records of the log into the database. Returns `False` if `blocking` is `False` and another
+        process holds the database lock, in which case nothing is done.
+        """
+        try:
+            self.lock.acquire(timeout=-1 if blocking else 0)
+        except Timeout:
+            return False
+        try:
+            while True:
+                if not os.path.exists(self.checkpoint_path):
+                    with self.wal_lock:
+                        if not os.path.exists(self.wal_path) or os.path.getsize(self.wal_path) == 0:
+                            return True
+                        os.replace(self.wal_path, self.checkpoint_path)
+                records, digest = self.__read_log(self.checkpoint_path)
+
+                def apply(db_data: Dict[str, Any]) -> bool:
+                    # already folded by a checkpoint which died before removing the records
+                    if db_data.get('wal') == digest:
+                        return False
+                    for r in records:
+                        self.__fold(db_data['data'], r)
+                    db_data['wal'] = digest
+                    return True
+
+                self._transaction(apply)
+                os.remove(self.checkpoint_path)
+        finally:
+            self.lock.release()
+
+    def _read_raw(self) -> List[Dict[str, Any]]:
+        for _ in range(self.READ_ATTEMPTS):
+            signature = self._signature()
+            data = self.__replay()
+            # a checkpoint may have moved the records around while reading
+            if self._signature() == signature:
+                return data
+        # the log keeps changing (e.g. many workers appending): read once more holding off writers and checkpoints,
+        # in the order `checkpoint` takes the locks
+        with self.lock, self.wal_lock:
+            return self.__replay()
+
+    def __replay(self) -> List[Dict[str, Any]]:
+        """
+        Returns the records of the database with the pending records of the logs folded in.
+        """
+        with open(self.db_path, 'r', encoding='utf-8') as f:
+            db_data = json.load(f)
+        data = db_data['data']
+        with warnings.catch_warnings():
+            # duplicates are reported by the checkpoint
+            warnings.simplefilter('ignore')
+            checkpoint, digest = self.__read_log(self.checkpoint_path)
+            if digest == db_data.get('wal'):
+                checkpoint = []
+            for r in checkpoint + self.__read_log(self.wal_path)[0]:
+                self.__fold(data, r)
+        return data
+
+    def __fold(self, data: List[Dict[str, Any]], record: Dict[str, Any]):
+        """
+        Applies a record of the log to the records `data`, in place. Upserted entries (see `add_or_update_entry`)
+        are updated if they exist and added otherwise.
+        """
+        upserted = record.get('upserted', [])
+        ids = {d['id'] for d in data} if upserted else set()
+        self._apply_raw(data, record['added'] + [d for d in upserted if d['id'] not in ids],
+                        record['updated'] + [d for d in upserted if d['id'] in ids])
+
+    def _store_view(self, data: List[Dict[str, Any]]):
+        # the database alone is not the whole content, records may have been appended to the log in the meantime
+        self._invalidate_view()
+
+    def _signature(self) -> Hashable:
+        return tuple(self.__stat(path) for path in (self.db_path, self.checkpoint_path, self.wal_path))
+
+    def _iter_raw(self, cursor: Optional[Cursor] = None) -> Iterator[Tuple[Dict[str, Any], Cursor]]:
+        if self.__stat(self.checkpoint_path) is None and self.__stat(self.wal_path) is None:
+            # nothing pending, the database can be streamed
+            return super()._iter_raw(cursor)
+        return BaseDbManager._iter_raw(self, cursor)
+
+    def __stat(self, path: str) -> Optional[Hashable]:
+        try:
+            signature = self._stat_signature(path)
+        except FileNotFoundError:
+            return None
+        # an empty log is the same as no log
+        return signature if signature[1] > 0 else None
+
+    @staticmethod
+    def __read_log(path: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Returns the records in the log at `path` and their digest.
+        """
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return [], None
+        records = []
+        for line in content.splitlines():
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # left by a process which died while appending; its write never returned
+                continue
+        return records, hashlib.sha256(content).hexdigest()
@@ -0,0 +1,133 @@
+from tmt.configs.parser import DB_BACKENDS, Configs
+from tmt.history.restore import restore_snapshot
+from tmt.storage.archive import archive_entries
+from tmt.storage.daemon import DbServer
+from tmt.storage.merge import detect_backend, merge_databases, open_db
+from tmt.storage.wal_db import WalDbManager
+from datetime import datetime
+import os
+import subprocess
+import sys
+
+
+def path_prefix(value: str):
+    import argparse
+    old, sep, new = value.partition('=')
+    if not sep or not old:
+        raise argparse.ArgumentTypeError(f'{value} is not in the OLD=NEW format')
+    return old, new
+
+
+def merge(args):
+    missing = [path for path in args.sources if not os.path.exists(path)]
+    if missing:
+        sys.exit(f'Database not found: {", ".join(missing)}')
+    target_path = os.path.abspath(args.target)
+    target = open_db(target_path, backend=detect_backend(target_path, default=DB_BACKENDS[args.backend]))
+    sources = (open_db(os.path.abspath(path), read_only=True) for path in args.sources)
+    report = merge_databases(target, sources, dict(args.rewrite))
+    print(f'Read {report.read} entries from {len(args.sources)} databases: {report.added} added, {report.merged} '
+          f'merged ({report.sub_entries} new sub-entries), {report.skipped} already in {args.target}')
+
+
+def archive(args):
+    if args.before is None and args.name is None:
+        sys.exit('Specify --before and/or --name to select the entries to archive')
+    if not os.path.exists(args.db):
+        sys.exit(f'Database not found: {args.db}')
+    db = open_db(os.path.abspath(args.db))
+    query = db.query()
+    if args.name is not None:
+        query.name_regex(args.name)
+    report = archive_entries(db, args.before, query, args.field)
+    if report.segment is None:
+        print('No entry to archive')
+    else:
+        print(f'Archived {report.archived} entries to {os.path.join(db.archive.path, report.segment.file)}')
+
+
+def checkpoint(args):
+    db = WalDbManager(os.path.abspath(args.db))
+    db.checkpoint()
+
+
+def restore(args):
+    config = Configs.from_config(args.config) if args.config else Configs.from_default_path_or_default_config()
+    entry = config.init_db_manager(read_only=True).get_entry_by_id(args.id)
+    if entry is None:
+        sys.exit(f'Entry not found: {args.id}')
+    try:
+        path = restore_snapshot(entry.local_snapshot_path, args.dest)
+    except (FileNotFoundError, FileExistsError) as e:
+        sys.exit(str(e))
+    except subprocess.CalledProcessError as e:
+        sys.exit(f'Could not restore the snapshot: {e.stderr.decode(errors="replace").strip()}')
+    print(f'Snapshot of {entry.short_str()} restored in {path}')
+
+
+def serve(args):
+    config = Configs.from_config(args.config) if args.config else Configs.from_default_path_or_default_config()
+    server = DbServer(config.init_db_manager(use_daemon=False))
+    print(f'Serving {config.json_db_path} on {server.path}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser('tmt', description='That Metric Timeline (TMT) command line tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = commands.add_parser('merge', help='merge tmt databases (e.g. from different machines) into one. '
+                                                     'Entries already in the target database are kept, but get the '
+                                                     'sub-entries (other runs) they lack.')
+    merge_parser.add_argument('target', help='database to merge into. It is created if it does not exist')
+    merge_parser.add_argument('sources', nargs='+', help='databases to merge. Their backend is detected '
+                                                         'automatically')
+    merge_parser.add_argument('--rewrite', '-r', type=path_prefix, action='append', default=[], metavar='OLD=NEW',
+                              help='replace the OLD prefix of results and snapshot paths with NEW. Can be repeated')
+    merge_parser.add_argument('--backend', '-b', choices=DB_BACKENDS, default='json',
+                              help='backend of the target database, if it does not exist. Defaults to json')
+    merge_parser.set_defaults(func=merge)
+
+    archive_parser = commands.add_parser('archive', help='move old entries to a compressed, read-only archive '
+                                                         'segment, so that the database only keeps the recent ones. '
+                                                         'Archived entries are still found by searches')
+    archive_parser.add_argument('db', help='path to the database')
+    archive_parser.add_argument('--before', type=datetime.fromisoformat, metavar='DATE',
+                                help='archive the entries older than DATE (ISO format, e.g. 2023-01-31)')
+    archive_parser.add_argument('--name', metavar='REGEX', help='archive the entries whose name matches REGEX')
+    archive_parser.add_argument('--field', choices=('date_created', 'date_saved'), default='date_created',
+                                help='the date --before refers to. Defaults to date_created')
+    archive_parser.set_defaults(func=archive)
+
+    checkpoint_parser = commands.add_parser('checkpoint', help='fold the write-ahead log of a json_wal database into '
+                                                               'the database')
+    checkpoint_parser.add_argument('db', help='path to the database')
+    checkpoint_parser.set_defaults(func=checkpoint)
+
+    restore_parser = commands.add_parser('restore', help='rebuild the code snapshot of an experiment, e.g. one '
+                                                         'taken with the git or archive snapshot strategies')
+    restore_parser.add_argument('id', help='id of the entry')
+    restore_parser.add_argument('--dest', '-d', help='directory to rebuild the snapshot in. Defaults to the snapshot '
+                                                     'path of the entry')
+    restore_parser.add_argument('--config', '-c', help='configuration path. If not given, the default configuration '
+                                                       'path or a default configuration is used')
+    restore_parser.set_defaults(func=restore)
+
+    serve_parser = commands.add_parser('serve', help='run a daemon keeping the database in memory, so that other '
+                                                     'processes using it (recorders, TmtManager, the TUI) don\'t '
+                                                     'need to read it. They fall back to reading the database '
+                                                     'directly when the daemon is not running')
+    serve_parser.add_argument('--config', '-c', help='configuration path. If not given, the default configuration '
+                                                     'path or a default configuration is used')
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,11 @@ class DuplicatePolicy(enum.Enum):
         When :py:meth:`tmt.utils.manager.TmtManager.load_results` is called on an entry with a sub-entry, results
         for the sub-entry will be returned as well.
 
+    .. note::
+        Sub-entries are stored as separate records, which point to their parent through
+        :py:attr:`tmt.storage.schema.Entry.parent_id`, and are added to the parent's `other_runs` when it's read.
+        Saving a new run therefore doesn't rewrite the previous ones.
+
     .. note::
         Specifying an entry as a sub-entry will still take a snapshot of the current code etc. Nothing changes in how
         the entry is saved and processed, except for what stated before.
@@ -1,12 +1,15 @@
 import warnings
 
-from tmt.storage.json_db import DbManager
 from tmt.storage.schema import Entry, Metric
 from tmt.configs.parser import Configs
-from typing import Optional, Generator, Any, Tuple, List
+from typing import TYPE_CHECKING, Optional, Generator, Any, Tuple, List, Dict, Union
 from tmt.exceptions import EntryNotFound
+from tmt.history.restore import snapshot_file
 import pickle
 
+if TYPE_CHECKING:
+    from tmt.storage.columnar import MetricAggregates, MetricColumns
+
 
 class TmtManager:
     """
@@ -50,6 +53,9 @@ class TmtManager:
         # you can access the `db` member like
         manager.db.get_entries_greater_than_date(date_or_timestamp)
 
+        # or combine several criteria in a single query
+        manager.db.query().name_regex(r'resnet.*').after(date_or_timestamp).metric('f1', '>', 0.8).all()
+
     :param entry: this is an entry in the json database, i.e. a previously tracked and saved experiments.
     :type entry: Optional[Entry]
     :param config: this can be a path to a custom configuration json file. See :doc:`Configuration <configuration>`.
@@ -61,7 +67,7 @@ class TmtManager:
             self.config = Configs.from_default_path_or_default_config()
         else:
             self.config = Configs.from_config(config)
-        self.db = DbManager(self.config.json_db_path, read_only=True)
+        self.db = self.config.init_db_manager(read_only=True)
         self.entry = entry
 
     def set_entry_by_name(self, name: str) -> Entry:
@@ -119,14 +125,157 @@ class TmtManager:
         return self.entry.metrics
 
     @entry_not_none
-    def code_snapshot_path(self) -> str:
+    def code_snapshot_path(self, path: Optional[str] = None) -> str:
         """
-        Returns the path to the code snapshot backup saved with this experiment.
+        Returns the path to the code snapshot backup saved with this experiment or, if `path` is given, to one of its
+        files. Files of snapshots which are not trees of files (see ``snapshot_strategy`` in the
+        :doc:`Configuration <configuration>`) are extracted on demand: only the requested file is extracted from
+        archives, while git snapshots are restored whole (see :py:func:`tmt.history.restore.snapshot_file`).
 
-        :return: path to the snapshot saved with this experiment.
+        :param path: path of a file of the snapshot, relative to its root (i.e. to ``snapshot_source``). Defaults to
+            None.
+        :type path: Optional[str], optional
+        :return: path to the snapshot saved with this experiment, or to its file `path`.
         :rtype: str
+        :raises FileNotFoundError: if there is no file `path` in the snapshot.
+        """
+        if path is None:
+            return self.entry.local_snapshot_path
+        return snapshot_file(self.entry.local_snapshot_path, path)
+
+    def top_k(self, metric: str, k: int = 10, largest=True, include_sub_entries=False,
+              archived=False) -> List[Tuple[Entry, float]]:
+        """
+        Returns the `k` experiments with the best value of `metric`, best first, together with that value.
+        The search is vectorized over all the metrics in the database (see :py:mod:`tmt.storage.columnar`), only the
+        returned entries are decoded. Requires `numpy`.
+
+        :param metric: name of the metric.
+        :type metric: str
+        :param k: number of experiments to return, defaults to 10.
+        :type k: int, optional
+        :param largest: if `True` (the default) higher values are better, otherwise lower values are.
+        :type largest: bool, optional
+        :param include_sub_entries: if `True`, sub-entries (see :py:mod:`tmt.utils.duplicates`) are ranked as well.
+            Defaults to False.
+        :type include_sub_entries: bool, optional
+        :param archived: if `True`, archived experiments (see :py:mod:`tmt.storage.archive`) are included. Defaults to
+            False.
+        :type archived: bool, optional
+        :return: a list of (entry, metric value) tuples.
+        :rtype: List[Tuple[Entry, float]]
+        """
+        columns = self.db.metric_columns(archived)
+        return [(self.__entry_at(columns, index), value)
+                for index, value in columns.top_k(metric, k, largest, include_sub_entries)]
+
+    def leaderboard(self, metrics: List[str], sort_by: Optional[str] = None, largest=True, k: Optional[int] = None,
+                    include_sub_entries=False, archived=False) -> List[Dict[str, Any]]:
+        """
+        Returns a table comparing `metrics` across all the experiments having at least one of them. Each row is a
+        dictionary with the entry "id" and "name" and a key for each metric (`None` when an experiment lacks it).
+        Requires `numpy`.
+
+        **Usage**:
+
+        .. code-block:: python
+
+            for row in manager.leaderboard(['f1', 'accuracy'], k=5):
+                print(row['name'], row['f1'], row['accuracy'])
+
+        :param metrics: names of the metrics to compare.
+        :type metrics: List[str]
+        :param sort_by: metric to sort by, defaults to the first of `metrics`. Experiments without it come last.
+        :type sort_by: Optional[str], optional
+        :param largest: if `True` (the default) higher values come first.
+        :type largest: bool, optional
+        :param k: maximum number of rows, defaults to None (i.e. all of them).
+        :type k: Optional[int], optional
+        :param include_sub_entries: if `True`, sub-entries get their own rows. Defaults to False.
+        :type include_sub_entries: bool, optional
+        :param archived: if `True`, archived experiments (see :py:mod:`tmt.storage.archive`) are included. Defaults to
+            False.
+        :type archived: bool, optional
+        """
+        columns = self.db.metric_columns(archived)
+        rows = columns.leaderboard(metrics, metrics[0] if sort_by is None else sort_by, largest, k, include_sub_entries)
+        return [{'id': columns.entry_ids[index], 'name': columns.entry_names[index], **dict(zip(metrics, values))}
+                for index, values in rows]
+
+    def metrics_summary(self, metrics: Optional[List[str]] = None, include_sub_entries=False,
+                        archived=False) -> Dict[str, Dict[str, float]]:
         """
-        return self.entry.local_snapshot_path
+        Returns count, mean, standard deviation, min and max of each metric in `metrics` (by default, all the metrics
+        in the database) across all the experiments. Requires `numpy`.
+
+        :param metrics: names of the metrics to summarize, defaults to None (i.e. all of them).
+        :type metrics: Optional[List[str]], optional
+        :param include_sub_entries: if `True`, metrics of sub-entries are included. Defaults to False.
+        :type include_sub_entries: bool, optional
+        :param archived: if `True`, archived experiments (see :py:mod:`tmt.storage.archive`) are included. Defaults to
+            False.
+        :type archived: bool, optional
+        :return: a dictionary like ``{'f1': {'count': 10, 'mean': 0.8, 'std': 0.05, 'min': 0.7, 'max': 0.9}}``.
+        :rtype: Dict[str, Dict[str, float]]
+        """
+        return self.db.metric_columns(archived).summary(metrics, include_sub_entries)
+
+    def aggregate_runs(self, entries: Optional[List[Union[str, Entry]]] = None, metrics: Optional[List[str]] = None,
+                       archived=False) -> 'MetricAggregates':
+        """
+        Computes count, mean, standard deviation, min and max of each metric over each experiment together with all
+        its sub-entries (e.g. the seeds of a sweep saved with
+        :py:attr:`tmt.utils.duplicates.DuplicatePolicy.AS_SUB_ENTRY`). All the experiments are aggregated at once, with
+        vectorized operations (see :py:meth:`tmt.storage.columnar.MetricColumns.aggregate`). Requires `numpy`.
+
+        **Usage**:
+
+        .. code-block:: python
+
+            sweeps = [manager.db.get_entry_by_exact_name(name) for name in ('resnet_seeds', 'vgg_seeds')]
+            aggregates = manager.aggregate_runs(sweeps, metrics=['f1'])
+            print(aggregates.mean, aggregates.std)  # one row per experiment, one column per metric
+            print(aggregates.get(sweeps[0].id)['f1']['mean'])
+
+        :param entries: experiments (or their ids) to aggregate, defaults to None (i.e. all of them).
+        :type entries: Optional[List[Union[str, Entry]]], optional
+        :param metrics: names of the metrics to aggregate, defaults to None (i.e. all of them).
+        :type metrics: Optional[List[str]], optional
+        :param archived: if `True`, archived experiments (see :py:mod:`tmt.storage.archive`) are aggregated as well
+            when `entries` is None. Archived experiments in `entries` are always found. Defaults to False.
+        :type archived: bool, optional
+        :raises EntryNotFound: if one of `entries` is neither in the database nor in its archive.
+        :rtype: MetricAggregates
+        """
+        columns = self.db.metric_columns(archived)
+        if entries is None:
+            return columns.aggregate(None, metrics)
+        ids = [entry.id if isinstance(entry, Entry) else entry for entry in entries]
+        if not archived and any(columns.find(id) is None for id in ids):
+            # some may be archived
+            columns = self.db.metric_columns(archived=True)
+        indexes = []
+        for id in ids:
+            if (index := columns.find(id)) is None:
+                raise EntryNotFound(f'No entry (experiment) found for id {id}')
+            indexes.append(index)
+        return columns.aggregate(indexes, metrics)
+
+    @entry_not_none
+    def get_aggregated_metrics(self, metrics: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Same as :py:meth:`tmt.utils.manager.TmtManager.aggregate_runs`, for the experiment of this instance only.
+
+        :return: a dictionary like ``{'f1': {'count': 10, 'mean': 0.8, 'std': 0.05, 'min': 0.7, 'max': 0.9}}``.
+        :rtype: Dict[str, Dict[str, float]]
+        """
+        return self.aggregate_runs([self.entry], metrics).get(self.entry.id)
+
+    def __entry_at(self, columns: 'MetricColumns', index: int) -> Entry:
+        entry = self.db.get_entry_by_id(columns.entry_ids[columns.parents[index]])
+        if columns.parents[index] == index:
+            return entry
+        return next(e for e in entry.other_runs if e.id == columns.entry_ids[index])
 
     @staticmethod
     def __entry_results(entry: Entry):
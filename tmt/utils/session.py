@@ -0,0 +1,93 @@
+from __future__ import annotations
+from tmt.configs.parser import Configs
+from tmt.storage.buffered import BufferedDbManager
+from contextvars import ContextVar
+from contextlib import contextmanager
+from typing import Optional, Iterator
+import atexit
+import os
+
+current_session: ContextVar[Optional[Session]] = ContextVar('current_session', default=None)
+
+
+class Session:
+    """
+    A batch of experiments recorded by the same process, see :py:func:`tmt.utils.session.session`.
+
+    :param config_path: path to the configuration file, defaults to None (i.e. the default configuration).
+    :type config_path: Optional[str], optional
+    :param max_pending: see :py:class:`tmt.storage.buffered.BufferedDbManager`, defaults to 100.
+    :type max_pending: int, optional
+    :param max_delay: see :py:class:`tmt.storage.buffered.BufferedDbManager`, defaults to 60.
+    :type max_delay: Optional[float], optional
+    """
+
+    def __init__(self, config_path: Optional[str] = None, max_pending=100, max_delay: Optional[float] = 60.):
+        self.config_path = config_path
+        if config_path:
+            self.config = Configs.from_config(config_path)
+        else:
+            self.config = Configs.default_config()
+        self.db = BufferedDbManager(self.config.init_db_manager(), max_pending, max_delay)
+
+    def uses_config(self, config_path: Optional[str]) -> bool:
+        """
+        Returns `True` if `config_path` is the configuration of this session.
+        """
+        if not config_path or not self.config_path:
+            return not config_path and not self.config_path
+        return os.path.abspath(config_path) == os.path.abspath(self.config_path)
+
+    def flush(self):
+        """
+        Writes the queued entries to the database.
+        """
+        self.db.flush()
+
+
+@contextmanager
+def session(config_path: Optional[str] = None, max_pending=100, max_delay: Optional[float] = 60.) -> Iterator[Session]:
+    """
+    Records the experiments run within the ``with`` block in batches: every function decorated with
+    :py:func:`tmt.decorators.recorder.recorder` (using the same `config_path`) shares one database handle, and its
+    entry is queued instead of rewriting the database. Queued entries are written together when `max_pending` of them
+    are queued, when the oldest one has been queued for `max_delay` seconds, when the block exits and, should the
+    process exit within the block, at exit. Useful when calling many short recorded functions, e.g. in a sweep.
+
+    Entries queued within the session are visible to the recorders of the same session (e.g. to detect duplicated
+    names), but not to other processes until they are written.
+
+    .. note::
+        For simplicity, ``tmt`` exposes this function from its root with the ``tmt_session`` name.
+
+    **Usage**:
+
+    .. code-block:: python
+
+        from tmt import tmt_recorder, tmt_session
+
+        @tmt_recorder(name="sweep", duplicate_strategy=DuplicateStrategy(DuplicatePolicy.AS_SUB_ENTRY))
+        def train(c):
+            ...
+
+        with tmt_session():
+            for c in (0.01, 0.1, 1, 10):
+                train(c)
+
+    :param config_path: if you want to use a custom configuration file, specify the path. Defaults to None.
+    :type config_path: Optional[str], optional
+    :param max_pending: number of queued entries which triggers a write, defaults to 100.
+    :type max_pending: int, optional
+    :param max_delay: age (in seconds) of the oldest queued entry which triggers a write (checked when recording an
+        experiment), defaults to 60. If `None`, only `max_pending` is considered.
+    :type max_delay: Optional[float], optional
+    """
+    s = Session(config_path, max_pending, max_delay)
+    token = current_session.set(s)
+    atexit.register(s.flush)
+    try:
+        yield s
+    finally:
+        current_session.reset(token)
+        atexit.unregister(s.flush)
+        s.flush()